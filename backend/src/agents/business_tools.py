@@ -4,8 +4,32 @@ Each tool handles specific business process according to admin workflows
 """
 from langchain.tools import tool
 from typing import Optional
-import json
 from datetime import datetime
+from src.agents.routing_rules import ticket_priority
+from src.agents.ticketing import draft_ticket_id, issue_ticket, ticket_owner, verified_owner
+from src.schemas.tickets import Ticket
+from src.services.group_schedule import SCHEDULE
+from src.services.profile_cache import PROFILES
+
+
+def _own_profile() -> dict:
+    """Cached profile of the verified session's student; anonymous turns never read one"""
+    student_id = verified_owner()
+    return (PROFILES.get(student_id) or {}) if student_id else {}
+
+
+def _own_ticket_fields() -> dict:
+    """Profile data for the ticket, only ever the verified session student's own"""
+    student_id = verified_owner()
+    return PROFILES.ticket_fields(student_id) if student_id else {}
+
+
+def _candidates_note(candidates: list) -> str:
+    """Candidate groups from the schedule index, for the student message"""
+    if not candidates:
+        return ""
+    lines = "\n".join(f"• {g['name']}: {g['schedule']} (свободных мест: {g['free_seats']})" for g in candidates)
+    return f"\n\nПредварительно подходят группы (администратор подтвердит место):\n{lines}"
 
 
 # ========================================
@@ -32,32 +56,32 @@ def request_refund(reason: str, student_id: str) -> str:
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для операционного и сервисного директора
+        Сообщение для студента (тикет для операционного и сервисного директора передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"REFUND-{abs(hash(reason + student_id)) % 10000:04d}"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "refund",
-        "status": "open",
-        "priority": "high",  # Возвраты всегда высокий приоритет
-        "description": f"Запрос на возврат средств. Причина: {reason}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "24 часа",
-        "assigned_to": "Операционный и Сервисный Директор",
-        "category": "Возврат средств"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Спасибо за информацию. Мы обязательно рассмотрим Ваш запрос.\n\n"
-                   f"Тикет #{ticket_id} передан операционному и сервисному директору.\n"
-                   f"Ваш запрос будет обработан в течение 24 часов.\n\n"
-                   f"Вы можете отслеживать статус в разделе 'Мои Заявки'.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("REFUND")
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="refund",
+        status="open",
+        priority="high",  # Возвраты всегда высокий приоритет
+        description=f"Запрос на возврат средств. Причина: {reason}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="24 часа",
+        assigned_to="Операционный и Сервисный Директор",
+        category="Возврат средств"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Спасибо за информацию. Мы обязательно рассмотрим Ваш запрос.\n\n"
+        f"Тикет #{ticket_id} передан операционному и сервисному директору.\n"
+        f"Ваш запрос будет обработан в течение 24 часов.\n\n"
+        f"Вы можете отслеживать статус в разделе 'Мои Заявки'.",
+        dedup_text=reason
+    )
 
 
 # ========================================
@@ -86,41 +110,41 @@ def request_freeze(duration_start: str, duration_end: str, reason: str, student_
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для администратора
+        Сообщение для студента (тикет для администратора передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"FREEZE-{abs(hash(duration_start + student_id)) % 10000:04d}"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "freeze",
-        "status": "open",
-        "priority": "medium",
-        "description": f"Запрос на заморозку обучения с {duration_start} по {duration_end}. Причина: {reason}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "24 часа",
-        "freeze_start": duration_start,
-        "freeze_end": duration_end,
-        "actions_required": [
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("FREEZE")
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="freeze",
+        status="open",
+        priority="medium",
+        description=f"Запрос на заморозку обучения с {duration_start} по {duration_end}. Причина: {reason}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="24 часа",
+        freeze_start=duration_start,
+        freeze_end=duration_end,
+        actions_required=[
             "Оповестить учителей и кураторов",
             "Изменить статус на ЗАМОРОЗИТ в АльфаСРМ",
             "Обновить фикс. таблицу"
         ],
-        "category": "Заморозка обучения"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Запрос на заморозку обучения с {duration_start} по {duration_end} зарегистрирован.\n\n"
-                   f"Тикет #{ticket_id} создан.\n\n"
-                   f"Администратор выполнит необходимые действия:\n"
-                   f"• Уведомит учителей и кураторов\n"
-                   f"• Изменит статус в системе на 'ЗАМОРОЗИТ'\n"
-                   f"• Обновит все необходимые таблицы\n\n"
-                   f"Вы получите уведомление об активации заморозки.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        category="Заморозка обучения"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Запрос на заморозку обучения с {duration_start} по {duration_end} зарегистрирован.\n\n"
+        f"Тикет #{ticket_id} создан.\n\n"
+        f"Администратор выполнит необходимые действия:\n"
+        f"• Уведомит учителей и кураторов\n"
+        f"• Изменит статус в системе на 'ЗАМОРОЗИТ'\n"
+        f"• Обновит все необходимые таблицы\n\n"
+        f"Вы получите уведомление об активации заморозки.",
+        dedup_text=f"{duration_start} {duration_end} {reason}"
+    )
 
 
 # ========================================
@@ -148,22 +172,24 @@ def request_unfreeze(preferred_date: str, student_id: str) -> str:
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для администратора
+        Сообщение для студента (тикет для администратора передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"UNFREEZE-{abs(hash(preferred_date + student_id)) % 10000:04d}"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "unfreeze",
-        "status": "open",
-        "priority": "medium",
-        "description": f"Запрос на разморозку обучения с {preferred_date}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "24 часа",
-        "unfreeze_date": preferred_date,
-        "actions_required": [
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("UNFREEZE")
+    profile = _own_profile()
+    candidates = SCHEDULE.candidates(profile.get("level"))
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="unfreeze",
+        status="open",
+        priority="medium",
+        description=f"Запрос на разморозку обучения с {preferred_date}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="24 часа",
+        unfreeze_date=preferred_date,
+        actions_required=[
             "Проверить свободные группы для уровня студента",
             "Проверить остаток уроков в Альфа СРМ",
             "Уведомить куратора и учителя",
@@ -171,21 +197,24 @@ def request_unfreeze(preferred_date: str, student_id: str) -> str:
             "Добавить в группу в CRM",
             "Обновить фикс. таблицу"
         ],
-        "category": "Разморозка обучения"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Запрос на разморозку и продолжение обучения с {preferred_date} зарегистрирован.\n\n"
-                   f"Тикет #{ticket_id} создан.\n\n"
-                   f"Администратор:\n"
-                   f"• Проверит наличие свободных групп для Вашего уровня\n"
-                   f"• Подтвердит количество оставшихся уроков\n"
-                   f"• Свяжется с Вами с вариантами групп\n\n"
-                   f"⚠️ Обратите внимание: Вы продолжите обучение с количеством уроков, "
-                   f"согласно данным в CRM.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        category="Разморозка обучения",
+        candidate_groups=candidates or None,
+        **_own_ticket_fields()
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Запрос на разморозку и продолжение обучения с {preferred_date} зарегистрирован.\n\n"
+        f"Тикет #{ticket_id} создан.\n\n"
+        f"Администратор:\n"
+        f"• Проверит наличие свободных групп для Вашего уровня\n"
+        f"• Подтвердит количество оставшихся уроков\n"
+        f"• Свяжется с Вами с вариантами групп\n\n"
+        f"⚠️ Обратите внимание: Вы продолжите обучение с количеством уроков, "
+        f"согласно данным в CRM."
+        + _candidates_note(candidates),
+        dedup_text=preferred_date
+    )
 
 
 # ========================================
@@ -214,40 +243,41 @@ def use_bonus(bonus_type: str, details: str, student_id: str) -> str:
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для администратора
+        Сообщение для студента (тикет для администратора передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"BONUS-{abs(hash(bonus_type + student_id)) % 10000:04d}"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "bonus",
-        "status": "open",
-        "priority": "low",
-        "description": f"Запрос на использование бонуса: {bonus_type}. Детали: {details}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "24 часа",
-        "bonus_type": bonus_type,
-        "actions_required": [
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("BONUS")
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="bonus",
+        status="open",
+        priority="low",
+        description=f"Запрос на использование бонуса: {bonus_type}. Детали: {details}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="24 часа",
+        bonus_type=bonus_type,
+        actions_required=[
             "Проверить наличие бонуса в ФИХ таблице",
             "Предоставить бонус согласно типу",
             "Обновить статус бонуса"
         ],
-        "category": "Использование бонусов"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Заявка на активацию бонуса '{bonus_type}' зарегистрирована.\n\n"
-                   f"Тикет #{ticket_id} создан.\n\n"
-                   f"Администратор:\n"
-                   f"• Проверит наличие Вашего бонуса в системе\n"
-                   f"• Активирует бонус согласно типу\n"
-                   f"• Свяжется с Вами для подтверждения\n\n"
-                   f"Ожидайте ответа в течение 24 часов.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        category="Использование бонусов",
+        **_own_ticket_fields()
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Заявка на активацию бонуса '{bonus_type}' зарегистрирована.\n\n"
+        f"Тикет #{ticket_id} создан.\n\n"
+        f"Администратор:\n"
+        f"• Проверит наличие Вашего бонуса в системе\n"
+        f"• Активирует бонус согласно типу\n"
+        f"• Свяжется с Вами для подтверждения\n\n"
+        f"Ожидайте ответа в течение 24 часов.",
+        dedup_text=f"{bonus_type} {details}"
+    )
 
 
 # ========================================
@@ -277,45 +307,50 @@ def change_group_or_teacher(reason: str, preferences: str, student_id: str) -> s
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для операционного директора
+        Сообщение для студента (тикет для операционного директора передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"CHANGE-{abs(hash(reason + student_id)) % 10000:04d}"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "group_change",
-        "status": "open",
-        "priority": "medium",
-        "description": f"Запрос на смену группы/учителя. Причина: {reason}. Пожелания: {preferences}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "48 часов",
-        "reason": reason,
-        "preferences": preferences,
-        "actions_required": [
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("CHANGE")
+    profile = _own_profile()
+    candidates = SCHEDULE.candidates(profile.get("level"), preferences)
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="group_change",
+        status="open",
+        priority="medium",
+        description=f"Запрос на смену группы/учителя. Причина: {reason}. Пожелания: {preferences}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="48 часов",
+        reason=reason,
+        preferences=preferences,
+        actions_required=[
             "Получить разрешение операционного директора",
             "Предложить свободные группы",
             "Проверить совпадение количества уроков",
             "Обновить CRM и фикс. таблицу",
             "Уведомить учителей и кураторов"
         ],
-        "assigned_to": "Операционный директор",
-        "category": "Смена группы/учителя"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Заявка на смену группы/учителя зарегистрирована.\n\n"
-                   f"Тикет #{ticket_id} создан.\n\n"
-                   f"Ваш запрос будет обработан операционным директором.\n\n"
-                   f"Администратор:\n"
-                   f"• Получит необходимое разрешение\n"
-                   f"• Подберет подходящие варианты групп\n"
-                   f"• Свяжется с Вами с предложениями\n\n"
-                   f"Ожидайте ответа в течение 48 часов.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        assigned_to="Операционный директор",
+        category="Смена группы/учителя",
+        candidate_groups=candidates or None,
+        **_own_ticket_fields()
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Заявка на смену группы/учителя зарегистрирована.\n\n"
+        f"Тикет #{ticket_id} создан.\n\n"
+        f"Ваш запрос будет обработан операционным директором.\n\n"
+        f"Администратор:\n"
+        f"• Получит необходимое разрешение\n"
+        f"• Подберет подходящие варианты групп\n"
+        f"• Свяжется с Вами с предложениями\n\n"
+        f"Ожидайте ответа в течение 48 часов."
+        + _candidates_note(candidates),
+        dedup_text=f"{reason} {preferences}"
+    )
 
 
 # ========================================
@@ -345,45 +380,45 @@ def tech_issue_platform(issue_type: str, description: str, student_id: str) -> s
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для куратора/техподдержки
+        Сообщение для студента (тикет для куратора/техподдержки передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"TECH-{abs(hash(description + student_id)) % 10000:04d}"
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("TECH")
     
     # Определяем приоритет
-    priority = "high" if "не могу войти" in description.lower() or "доступ" in description.lower() else "medium"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "technical_platform",
-        "status": "open",
-        "priority": priority,
-        "description": f"Техническая проблема ({issue_type}): {description}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "4 часа" if priority == "high" else "12 часов",
-        "issue_type": issue_type,
-        "actions_required": [
+    priority = ticket_priority("technical_platform", description)
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="technical_platform",
+        status="open",
+        priority=priority,
+        description=f"Техническая проблема ({issue_type}): {description}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="4 часа" if priority == "high" else "12 часов",
+        issue_type=issue_type,
+        actions_required=[
             "Проверить доступ студента",
             "Предоставить рабочие ссылки",
             "Проверить/предоставить пароли при необходимости",
             "Убедиться, что проблема решена"
         ],
-        "assigned_to": "Куратор",
-        "category": "Технические проблемы"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Тикет #{ticket_id} создан для решения технической проблемы.\n\n"
-                   f"Ваш куратор:\n"
-                   f"• Проверит Ваш доступ к платформе\n"
-                   f"• Предоставит рабочие ссылки\n"
-                   f"• Проверит правильность паролей\n"
-                   f"• Убедится, что всё работает\n\n"
-                   f"Ожидайте ответа в ближайшее время.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        assigned_to="Куратор",
+        category="Технические проблемы"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Тикет #{ticket_id} создан для решения технической проблемы.\n\n"
+        f"Ваш куратор:\n"
+        f"• Проверит Ваш доступ к платформе\n"
+        f"• Предоставит рабочие ссылки\n"
+        f"• Проверит правильность паролей\n"
+        f"• Убедится, что всё работает\n\n"
+        f"Ожидайте ответа в ближайшее время.",
+        dedup_text=f"{issue_type} {description}"
+    )
 
 
 # ========================================
@@ -409,44 +444,44 @@ def request_attendance_certificate(purpose: str, student_id: str) -> str:
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для бухгалтера
+        Сообщение для студента (тикет для бухгалтера передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"CERT-{abs(hash(purpose + student_id)) % 10000:04d}"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "certificate",
-        "status": "open",
-        "priority": "medium",
-        "description": f"Запрос на справку о присутствии на курсах. Цель: {purpose}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "3 рабочих дня",
-        "purpose": purpose,
-        "actions_required": [
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("CERT")
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="certificate",
+        status="open",
+        priority="medium",
+        description=f"Запрос на справку о присутствии на курсах. Цель: {purpose}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="3 рабочих дня",
+        purpose=purpose,
+        actions_required=[
             "Отправить студенту шаблон в Word",
             "Получить заполненный шаблон",
             "Передать бухгалтеру для подписания",
             "Отправить подписанную справку студенту"
         ],
-        "assigned_to": "Бухгалтер",
-        "category": "Справка о присутствии"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Запрос на справку о присутствии зарегистрирован.\n\n"
-                   f"Тикет #{ticket_id} создан.\n\n"
-                   f"Процесс оформления:\n"
-                   f"1. Вы получите шаблон справки в Word формате\n"
-                   f"2. Заполните необходимые данные\n"
-                   f"3. Отправьте заполненный шаблон обратно\n"
-                   f"4. Бухгалтер подпишет справку\n"
-                   f"5. Вы получите готовую справку\n\n"
-                   f"Ожидаемый срок: 3 рабочих дня.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        assigned_to="Бухгалтер",
+        category="Справка о присутствии"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Запрос на справку о присутствии зарегистрирован.\n\n"
+        f"Тикет #{ticket_id} создан.\n\n"
+        f"Процесс оформления:\n"
+        f"1. Вы получите шаблон справки в Word формате\n"
+        f"2. Заполните необходимые данные\n"
+        f"3. Отправьте заполненный шаблон обратно\n"
+        f"4. Бухгалтер подпишет справку\n"
+        f"5. Вы получите готовую справку\n\n"
+        f"Ожидаемый срок: 3 рабочих дня.",
+        dedup_text=purpose
+    )
 
 
 # ========================================
@@ -474,47 +509,48 @@ def extend_or_purchase_course(request_type: str, details: str, student_id: str)
         student_id: ID студента
     
     Returns:
-        JSON с тикетом для РОП или бухгалтера
+        Сообщение для студента (тикет для РОП или бухгалтера передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"EXTEND-{abs(hash(details + student_id)) % 10000:04d}"
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("EXTEND")
     
     # Определяем кому назначить
     assigned_to = "РОП (Руководитель отдела продаж)" if request_type == "допродажа" else "Бухгалтер"
     
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "extension",
-        "status": "open",
-        "priority": "medium",
-        "description": f"Запрос на {request_type} курсов. Детали: {details}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "24 часа",
-        "request_type": request_type,
-        "details": details,
-        "actions_required": [
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="extension",
+        status="open",
+        priority="medium",
+        description=f"Запрос на {request_type} курсов. Детали: {details}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="24 часа",
+        request_type=request_type,
+        details=details,
+        actions_required=[
             f"Отправить данные {assigned_to} по шаблону",
             "Связаться с клиентом для уточнения деталей",
             "Подтвердить оплату",
             "Обновить данные в CRM"
         ],
-        "assigned_to": assigned_to,
-        "category": "Продление/Докупка курсов"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Запрос на {request_type} курсов зарегистрирован.\n\n"
-                   f"Тикет #{ticket_id} создан.\n\n"
-                   f"Ваши данные отправлены {assigned_to}.\n\n"
-                   f"С Вами свяжутся для:\n"
-                   f"• Уточнения деталей запроса\n"
-                   f"• Предоставления информации об оплате\n"
-                   f"• Подтверждения изменений\n\n"
-                   f"Ожидайте звонка в течение 24 часов.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        assigned_to=assigned_to,
+        category="Продление/Докупка курсов",
+        **_own_ticket_fields()
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Запрос на {request_type} курсов зарегистрирован.\n\n"
+        f"Тикет #{ticket_id} создан.\n\n"
+        f"Ваши данные отправлены {assigned_to}.\n\n"
+        f"С Вами свяжутся для:\n"
+        f"• Уточнения деталей запроса\n"
+        f"• Предоставления информации об оплате\n"
+        f"• Подтверждения изменений\n\n"
+        f"Ожидайте звонка в течение 24 часов.",
+        dedup_text=f"{request_type} {details}"
+    )
 
 
 # ========================================
@@ -543,47 +579,47 @@ def partner_program_request(invitee_name: str, invitee_telegram: str, invitee_ph
         student_id: ID студента-партнера
     
     Returns:
-        JSON с тикетом для администратора
+        Сообщение для студента (тикет для администратора передается автоматически)
     """
-    student_id = str(student_id) if student_id else "unknown"
-    ticket_id = f"PARTNER-{abs(hash(invitee_name + student_id)) % 10000:04d}"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "partner_program",
-        "status": "open",
-        "priority": "low",
-        "description": f"Запрос по партнерской программе. Приглашенный: {invitee_name}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "48 часов",
-        "invitee_name": invitee_name,
-        "invitee_telegram": invitee_telegram,
-        "invitee_phone": invitee_phone,
-        "actions_required": [
+    student_id = ticket_owner(student_id)
+    ticket_id = draft_ticket_id("PARTNER")
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="partner_program",
+        status="open",
+        priority="low",
+        description=f"Запрос по партнерской программе. Приглашенный: {invitee_name}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="48 часов",
+        invitee_name=invitee_name,
+        invitee_telegram=invitee_telegram,
+        invitee_phone=invitee_phone,
+        actions_required=[
             "Связаться с приглашенным",
             "Подтвердить источник (от кого пришел)",
             "Проверить статус в Альфа СРМ",
             "Начислить бонус партнеру при подтверждении"
         ],
-        "category": "Партнерская программа"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Запрос по партнерской программе зарегистрирован.\n\n"
-                   f"Тикет #{ticket_id} создан.\n\n"
-                   f"Данные приглашенного:\n"
-                   f"• ФИО: {invitee_name}\n"
-                   f"• Telegram: {invitee_telegram}\n"
-                   f"• Телефон: {invitee_phone}\n\n"
-                   f"Администратор:\n"
-                   f"• Свяжется с приглашенным для подтверждения\n"
-                   f"• Проверит данные в CRM\n"
-                   f"• Начислит Вам бонус при успешном подтверждении\n\n"
-                   f"Результат проверки будет отправлен в течение 48 часов.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        category="Партнерская программа"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Запрос по партнерской программе зарегистрирован.\n\n"
+        f"Тикет #{ticket_id} создан.\n\n"
+        f"Данные приглашенного:\n"
+        f"• ФИО: {invitee_name}\n"
+        f"• Telegram: {invitee_telegram}\n"
+        f"• Телефон: {invitee_phone}\n\n"
+        f"Администратор:\n"
+        f"• Свяжется с приглашенным для подтверждения\n"
+        f"• Проверит данные в CRM\n"
+        f"• Начислит Вам бонус при успешном подтверждении\n\n"
+        f"Результат проверки будет отправлен в течение 48 часов.",
+        dedup_text=f"{invitee_name} {invitee_telegram} {invitee_phone}"
+    )
 
 
 # ========================================
@@ -608,48 +644,42 @@ def staff_issue(issue_description: str, staff_id: str) -> str:
         staff_id: ID сотрудника
     
     Returns:
-        JSON с тикетом для администратора/руководителя
+        Сообщение для студента (тикет для администратора/руководителя передается автоматически)
     """
-    staff_id = str(staff_id) if staff_id else "unknown"
-    ticket_id = f"STAFF-{abs(hash(issue_description + staff_id)) % 10000:04d}"
+    staff_id = ticket_owner(staff_id)
+    ticket_id = draft_ticket_id("STAFF")
     
     # Определяем приоритет по ключевым словам
-    priority = "high"
-    if any(word in issue_description.lower() for word in ["срочно", "критично", "не работает"]):
-        priority = "high"
-    elif any(word in issue_description.lower() for word in ["вопрос", "уточнить"]):
-        priority = "low"
-    else:
-        priority = "medium"
-    
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "staff_issue",
-        "status": "open",
-        "priority": priority,
-        "description": f"Проблема сотрудника: {issue_description}",
-        "staff_id": staff_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "4 часа" if priority == "high" else "24 часа",
-        "actions_required": [
+    priority = ticket_priority("staff_issue", issue_description)
+    
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="staff_issue",
+        status="open",
+        priority=priority,
+        description=f"Проблема сотрудника: {issue_description}",
+        staff_id=staff_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="4 часа" if priority == "high" else "24 часа",
+        actions_required=[
             "Изучить суть проблемы",
             "Определить ответственного",
             "Решить проблему",
             "Подтвердить решение"
         ],
-        "assigned_to": "Администратор/Руководитель",
-        "category": "Проблемы сотрудников"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Тикет #{ticket_id} создан для решения Вашей проблемы.\n\n"
-                   f"Приоритет: {priority.upper()}\n\n"
-                   f"Ваша проблема будет рассмотрена администратором.\n"
-                   f"Ожидайте ответа в ближайшее время.\n\n"
-                   f"Вы можете отслеживать статус в системе.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+        assigned_to="Администратор/Руководитель",
+        category="Проблемы сотрудников"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✅ Тикет #{ticket_id} создан для решения Вашей проблемы.\n\n"
+        f"Приоритет: {priority.upper()}\n\n"
+        f"Ваша проблема будет рассмотрена администратором.\n"
+        f"Ожидайте ответа в ближайшее время.\n\n"
+        f"Вы можете отслеживать статус в системе.",
+        dedup_text=issue_description
+    )
 
 
 # Список всех бизнес-инструментов
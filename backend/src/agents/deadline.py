@@ -0,0 +1,63 @@
+"""
+Per-request deadlines for agent turns
+A turn's time budget is shared by every LLM and tool call made within it
+"""
+import math
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+DEFAULT_BUDGET = float(os.getenv("CHAT_DEADLINE_SECONDS", "25"))
+MAX_BUDGET = float(os.getenv("CHAT_DEADLINE_MAX_SECONDS", "60"))
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a step is started or awaited past the turn deadline"""
+
+
+class Deadline:
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def check(self, step: str) -> None:
+        if self.expired():
+            raise DeadlineExceeded(f"Deadline of {self.budget:.1f}s exceeded before {step}")
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("chat_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]) -> Iterator[Optional[Deadline]]:
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def deadline_from_header(value: Optional[str]) -> Deadline:
+    """Build a deadline from an `X-Request-Timeout` header (seconds), clamped to config"""
+    budget = DEFAULT_BUDGET
+    if value:
+        try:
+            requested = float(value)
+        except ValueError:
+            requested = math.nan
+        # "nan" and "inf" parse as floats but are no budget at all
+        if math.isfinite(requested):
+            budget = requested
+    return Deadline(min(max(budget, 0.1), MAX_BUDGET))
@@ -0,0 +1,96 @@
+"""
+LLM health signals for degraded mode
+Tracks agent turns in flight (the admission queue), and the error rate and
+latency of recent turns over a rolling window. When any signal passes its
+threshold, chat turns are served by the rule-based fallback engine instead of
+the LLM. Samples age out of the window, so the LLM is retried automatically
+once the window has passed.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator, Optional, Tuple
+
+from src.services.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+WINDOW_SECONDS = float(os.getenv("FALLBACK_WINDOW_SECONDS", "60"))
+MIN_SAMPLES = int(os.getenv("FALLBACK_MIN_SAMPLES", "10"))
+MAX_IN_FLIGHT = int(os.getenv("FALLBACK_MAX_IN_FLIGHT", "32"))
+MAX_ERROR_RATE = float(os.getenv("FALLBACK_MAX_ERROR_RATE", "0.5"))
+MAX_LATENCY_SECONDS = float(os.getenv("FALLBACK_MAX_LATENCY_SECONDS", "15"))
+
+
+class DegradationMonitor:
+    def __init__(
+        self,
+        window: float = WINDOW_SECONDS,
+        min_samples: int = MIN_SAMPLES,
+        max_in_flight: int = MAX_IN_FLIGHT,
+        max_error_rate: float = MAX_ERROR_RATE,
+        max_latency: float = MAX_LATENCY_SECONDS,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.max_in_flight = max_in_flight
+        self.max_error_rate = max_error_rate
+        self.max_latency = max_latency
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._samples: Deque[Tuple[float, bool, float]] = deque()  # (timestamp, ok, seconds)
+        self._reason: Optional[str] = None
+
+    @contextmanager
+    def admit(self) -> Iterator[None]:
+        """Count an LLM turn as in flight while the block runs"""
+        with self._lock:
+            self._in_flight += 1
+            METRICS.set_gauge("chat_llm_in_flight", self._in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                METRICS.set_gauge("chat_llm_in_flight", self._in_flight)
+
+    def record(self, ok: bool, seconds: float) -> None:
+        with self._lock:
+            self._samples.append((time.monotonic(), ok, seconds))
+            self._prune()
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.window
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+
+    def degrade_reason(self) -> Optional[str]:
+        """"queue", "errors" or "latency" if new turns should skip the LLM, else None"""
+        with self._lock:
+            self._prune()
+            reason = None
+            if self._in_flight >= self.max_in_flight:
+                reason = "queue"
+            elif len(self._samples) >= self.min_samples:
+                errors = len([s for s in self._samples if not s[1]])
+                latencies = sorted(s[2] for s in self._samples)
+                p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+                if errors / len(self._samples) >= self.max_error_rate:
+                    reason = "errors"
+                elif p95 >= self.max_latency:
+                    reason = "latency"
+
+            if reason != self._reason:
+                if reason:
+                    logger.warning(f"Switching chat to degraded mode: {reason}")
+                else:
+                    logger.info("LLM healthy again, leaving degraded mode")
+                self._reason = reason
+                METRICS.set_gauge("chat_degraded", 1 if reason else 0)
+            return reason
+
+
+DEGRADATION = DegradationMonitor()
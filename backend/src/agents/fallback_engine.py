@@ -0,0 +1,274 @@
+"""
+Rule-based fallback engine
+Runs the business flows from the agent prompt as a deterministic slot-filling
+state machine: the intent comes from the keyword rules, the clarifying
+questions are the ones the prompt asks, and the same ticket tools are called
+directly once the slots are filled. Used when the LLM is down, saturated or
+over budget. Dialog state lives in the shared state backend per student.
+"""
+import json
+import logging
+import os
+import re
+from datetime import date, timedelta
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from src.agents.business_tools import (
+    change_group_or_teacher,
+    extend_or_purchase_course,
+    partner_program_request,
+    request_attendance_certificate,
+    request_freeze,
+    request_refund,
+    request_unfreeze,
+    staff_issue,
+    tech_issue_platform,
+    use_bonus,
+)
+from src.agents.routing_rules import detect_intent
+from src.agents.ticketing import collect_tickets
+from src.services.metrics import METRICS
+from src.services.state import get_state
+
+logger = logging.getLogger(__name__)
+
+DIALOG_TTL = float(os.getenv("FALLBACK_DIALOG_TTL_SECONDS", "1800"))
+# An opening message this long is taken as the answer to the first free-text question
+PREFILL_MIN_WORDS = 6
+
+_CANCEL = {"отмена", "отменить", "стоп", "не надо"}
+
+_MONTHS = {
+    "январ": 1, "феврал": 2, "март": 3, "апрел": 4, "ма": 5, "июн": 6,
+    "июл": 7, "август": 8, "сентябр": 9, "октябр": 10, "ноябр": 11, "декабр": 12,
+}
+_DATE_PATTERNS = [
+    re.compile(r"(?P<y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})"),
+    re.compile(r"\b(?P<d>\d{1,2})\.(?P<m>\d{1,2})(?:\.(?P<y>\d{2,4}))?\b"),
+    re.compile(
+        r"\b(?P<d>\d{1,2})\s+(?P<month>январ\w*|феврал\w*|март\w*|апрел\w*|ма[йя]|июн\w*|июл\w*|август\w*"
+        r"|сентябр\w*|октябр\w*|ноябр\w*|декабр\w*)(?:\s+(?P<y>\d{4}))?"
+    ),
+]
+_TELEGRAM = re.compile(r"@\w{4,}")
+_PHONE = re.compile(r"\+?\d[\d\s\-()]{8,}\d")
+
+
+def parse_dates(text: str, today: Optional[date] = None) -> List[str]:
+    """ISO dates mentioned in `text`, in order; dates without a year are taken as the next occurrence"""
+    today = today or date.today()
+    text = text.lower()
+    found = []
+    for pattern in _DATE_PATTERNS:
+        for match in pattern.finditer(text):
+            groups = match.groupdict()
+            if groups.get("month"):
+                month = next(n for stem, n in _MONTHS.items() if groups["month"].startswith(stem))
+            else:
+                month = int(groups["m"])
+            year = int(groups["y"]) if groups.get("y") else None
+            if year is not None and year < 100:
+                year += 2000
+            try:
+                value = date(year or today.year, month, int(groups["d"]))
+            except ValueError:
+                continue
+            if year is None and value < today:
+                value = value.replace(year=value.year + 1)
+            found.append((match.start(), value))
+    if not found:
+        if "послезавтра" in text:
+            found.append((0, today + timedelta(days=2)))
+        elif "завтра" in text:
+            found.append((0, today + timedelta(days=1)))
+        elif "сегодня" in text:
+            found.append((0, today))
+
+    dates = [value for _, value in sorted(found)]
+    # "с 1 декабря по 15 января": the end date rolls over into the next year
+    for i in range(1, len(dates)):
+        if dates[i] < dates[i - 1] and dates[i].year == dates[i - 1].year:
+            dates[i] = dates[i].replace(year=dates[i].year + 1)
+    return [d.isoformat() for d in dates]
+
+
+class Slot(NamedTuple):
+    args: tuple
+    question: str
+    # Answer -> tool arguments, or None if the answer does not fill the slot
+    extract: Callable[[str], Optional[Dict[str, str]]]
+    # Whether the opening message may fill the slot
+    prefill: bool = True
+    free_text: bool = False
+
+
+class Flow(NamedTuple):
+    tool: Any
+    slots: List[Slot]
+    # Arguments derived from the opening message
+    context: Callable[[str], Dict[str, str]] = lambda opening: {}
+    # Name of the tool argument that carries the student id
+    owner_arg: str = "student_id"
+
+
+def _text(arg: str, question: str, prefill: bool = True) -> Slot:
+    def extract(answer: str) -> Optional[Dict[str, str]]:
+        answer = answer.strip()
+        return {arg: answer} if len(answer) >= 3 else None
+
+    return Slot((arg,), question, extract, prefill, free_text=True)
+
+
+def _choice(arg: str, question: str, options: Dict[str, str]) -> Slot:
+    def extract(answer: str) -> Optional[Dict[str, str]]:
+        lowered = answer.lower()
+        for stem, value in options.items():
+            if stem in lowered:
+                return {arg: value}
+        return None
+
+    return Slot((arg,), question, extract)
+
+
+def _date_range(start_arg: str, end_arg: str, question: str) -> Slot:
+    def extract(answer: str) -> Optional[Dict[str, str]]:
+        dates = parse_dates(answer)
+        return {start_arg: dates[0], end_arg: dates[1]} if len(dates) >= 2 else None
+
+    return Slot((start_arg, end_arg), question, extract)
+
+
+def _single_date(arg: str, question: str) -> Slot:
+    def extract(answer: str) -> Optional[Dict[str, str]]:
+        dates = parse_dates(answer)
+        return {arg: dates[0]} if dates else None
+
+    return Slot((arg,), question, extract)
+
+
+def _pattern(arg: str, question: str, pattern: re.Pattern) -> Slot:
+    def extract(answer: str) -> Optional[Dict[str, str]]:
+        match = pattern.search(answer)
+        return {arg: match.group(0).strip()} if match else None
+
+    return Slot((arg,), question, extract)
+
+
+def _issue_type(opening: str) -> Dict[str, str]:
+    lowered = opening.lower()
+    for stem, issue_type in (("ссылк", "ссылки"), ("хб", "ХБ"), ("звайд", "Звайд"), ("пароль", "пароли")):
+        if stem in lowered:
+            return {"issue_type": issue_type}
+    return {"issue_type": "платформа"}
+
+
+# Keyed by routing_rules ticket type; questions follow the agent prompt
+FLOWS: Dict[str, Flow] = {
+    "refund": Flow(request_refund, [
+        _text("reason", "Укажите, пожалуйста, подробную причину возврата. Мы обязательно рассмотрим Ваш запрос."),
+    ]),
+    "freeze": Flow(request_freeze, [
+        _date_range("duration_start", "duration_end",
+                    "На какой срок хотите заморозку (от 1 до 2 месяцев)? Укажите, пожалуйста, даты начала и конца, "
+                    "например: с 1 марта по 30 апреля."),
+    ], context=lambda opening: {"reason": opening}),
+    "unfreeze": Flow(request_unfreeze, [
+        _single_date("preferred_date", "С какой даты готовы продолжить обучение? Например: с 15 марта."),
+    ]),
+    "bonus": Flow(use_bonus, [
+        _choice("bonus_type", "Какой бонус хотите использовать: консультацию или доступ к платформе?",
+                {"консульт": "консультация", "платформ": "доступ к платформе", "друг": "другое"}),
+    ], context=lambda opening: {"details": opening}),
+    "group_change": Flow(change_group_or_teacher, [
+        _text("reason", "Почему хотите сменить группу или учителя?"),
+        _text("preferences", "Какие время и дни занятий Вам удобны?", prefill=False),
+    ]),
+    "technical_platform": Flow(tech_issue_platform, [
+        _text("description", "Опишите, пожалуйста, проблему подробнее: что именно не работает и когда это началось?"),
+    ], context=_issue_type),
+    "certificate": Flow(request_attendance_certificate, [
+        _text("purpose", "Для какой цели нужна справка (работа, виза и т.д.)?"),
+    ]),
+    "extension": Flow(extend_or_purchase_course, [
+        _choice("request_type", "Вы хотите продлить текущий курс или докупить новый?",
+                {"продл": "продление", "докуп": "допродажа", "куп": "допродажа", "нов": "допродажа"}),
+        _text("details", "Уточните, пожалуйста, какой курс и на какой срок.", prefill=False),
+    ]),
+    "partner_program": Flow(partner_program_request, [
+        _text("invitee_name", "Укажите, пожалуйста, ФИО приглашённого.", prefill=False),
+        _pattern("invitee_telegram", "Укажите Telegram приглашённого (например, @username).", _TELEGRAM),
+        _pattern("invitee_phone", "Укажите номер телефона приглашённого.", _PHONE),
+    ]),
+    "staff_issue": Flow(staff_issue, [
+        _text("issue_description", "Опишите, пожалуйста, суть проблемы подробно."),
+    ], owner_arg="staff_id"),
+}
+
+MENU = (
+    "Сейчас я работаю в упрощённом режиме, но могу оформить заявку. Напишите, что Вам нужно: "
+    "возврат средств, заморозка или разморозка обучения, бонусы, смена группы или учителя, "
+    "техническая проблема, справка о присутствии, продление или докупка курса, партнёрская программа."
+)
+
+
+class FallbackEngine:
+    def __init__(self, state: Any = None):
+        self._state = state
+
+    @property
+    def state(self) -> Any:
+        if self._state is None:
+            self._state = get_state()
+        return self._state
+
+    def _key(self, student_id: str) -> str:
+        return f"fallback:dialog:{student_id}"
+
+    def in_progress(self, student_id: str) -> bool:
+        return self.state.get(self._key(student_id)) is not None
+
+    def handle(self, student_id: str, message: str) -> Dict:
+        """Advance the student's dialog by one message; returns {"response", "ticket"}"""
+        key = self._key(student_id)
+        raw = self.state.get(key)
+
+        if raw is not None and message.strip().lower() in _CANCEL:
+            self.state.delete(key)
+            return {"response": "Хорошо, запрос отменён. Чем ещё могу помочь?", "ticket": None}
+
+        if raw is None:
+            intent = detect_intent(message)
+            if intent is None or intent.type not in FLOWS:
+                return {"response": MENU, "ticket": None}
+            flow = FLOWS[intent.type]
+            dialog = {"type": intent.type, "args": dict(flow.context(message)), "slot": 0}
+            words = len(message.split())
+            for slot in flow.slots:
+                if slot.prefill and (not slot.free_text or words >= PREFILL_MIN_WORDS):
+                    dialog["args"].update(slot.extract(message) or {})
+        else:
+            dialog = json.loads(raw)
+            flow = FLOWS[dialog["type"]]
+            values = flow.slots[dialog["slot"]].extract(message)
+            if values is None:
+                return {"response": "Не совсем понял ответ. " + flow.slots[dialog["slot"]].question, "ticket": None}
+            dialog["args"].update(values)
+
+        for index, slot in enumerate(flow.slots):
+            if not all(arg in dialog["args"] for arg in slot.args):
+                dialog["slot"] = index
+                self.state.set(key, json.dumps(dialog, ensure_ascii=False), ttl=DIALOG_TTL)
+                return {"response": slot.question, "ticket": None}
+
+        self.state.delete(key)
+        return self._submit(student_id, dialog["type"], flow, dialog["args"])
+
+    def _submit(self, student_id: str, ticket_type: str, flow: Flow, args: Dict[str, str]) -> Dict:
+        with collect_tickets() as tickets:
+            response = flow.tool.invoke(dict(args, **{flow.owner_arg: student_id}))
+        METRICS.increment("fallback_tickets_total", type=ticket_type)
+        logger.info(f"Fallback engine issued a {ticket_type} request for {student_id}")
+        return {"response": response, "ticket": tickets[-1].payload() if tickets else None}
+
+
+FALLBACK = FallbackEngine()
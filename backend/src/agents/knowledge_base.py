@@ -0,0 +1,238 @@
+"""
+Local knowledge base of approved answers
+Canned fixes from the system prompt (scenario 6 and simple process questions)
+are matched with a character n-gram TF-IDF index built at import time. A
+confident match is answered directly, without an LLM round-trip; everything
+else goes to the agent.
+
+Similarity alone is not enough: generic phrases like "не работает" score
+high against every entry. A match also needs one of the entry's anchor
+words in the message, and the message must not mention a flow the entry
+does not cover (a refund request that also says "ссылка не открывается" is
+a refund request).
+
+python -m src.agents.knowledge_base fixtures/replay_messages.jsonl
+    reports hit rate and saved LLM calls on replay fixtures
+"""
+import json
+import math
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple, Optional
+
+from src.agents.routing_rules import detect_intents
+
+CONFIDENCE_THRESHOLD = float(os.getenv("KB_CONFIDENCE_THRESHOLD", "0.7"))
+NGRAM_SIZES = (3, 4)
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+# The student already tried the canned fix: the agent has to take over
+_ALREADY_TRIED = ("не помог", "пробовал", "уже делал", "уже сделал", "включал", "обновлял", "всё равно", "все равно")
+
+
+# "anchors": word stems one of which the message must contain
+# "intents": the only flows (see routing_rules) the message may mention
+KNOWLEDGE_BASE = [
+    {
+        "id": "tech_link",
+        "anchors": ["ссылк"],
+        "intents": ["technical_platform"],
+        "questions": [
+            "ссылка не открывается",
+            "не работает ссылка на урок",
+            "не могу перейти по ссылке",
+            "ссылка не кликается",
+            "ссылка на занятие не работает",
+        ],
+        "answer": "Попробуйте, пожалуйста, скопировать ссылку и вставить её в адресную строку браузера — "
+                  "обычно это решает проблему. Если не поможет, напишите, и я создам заявку куратору.",
+    },
+    {
+        "id": "tech_hb",
+        "anchors": ["хб"],
+        "intents": ["technical_platform"],
+        "questions": [
+            "хб не работает",
+            "не открывается хб",
+            "хб не грузится",
+            "не могу зайти на хб",
+            "хб выдает ошибку",
+        ],
+        "answer": "Пожалуйста, включите VPN или подождите около 5 минут и попробуйте снова — "
+                  "ХБ иногда бывает недоступен. Если проблема останется, сообщите мне, и я передам её куратору.",
+    },
+    {
+        "id": "tech_zvaid",
+        "anchors": ["звайд", "zvaid"],
+        "intents": ["technical_platform"],
+        "questions": [
+            "звайд не работает",
+            "звайд глючит",
+            "звайд завис",
+            "не грузится звайд",
+            "ошибка в звайде",
+        ],
+        "answer": "Звайд иногда глючит — обновите, пожалуйста, страницу. "
+                  "Если после обновления проблема не исчезнет, напишите, и я создам заявку.",
+    },
+    {
+        "id": "platform_password",
+        "anchors": ["парол"],
+        "intents": ["technical_platform"],
+        "questions": [
+            "где взять пароль от платформы",
+            "какой пароль от платформы",
+            "не знаю пароль от платформы",
+            "дайте пароль от платформы",
+        ],
+        "answer": "Пароли от платформы предоставляет Ваш куратор. Если куратор ещё не прислал доступы, "
+                  "напишите мне, и я создам заявку на выдачу пароля.",
+    },
+    {
+        "id": "refund_timeline",
+        "anchors": ["возврат"],
+        "intents": ["refund"],
+        "questions": [
+            "сколько рассматривается возврат",
+            "как долго ждать возврат",
+            "когда рассмотрят возврат",
+        ],
+        "answer": "Запрос на возврат рассматривают операционный и сервисный директор в течение 24 часов. "
+                  "Статус можно отслеживать в разделе «Мои Заявки».",
+    },
+    {
+        "id": "freeze_limits",
+        "anchors": ["замороз", "заморож"],
+        "intents": ["freeze"],
+        "questions": [
+            "на сколько можно заморозить обучение",
+            "максимальный срок заморозки",
+            "какой срок заморозки",
+        ],
+        "answer": "Заморозку обучения можно оформить на срок от 1 до 2 месяцев. "
+                  "Если хотите оформить заморозку, напишите даты начала и окончания.",
+    },
+]
+
+
+class KBMatch(NamedTuple):
+    entry_id: str
+    answer: str
+    confidence: float
+
+
+def _normalize(text: str) -> str:
+    return " " + _NON_WORD.sub(" ", text.lower().replace("ё", "е")).strip() + " "
+
+
+def _ngrams(text: str) -> Counter:
+    text = _normalize(text)
+    grams = Counter()
+    for n in NGRAM_SIZES:
+        grams.update(text[i:i + n] for i in range(len(text) - n + 1))
+    return grams
+
+
+class KnowledgeBaseIndex:
+    """Cosine similarity over TF-IDF weighted character n-grams with an inverted index"""
+
+    def __init__(self, entries: List[Dict]):
+        self.entries = entries
+        self.docs: List[int] = []  # doc index -> entry index
+        doc_grams: List[Counter] = []
+        for entry_index, entry in enumerate(entries):
+            for question in entry["questions"]:
+                self.docs.append(entry_index)
+                doc_grams.append(_ngrams(question))
+
+        document_frequency = Counter(g for grams in doc_grams for g in grams)
+        total = len(doc_grams)
+        self.idf = {g: math.log((1 + total) / (1 + df)) + 1 for g, df in document_frequency.items()}
+
+        self.postings: Dict[str, List[tuple]] = defaultdict(list)
+        for doc, grams in enumerate(doc_grams):
+            weights = {g: tf * self.idf[g] for g, tf in grams.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for g, w in weights.items():
+                self.postings[g].append((doc, w / norm))
+
+    def entry(self, entry_id: str) -> Dict:
+        return next(entry for entry in self.entries if entry["id"] == entry_id)
+
+    def best(self, message: str) -> Optional[KBMatch]:
+        grams = _ngrams(message)
+        weights = {g: tf * self.idf[g] for g, tf in grams.items() if g in self.idf}
+        # Unknown n-grams still count towards the query norm: long messages with
+        # extra details are less similar to a canned question
+        unknown = sum(tf for g, tf in grams.items() if g not in self.idf)
+        norm = math.sqrt(sum(w * w for w in weights.values()) + unknown) or 1.0
+
+        scores: Dict[int, float] = defaultdict(float)
+        for g, w in weights.items():
+            for doc, doc_weight in self.postings[g]:
+                scores[doc] += w / norm * doc_weight
+        if not scores:
+            return None
+        doc, score = max(scores.items(), key=lambda item: item[1])
+        entry = self.entries[self.docs[doc]]
+        return KBMatch(entry["id"], entry["answer"], score)
+
+
+INDEX = KnowledgeBaseIndex(KNOWLEDGE_BASE)
+
+
+def answer_from_kb(message: str, chat_history: Optional[List[Dict]] = None,
+                   threshold: float = CONFIDENCE_THRESHOLD) -> Optional[KBMatch]:
+    """
+    Approved answer for `message` if the match is confident enough
+
+    The message must contain one of the entry's anchors and mention no flow
+    outside the entry's intents. If the same answer was already given in
+    this conversation, or the student says they tried it, the canned fix did
+    not help and the agent has to take over (e.g. to create a ticket).
+    """
+    lowered = message.lower()
+    if any(phrase in lowered for phrase in _ALREADY_TRIED):
+        return None
+    match = INDEX.best(message)
+    if match is None or match.confidence < threshold:
+        return None
+    entry = INDEX.entry(match.entry_id)
+    normalized = _normalize(message)
+    if not any(" " + anchor in normalized for anchor in entry["anchors"]):
+        return None
+    if any(intent.type not in entry["intents"] for intent in detect_intents(message)):
+        return None
+    for msg in chat_history or []:
+        if msg.get("role") == "assistant" and match.answer in msg.get("content", ""):
+            return None
+    return match
+
+
+if __name__ == "__main__":
+    # Replay fixture lines: {"message": ..., "history": [...], "expected_kb": "tech_hb" | null}
+    hits = correct = wrong = total = 0
+    with open(sys.argv[1], encoding="utf-8") as fixtures:
+        for line in fixtures:
+            if not line.strip():
+                continue
+            case = json.loads(line)
+            total += 1
+            match = answer_from_kb(case["message"], case.get("history"))
+            if match:
+                hits += 1
+                if match.entry_id == case.get("expected_kb"):
+                    correct += 1
+                else:
+                    wrong += 1
+    print(json.dumps({
+        "messages": total,
+        "kb_hits": hits,
+        "hit_rate": round(hits / total, 3) if total else 0.0,
+        "correct_hits": correct,
+        "wrong_hits": wrong,
+        "llm_calls_saved": correct,
+    }, ensure_ascii=False))
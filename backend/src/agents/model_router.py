@@ -0,0 +1,250 @@
+"""
+Model routing layer for the support agent
+Primary model + ordered fallbacks, hedged requests and failover on 429/5xx,
+with a circuit breaker per model
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from langchain_core.runnables import Runnable
+from src.agents.deadline import DeadlineExceeded, current_deadline
+from src.services.circuit_breaker import CircuitBreaker, CircuitOpenError, get_breaker
+
+logger = logging.getLogger(__name__)
+
+# Shared pool for model calls; hedged duplicates need a second free thread
+_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_ROUTER_WORKERS", "16")),
+    thread_name_prefix="llm-router",
+)
+
+_STATUS_IN_MESSAGE = re.compile(r"\b(429|5\d\d)\b")
+
+# Calls slower than this count as failures for the circuit breaker
+SLOW_CALL_SECONDS = float(os.getenv("LLM_SLOW_CALL_SECONDS", "20"))
+
+
+class LatencyStats:
+    """Rolling window of successful call latencies (seconds) for one model"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.calls += 1
+
+    def record_error(self) -> None:
+        with self._lock:
+            self.calls += 1
+            self.errors += 1
+
+    def count(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "samples": self.count(),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+        }
+
+
+# Stats outlive a single agent instance (agents are built per request)
+_STATS: Dict[str, LatencyStats] = {}
+_STATS_LOCK = threading.Lock()
+
+
+def get_latency_stats(name: str) -> LatencyStats:
+    with _STATS_LOCK:
+        stats = _STATS.get(name)
+        if stats is None:
+            stats = _STATS[name] = LatencyStats()
+        return stats
+
+
+def latency_snapshot() -> Dict[str, Dict[str, Any]]:
+    with _STATS_LOCK:
+        names = list(_STATS)
+    return {name: get_latency_stats(name).snapshot() for name in names}
+
+
+def is_retryable_error(exc: BaseException) -> bool:
+    """True for rate limiting (429), server-side (5xx) failures and timeouts of the model call"""
+    # The turn's own deadline is not the model's fault; another model would not beat it
+    if isinstance(exc, DeadlineExceeded):
+        return False
+    if isinstance(exc, (TimeoutError, httpx.TimeoutException)):
+        return True
+    candidates = [
+        getattr(exc, "status_code", None),
+        getattr(exc, "code", None),
+        getattr(getattr(exc, "response", None), "status_code", None),
+    ]
+    for code in candidates:
+        try:
+            code = int(code)
+        except (TypeError, ValueError):
+            continue
+        return code == 429 or 500 <= code < 600
+    return bool(_STATUS_IN_MESSAGE.search(str(exc)))
+
+
+class ModelRouter(Runnable):
+    """
+    Drop-in replacement for a chat model inside the agent.
+
+    Models are tried in order. A 429/5xx from one model fails over to the
+    next one; any other error is raised as is. With hedging enabled, if the
+    current model has not answered after its hedge delay (a latency
+    percentile from past calls), the same request is sent to the next model
+    and the first successful response wins. Models whose circuit breaker is
+    open are skipped; if all are open, CircuitOpenError is raised at once.
+    """
+
+    def __init__(
+        self,
+        models: Sequence[Tuple[str, Any]],
+        hedge: bool = True,
+        hedge_percentile: float = 95.0,
+        initial_hedge_delay: float = 4.0,
+        min_hedge_delay: float = 0.2,
+        min_samples: int = 20,
+    ):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models: List[Tuple[str, Any]] = list(models)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+
+    def _with_models(self, models: Sequence[Tuple[str, Any]]) -> "ModelRouter":
+        return ModelRouter(
+            models,
+            hedge=self.hedge,
+            hedge_percentile=self.hedge_percentile,
+            initial_hedge_delay=self.initial_hedge_delay,
+            min_hedge_delay=self.min_hedge_delay,
+            min_samples=self.min_samples,
+        )
+
+    def bind_tools(self, tools, **kwargs) -> "ModelRouter":
+        return self._with_models([(name, model.bind_tools(tools, **kwargs)) for name, model in self.models])
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Seconds to wait on `name` before sending a duplicate request"""
+        if not self.hedge:
+            return None
+        stats = get_latency_stats(name)
+        delay = stats.percentile(self.hedge_percentile) if stats.count() >= self.min_samples else None
+        if delay is None:
+            delay = self.initial_hedge_delay
+        return max(delay, self.min_hedge_delay)
+
+    @staticmethod
+    def breaker(name: str) -> CircuitBreaker:
+        return get_breaker(f"gemini:{name}")
+
+    def _take_available(self, remaining: List[Tuple[str, Any]]) -> Optional[Tuple[str, Any]]:
+        """Pop the next model whose breaker lets a call through"""
+        while remaining:
+            name, model = remaining.pop(0)
+            if self.breaker(name).allow():
+                return name, model
+            logger.info(f"Skipping model {name}: circuit breaker open")
+        return None
+
+    def _call(self, name: str, model: Any, input: Any, config: Any, kwargs: Dict[str, Any]) -> Any:
+        stats = get_latency_stats(name)
+        breaker = self.breaker(name)
+        started = time.perf_counter()
+        try:
+            result = model.invoke(input, config, **kwargs)
+        except Exception as exc:
+            stats.record_error()
+            # Client errors (bad request, safety blocks) mean the upstream is up
+            if is_retryable_error(exc):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        elapsed = time.perf_counter() - started
+        stats.record(elapsed)
+        if elapsed >= SLOW_CALL_SECONDS:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return result
+
+    def _submit(self, name: str, model: Any, input: Any, config: Any, kwargs: Dict[str, Any]):
+        return _EXECUTOR.submit(self._call, name, model, input, config, kwargs)
+
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs: Any) -> Any:
+        remaining = list(self.models)
+        last_error: Optional[BaseException] = None
+        deadline = current_deadline()
+
+        def time_left(timeout: Optional[float] = None) -> Optional[float]:
+            if deadline is None:
+                return timeout
+            return deadline.remaining() if timeout is None else min(timeout, deadline.remaining())
+
+        while remaining:
+            if deadline is not None:
+                deadline.check("LLM call")
+            picked = self._take_available(remaining)
+            if picked is None:
+                break
+            name, model = picked
+            in_flight = {self._submit(name, model, input, config, kwargs): name}
+
+            if remaining:
+                done, _ = wait(in_flight, timeout=time_left(self.hedge_delay(name)))
+                hedge = None if done or (deadline and deadline.expired()) else self._take_available(remaining)
+                if hedge is not None:
+                    hedge_name, hedge_model = hedge
+                    logger.info(f"Hedging request: {name} slower than hedge delay, sending to {hedge_name}")
+                    in_flight[self._submit(hedge_name, hedge_model, input, config, kwargs)] = hedge_name
+
+            while in_flight:
+                done, _ = wait(in_flight, timeout=time_left(), return_when=FIRST_COMPLETED)
+                if not done:
+                    raise DeadlineExceeded(f"LLM call to {', '.join(in_flight.values())} ran past the deadline")
+                for future in done:
+                    model_name = in_flight.pop(future)
+                    try:
+                        return future.result()
+                    except Exception as exc:
+                        if not is_retryable_error(exc):
+                            raise
+                        logger.warning(f"Model {model_name} failed with retryable error: {exc}")
+                        last_error = exc
+
+        if last_error is None:
+            retry_after = min(self.breaker(name).retry_after() for name, _ in self.models)
+            raise CircuitOpenError("gemini", retry_after)
+        raise last_error
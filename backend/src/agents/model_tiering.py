@@ -0,0 +1,142 @@
+"""
+Model tiering by turn complexity
+Scores each chat turn with cheap local features (length, detected intent,
+pending request in the conversation, history depth) and picks a tier:
+
+- light: small/fast model, short prompt, no tools; greetings, thanks and
+         general questions about courses and the platform
+- agent: the full tool-calling agent; everything that may end in a ticket
+
+A detected intent or a request still being discussed always selects the
+agent tier, so ticket flows never reach the light model. The light model can
+also hand a turn back (see ESCALATE in support_agent) when it is unsure.
+Pure Python, no LLM calls.
+"""
+import logging
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from src.agents.routing_rules import detect_intent
+
+logger = logging.getLogger(__name__)
+
+TIERING_ENABLED = os.getenv("MODEL_TIERING_ENABLED", "true").lower() == "true"
+# Turns scoring below this go to the light tier
+TIER_THRESHOLD = float(os.getenv("MODEL_TIER_THRESHOLD", "1.0"))
+# Message length (chars) and history depth (messages) at which their feature saturates
+LENGTH_SCALE = int(os.getenv("MODEL_TIER_LENGTH_SCALE", "400"))
+HISTORY_SCALE = int(os.getenv("MODEL_TIER_HISTORY_SCALE", "10"))
+# Recent messages searched for a request that is still being discussed
+PENDING_WINDOW = int(os.getenv("MODEL_TIER_PENDING_WINDOW", "6"))
+
+# An assistant message that confirms a ticket closes the request it belongs to
+_TICKET_CONFIRMED = re.compile(r"#[A-Z]+-\d+|тикет\s.*создан|заявка\s.*создана", re.IGNORECASE)
+
+
+class Tier(NamedTuple):
+    name: str
+    model: str
+    temperature: float
+    max_output_tokens: Optional[int]
+    tools: bool
+    # USD per 1M tokens, for usage and savings reports
+    input_price: float
+    output_price: float
+    # Nominal latency model used when a run has no measured latency (replay)
+    base_seconds: float
+    seconds_per_1k_tokens: float
+
+
+def _tier_from_env(name: str, model: str, temperature: float, max_output_tokens: Optional[int], tools: bool,
+                   input_price: float, output_price: float, base_seconds: float, per_1k: float) -> Tier:
+    prefix = f"MODEL_TIER_{name.upper()}_"
+    max_tokens = os.getenv(prefix + "MAX_TOKENS")
+    return Tier(
+        name=name,
+        model=os.getenv(prefix + "MODEL", model),
+        temperature=float(os.getenv(prefix + "TEMPERATURE", str(temperature))),
+        max_output_tokens=int(max_tokens) if max_tokens else max_output_tokens,
+        tools=tools,
+        input_price=float(os.getenv(prefix + "INPUT_PRICE", str(input_price))),
+        output_price=float(os.getenv(prefix + "OUTPUT_PRICE", str(output_price))),
+        base_seconds=float(os.getenv(prefix + "BASE_SECONDS", str(base_seconds))),
+        seconds_per_1k_tokens=float(os.getenv(prefix + "SECONDS_PER_1K_TOKENS", str(per_1k))),
+    )
+
+
+def default_tiers() -> Dict[str, Tier]:
+    return {
+        "light": _tier_from_env("light", "gemini-2.0-flash-lite", 0.3, 256, False, 0.075, 0.30, 0.4, 0.1),
+        "agent": _tier_from_env("agent", os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp"), 0.7, None, True,
+                                0.10, 0.40, 0.8, 0.25),
+    }
+
+
+class TurnFeatures(NamedTuple):
+    length: int
+    intent: Optional[str]
+    pending: Optional[str]
+    history_depth: int
+
+
+class TierDecision(NamedTuple):
+    tier: str
+    score: float
+    features: TurnFeatures
+
+
+def pending_request(chat_history: List[Dict]) -> Optional[str]:
+    """Ticket type the recent conversation is still about, None once it was confirmed"""
+    for msg in reversed(chat_history[-PENDING_WINDOW:]):
+        if msg.get("role") == "assistant" and _TICKET_CONFIRMED.search(msg.get("content") or ""):
+            return None
+        if msg.get("role") == "user":
+            intent = detect_intent(msg.get("content") or "")
+            if intent:
+                return intent.type
+    return None
+
+
+def turn_features(message: str, chat_history: Optional[List[Dict]] = None) -> TurnFeatures:
+    chat_history = chat_history or []
+    intent = detect_intent(message)
+    return TurnFeatures(
+        length=len(message),
+        intent=intent.type if intent else None,
+        pending=pending_request(chat_history),
+        history_depth=len(chat_history),
+    )
+
+
+class ModelTiering:
+    def __init__(self, enabled: bool = TIERING_ENABLED, threshold: float = TIER_THRESHOLD,
+                 tiers: Optional[Dict[str, Tier]] = None):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.tiers = tiers or default_tiers()
+
+    @staticmethod
+    def score(features: TurnFeatures) -> float:
+        """Near 0 for a short first message without intent; >= 1 whenever a ticket flow is involved"""
+        if features.intent or features.pending:
+            return 1.0 + min(features.length / LENGTH_SCALE, 1.0)
+        return round(0.6 * min(features.length / LENGTH_SCALE, 1.0)
+                     + 0.4 * min(features.history_depth / HISTORY_SCALE, 1.0), 3)
+
+    def route(self, message: str, chat_history: Optional[List[Dict]] = None) -> TierDecision:
+        features = turn_features(message, chat_history)
+        score = self.score(features)
+        flow = features.intent or features.pending
+        tier = "light" if self.enabled and not flow and score < self.threshold else "agent"
+        return TierDecision(tier, score, features)
+
+    def estimate(self, tier: str, input_tokens: int, output_tokens: int) -> Tuple[float, float]:
+        """(USD, seconds) of one call on `tier`, from the configured prices and latency model"""
+        config = self.tiers[tier]
+        cost = (input_tokens * config.input_price + output_tokens * config.output_price) / 1_000_000
+        seconds = config.base_seconds + config.seconds_per_1k_tokens * (input_tokens + output_tokens) / 1000
+        return cost, seconds
+
+
+TIERING = ModelTiering()
@@ -0,0 +1,100 @@
+"""
+Local routing rules for support requests
+Keyword-based intent detection and the ticket priority rules used by the tools.
+Pure Python (no LLM, no LangChain) so it can run in worker processes and CLIs.
+"""
+from typing import Dict, List, NamedTuple, Optional
+
+
+class Intent(NamedTuple):
+    type: str
+    tool: str
+    category: str
+    score: float
+
+
+# Ticket type -> (tool name, category, keyword stems). Order matters on ties:
+# more specific flows come before generic technical/staff ones.
+INTENT_RULES: List[tuple] = [
+    ("refund", "request_refund", "Возврат средств",
+     ["возврат", "вернуть деньги", "верните деньги", "вернуть средства", "refund", "деньги назад"]),
+    ("unfreeze", "request_unfreeze", "Разморозка обучения",
+     ["разморо", "продолжить обучение", "продолжить занятия", "вернуться к обучению", "возобнов"]),
+    ("freeze", "request_freeze", "Заморозка обучения",
+     ["замороз", "заморож", "приостанов", "пауз", "перерыв в обучении"]),
+    ("bonus", "use_bonus", "Использование бонусов",
+     ["бонус", "консультац", "подарок"]),
+    ("group_change", "change_group_or_teacher", "Смена группы/учителя",
+     ["сменить груп", "смена груп", "другую груп", "перевести в груп", "поменять груп",
+      "сменить учител", "смена учител", "другого учител", "поменять учител", "сменить преподавател"]),
+    ("certificate", "request_attendance_certificate", "Справка о присутствии",
+     ["справк", "certificate"]),
+    ("extension", "extend_or_purchase_course", "Продление/Докупка курсов",
+     ["продлен", "продлить", "докуп", "купить курс", "ещё курс", "еще курс", "допродаж"]),
+    ("partner_program", "partner_program_request", "Партнерская программа",
+     ["партнер", "партнёр", "пригласил", "привел друга", "привела друга", "реферал"]),
+    ("technical_platform", "tech_issue_platform", "Технические проблемы",
+     ["ссылк", "платформ", "хб", "звайд", "zvaid", "пароль", "не открывается", "не работает",
+      "не могу войти", "не загружа", "ошибка", "vpn", "впн", "доступ"]),
+    ("staff_issue", "staff_issue", "Проблемы сотрудников",
+     ["сотрудник", "куратор не", "зарплат", "коллег"]),
+    ("teacher-message", "contact_teacher", "Сообщение преподавателю",
+     ["передайте учител", "написать учител", "сообщение учител", "сообщение преподавател",
+      "передайте преподавател", "написать преподавател"]),
+    ("document", "request_document", "Документы",
+     ["выписк", "документ", "договор"]),
+]
+
+CATEGORY_BY_TYPE: Dict[str, str] = {type_: category for type_, _, category, _ in INTENT_RULES}
+CATEGORY_BY_TYPE["technical"] = "Технические проблемы"
+
+# Fixed priorities per ticket type; keyword-dependent types are handled in ticket_priority()
+BASE_PRIORITY: Dict[str, str] = {
+    "refund": "high",
+    "freeze": "medium",
+    "unfreeze": "medium",
+    "bonus": "low",
+    "group_change": "medium",
+    "certificate": "medium",
+    "extension": "medium",
+    "partner_program": "low",
+    "document": "low",
+    "teacher-message": "medium",
+}
+
+
+def detect_intents(text: str) -> List[Intent]:
+    """Every business flow `text` mentions, best match first (rule order on ties)"""
+    lowered = text.lower()
+    intents = []
+    for type_, tool_name, category, keywords in INTENT_RULES:
+        hits = sum(1 for keyword in keywords if keyword in lowered)
+        if hits:
+            intents.append(Intent(type_, tool_name, category, float(hits)))
+    return sorted(intents, key=lambda intent: -intent.score)
+
+
+def detect_intent(text: str) -> Optional[Intent]:
+    """Best-matching business flow for `text`, or None for small talk / unknown"""
+    intents = detect_intents(text)
+    return intents[0] if intents else None
+
+
+def ticket_priority(ticket_type: str, text: str = "") -> str:
+    """Priority rules shared by the ticket tools and offline classification"""
+    lowered = text.lower()
+    if ticket_type == "technical":
+        if any(word in lowered for word in ["не могу войти", "срочно", "важно", "критично"]):
+            return "high"
+        if any(word in lowered for word in ["вопрос", "уточнить", "помощь"]):
+            return "low"
+        return "medium"
+    if ticket_type == "technical_platform":
+        return "high" if "не могу войти" in lowered or "доступ" in lowered else "medium"
+    if ticket_type == "staff_issue":
+        if any(word in lowered for word in ["срочно", "критично", "не работает"]):
+            return "high"
+        if any(word in lowered for word in ["вопрос", "уточнить"]):
+            return "low"
+        return "medium"
+    return BASE_PRIORITY.get(ticket_type, "medium")
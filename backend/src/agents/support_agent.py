@@ -2,36 +2,158 @@
 AI Agent for Student Support using LangChain + Google Gemini
 Automatically detects student problems and suggests solutions
 """
+import asyncio
+import functools
+import logging
 import os
+import time
 import warnings
+from collections import Counter
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.messages import HumanMessage, AIMessage
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Optional
 from src.agents.tools import TOOLS
+from src.agents.ticketing import bind_owner, collect_tickets
+from src.agents.knowledge_base import answer_from_kb
+from src.agents.fallback_engine import FALLBACK
+from src.agents.degradation import DEGRADATION
+from src.agents.routing_rules import detect_intent
+from src.schemas.tickets import Ticket
+from src.agents.model_router import ModelRouter
+from src.agents.model_tiering import TIERING, ModelTiering
+from src.services.circuit_breaker import CircuitOpenError
+from src.agents.deadline import DEFAULT_BUDGET, MAX_BUDGET, Deadline, DeadlineExceeded, deadline_scope
+from src.services.metrics import METRICS
+from src.services.profile_cache import PROFILES, profile_fetches
+from src.services.token_usage import USAGE, extract_usage
+from src.services.transcript_log import TRANSCRIPTS
 
 # Suppress Gemini schema warnings
 warnings.filterwarnings("ignore", message="Key 'title' is not supported in schema")
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+
+class _ToolOutputCollector(BaseCallbackHandler):
+    """Records tool calls and raw tool outputs of a single agent turn, reporting them to `on_event` as they happen"""
+
+    def __init__(self, on_event: Optional[Callable[[str, Any], None]] = None):
+        self.outputs: List[str] = []
+        self.calls: List[Dict[str, Any]] = []
+        self._open_calls: Dict[Any, Dict[str, Any]] = {}
+        self._on_event = on_event
+
+    def on_tool_start(self, serialized: Dict[str, Any], input_str: str, *, run_id: Any = None, **kwargs: Any) -> None:
+        call = {"tool": (serialized or {}).get("name"), "input": input_str}
+        self.calls.append(call)
+        self._open_calls[run_id] = call
+        if self._on_event is not None:
+            self._on_event("tool", {"name": call["tool"], "status": "started"})
+
+    def on_tool_end(self, output: Any, *, run_id: Any = None, **kwargs: Any) -> None:
+        self.outputs.append(str(output))
+        call = self._open_calls.pop(run_id, None)
+        if call is not None:
+            call["output"] = str(output)
+            if self._on_event is not None:
+                self._on_event("tool", {"name": call["tool"], "status": "finished"})
+
+
+class _TokenUsageCollector(BaseCallbackHandler):
+    """Sums token usage over every LLM response of a single agent turn (hedged calls included)"""
+
+    def __init__(self):
+        self.usage = Counter()
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        self.usage.update(extract_usage(response))
+
+
+def build_model_router(primary: Optional[str] = None, fallbacks_env: str = "GEMINI_FALLBACK_MODELS",
+                       temperature: float = 0.7, max_output_tokens: Optional[int] = None) -> ModelRouter:
+    """
+    Build the Gemini model router from environment configuration
+
+    GEMINI_MODEL is the primary model, GEMINI_FALLBACK_MODELS an ordered,
+    comma-separated list of fallbacks used for hedging and failover.
+    """
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+
+    primary = primary or os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+    fallbacks = [m.strip() for m in os.getenv(fallbacks_env, "").split(",") if m.strip()]
+
+    models = [
+        (name, ChatGoogleGenerativeAI(
+            model=name,
+            temperature=temperature,
+            max_output_tokens=max_output_tokens,
+            google_api_key=api_key,
+            # Bounded client: failover and circuit breaking happen in the router
+            timeout=float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30")),
+            max_retries=int(os.getenv("GEMINI_MAX_RETRIES", "1")),
+        ))
+        for name in [primary] + [m for m in fallbacks if m != primary]
+    ]
+    return ModelRouter(
+        models,
+        hedge=os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true",
+        hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95")),
+        initial_hedge_delay=float(os.getenv("LLM_HEDGE_INITIAL_DELAY", "4.0")),
+    )
+
+
+def build_light_model(tiering: ModelTiering = TIERING) -> ModelRouter:
+    """Router for the light tier: MODEL_TIER_LIGHT_MODEL plus MODEL_TIER_LIGHT_FALLBACK_MODELS, no tools"""
+    tier = tiering.tiers["light"]
+    return build_model_router(tier.model, "MODEL_TIER_LIGHT_FALLBACK_MODELS", tier.temperature, tier.max_output_tokens)
+
+
+# The light model answers with exactly this word to hand the turn to the full agent
+ESCALATE = "ESCALATE"
+
+LIGHT_PROMPT = f"""Ты — AI-ассистент Master Education для студентов и сотрудников.
+Отвечай кратко (1-3 предложения), дружелюбно, на русском языке: приветствия,
+благодарности, общие вопросы о курсах, платформе и процессах школы.
+
+Ты НЕ можешь создавать заявки. Если студенту нужно действие (возврат, заморозка,
+разморозка, бонус, смена группы или учителя, техническая проблема, справка,
+продление, партнерская программа, документ, сообщение преподавателю, проблема
+сотрудника) или ты не уверен в ответе — ответь ровно одним словом: {ESCALATE}
+"""
+
+
 class StudentSupportAgent:
-    def __init__(self, student_id: str = None):
+    def __init__(self, student_id: str = None, llm: Any = None, session_id: Optional[str] = None,
+                 light_llm: Any = None, tiering: Optional[ModelTiering] = None, verified: bool = False):
         # Ensure student_id is always a string
         self.student_id = str(student_id) if student_id else "unknown"
+        # Only a student proven by a session token gets profile fetches started for them
+        self.verified = verified and self.student_id != "unknown"
+        # Conversation the turns belong to, for the transcript archive
+        self.session_id = session_id
         
-        # Initialize Gemini LLM
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            raise ValueError("GEMINI_API_KEY not found in environment variables")
+        # Initialize Gemini LLM (or use the injected model, e.g. a fake for tests)
+        self.llm = llm if llm is not None else build_model_router()
         
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash-exp",
-            temperature=0.7,
-            google_api_key=api_key
-        )
+        # Easy turns go to the light tier; an injected model serves both tiers
+        self.tiering = tiering if tiering is not None else TIERING
+        if light_llm is not None or llm is not None:
+            self.light_llm = light_llm if light_llm is not None else llm
+        else:
+            self.light_llm = build_light_model(self.tiering) if self.tiering.enabled else None
+        self.light_prompt = ChatPromptTemplate.from_messages([
+            ("system", LIGHT_PROMPT),
+            MessagesPlaceholder(variable_name="chat_history"),
+            ("human", "{input}"),
+        ])
         
         # Create system prompt
         self.prompt = ChatPromptTemplate.from_messages([
@@ -142,28 +264,71 @@ Student ID: {student_id}
         ])
         
         # Create agent with tools
-        agent = create_tool_calling_agent(self.llm, TOOLS, self.prompt)
-        self.agent_executor = AgentExecutor(
-            agent=agent,
+        self.agent = create_tool_calling_agent(self.llm, TOOLS, self.prompt)
+        self.agent_executor = self._executor(MAX_BUDGET)
+    
+    def _executor(self, max_execution_time: float) -> AgentExecutor:
+        """Executor that stops between steps once `max_execution_time` seconds have passed"""
+        return AgentExecutor(
+            agent=self.agent,
             tools=TOOLS,
             verbose=True,
             handle_parsing_errors=True,
-            max_iterations=3
+            max_iterations=3,
+            max_execution_time=max_execution_time
         )
     
-    def chat(self, message: str, chat_history: List[Dict] = None) -> Dict:
+    def chat(self, message: str, chat_history: List[Dict] = None, deadline: Optional[Deadline] = None,
+             on_event: Optional[Callable[[str, Any], None]] = None) -> Dict:
         """
         Process a message from student and return AI response
         
         Args:
             message: Student's message
             chat_history: Previous chat messages
+            deadline: Time budget shared by every LLM and tool call in this turn
+            on_event: Called from the agent thread with ("tool", {...}) as tools start and finish
         
         Returns:
-            Dictionary with response and optional ticket data
+            Dictionary with response and optional ticket data; "degraded" names
+            the reason when the turn was not answered normally (fallback engine,
+            deadline, error)
         """
+        tool_outputs = _ToolOutputCollector(on_event)
+        # Tickets of a verified session always belong to its student, whatever id the LLM passes to tools
+        with profile_fetches(self.verified), bind_owner(self.student_id if self.verified else None):
+            result = self._chat(message, chat_history, deadline, tool_outputs)
+        # Queued for the archive's group commit; costs microseconds on this path
+        TRANSCRIPTS.append_turn(self.student_id, self.session_id, message, result, tool_outputs.calls)
+        return result
+    
+    def _chat(self, message: str, chat_history: Optional[List[Dict]], deadline: Optional[Deadline],
+              tool_outputs: _ToolOutputCollector) -> Dict:
         if chat_history is None:
             chat_history = []
+        if deadline is None:
+            deadline = Deadline(DEFAULT_BUDGET)
+        
+        # Warm the profile now; it is read by the ticket tools after the LLM call
+        if self.verified:
+            PROFILES.get(self.student_id)
+        
+        # A request already being collected by the rule-based engine is finished there
+        if FALLBACK.in_progress(self.student_id):
+            return self._fallback_answer(message, "dialog")
+        
+        # Approved answers for common tech questions skip the LLM entirely
+        kb_match = answer_from_kb(message, chat_history)
+        if kb_match:
+            METRICS.increment("kb_answers_total", entry=kb_match.entry_id)
+            return {"response": kb_match.answer, "ticket": None}
+        
+        if USAGE.over_budget(self.student_id):
+            return self._fallback_answer(message, "budget")
+        
+        degrade_reason = DEGRADATION.degrade_reason()
+        if degrade_reason:
+            return self._fallback_answer(message, degrade_reason)
         
         # Convert chat history to LangChain format
         history_messages = []
@@ -173,67 +338,179 @@ Student ID: {student_id}
             elif msg["role"] == "assistant":
                 history_messages.append(AIMessage(content=msg["content"]))
         
-        try:
-            response = self.agent_executor.invoke({
-                "input": message,
-                "chat_history": history_messages,
-                "student_id": str(self.student_id) if self.student_id else "unknown"
-            })
-            
-            output = response["output"]
-            
-            # Try to extract ticket data from response
-            import json
-            ticket_data = None
-            clean_response = output
-            
+        # Greetings, thanks and general questions skip the tool-calling agent
+        decision = self.tiering.route(message, chat_history)
+        if decision.tier == "light" and self.light_llm is not None:
+            answer = self._light_answer(message, history_messages, deadline)
+            if answer is not None:
+                METRICS.increment("model_tier_total", tier="light")
+                return answer
+            METRICS.increment("model_tier_escalations_total")
+        METRICS.increment("model_tier_total", tier="agent")
+        
+        # Tool outputs and ticket objects are collected as they happen, so a
+        # turn cut short by the deadline can still report a created ticket
+        token_usage = _TokenUsageCollector()
+        started = time.perf_counter()
+        ok = False
+        
+        with collect_tickets() as tickets:
             try:
-                # Check if output contains JSON with ticket info
-                if "{" in output and "ticket" in output:
-                    # Try to extract JSON from the response
-                    start = output.find("{")
-                    end = output.rfind("}") + 1
-                    if start != -1 and end > start:
-                        json_str = output[start:end]
-                        parsed = json.loads(json_str)
-                        
-                        if "ticket" in parsed:
-                            ticket_data = parsed["ticket"]
-                            clean_response = parsed.get("message", output)
-            except json.JSONDecodeError:
-                # If parsing fails, return original response
-                pass
+                # Every LLM call checks the deadline (see ModelRouter); the executor
+                # also stops between steps once the turn's budget is spent. It is
+                # built per turn, so concurrent turns never share the bound
+                executor = self._executor(deadline.remaining())
+                with DEGRADATION.admit(), deadline_scope(deadline):
+                    response = executor.invoke(
+                        {
+                            "input": message,
+                            "chat_history": history_messages,
+                            "student_id": str(self.student_id) if self.student_id else "unknown"
+                        },
+                        config={"callbacks": [tool_outputs, token_usage]},
+                    )
+                
+                if deadline.expired():
+                    return self._partial_answer(tool_outputs.outputs, tickets, "agent_loop")
+                
+                ok = True
+                return {
+                    "response": response["output"],
+                    "ticket": tickets[-1].payload() if tickets else None
+                }
             
-            result = {
-                "response": clean_response,
-                "ticket": ticket_data
-            }
+            except DeadlineExceeded:
+                return self._partial_answer(tool_outputs.outputs, tickets, "llm_call")
             
-            return result
+            except CircuitOpenError:
+                if not tickets:
+                    return self._fallback_answer(message, "circuit_open")
+                return {"response": tool_outputs.outputs[-1], "ticket": tickets[-1].payload(),
+                        "degraded": "circuit_open"}
+                
+            except Exception as e:
+                logger.error(f"Agent turn failed for student {self.student_id}: {e}")
+                if not tickets:
+                    return self._fallback_answer(message, "error")
+                return {
+                    "response": f"Извините, произошла ошибка: {str(e)}\n\nПопробуйте переформулировать вопрос или обратитесь в поддержку.",
+                    "ticket": tickets[-1].payload(),
+                    "degraded": "error"
+                }
             
+            finally:
+                elapsed = time.perf_counter() - started
+                METRICS.observe("chat_turn_seconds", elapsed)
+                DEGRADATION.record(ok, elapsed)
+                USAGE.record(self.student_id, self._usage_category(message, tickets), token_usage.usage)
+    
+    def _light_answer(self, message: str, history_messages: List[Any], deadline: Deadline) -> Optional[Dict]:
+        """Answer with the light model, or None to hand the turn to the full agent"""
+        token_usage = _TokenUsageCollector()
+        started = time.perf_counter()
+        try:
+            with DEGRADATION.admit(), deadline_scope(deadline):
+                reply = (self.light_prompt | self.light_llm).invoke(
+                    {"input": message, "chat_history": history_messages},
+                    config={"callbacks": [token_usage]},
+                )
+        except DeadlineExceeded:
+            return self._partial_answer([], [], "light_call")
         except Exception as e:
-            return {
-                "response": f"Извините, произошла ошибка: {str(e)}\n\nПопробуйте переформулировать вопрос или обратитесь в поддержку.",
-                "ticket": None
-            }
+            # The agent tier has its own models and breakers
+            logger.warning(f"Light model failed for student {self.student_id}, using the agent: {e}")
+            return None
+        finally:
+            METRICS.observe("chat_light_turn_seconds", time.perf_counter() - started)
+            USAGE.record(self.student_id, self._usage_category(message, []), token_usage.usage)
+        
+        text = reply.content if isinstance(reply.content, str) else ""
+        if getattr(reply, "tool_calls", None) or not text.strip() or ESCALATE in text:
+            return None
+        return {"response": text.strip(), "ticket": None}
+    
+    def _usage_category(self, message: str, tickets: List[Ticket]) -> str:
+        """Category a turn's tokens are accounted to: the ticket's, else the detected intent's"""
+        if tickets and tickets[-1].category:
+            return tickets[-1].category
+        intent = detect_intent(message)
+        return intent.category if intent else "Общие вопросы"
+    
+    def _fallback_answer(self, message: str, reason: str) -> Dict:
+        """Serve the turn with the rule-based engine (no LLM calls)"""
+        METRICS.increment("chat_fallback_total", reason=reason)
+        if reason == "budget":
+            logger.warning(f"Student {self.student_id} exceeded the daily token budget")
+        return dict(FALLBACK.handle(self.student_id, message), degraded=reason)
+    
+    def _partial_answer(self, tool_outputs: List[str], tickets: List[Ticket], stage: str) -> Dict:
+        """Graceful answer for a turn that ran out of its time budget"""
+        METRICS.increment("chat_deadline_exceeded_total", stage=stage)
+        logger.warning(f"Chat turn for student {self.student_id} exceeded its deadline at {stage}")
+        
+        if tickets:
+            # Ticket tools return the student-facing confirmation as their output
+            return {"response": tool_outputs[-1], "ticket": tickets[-1].payload(), "degraded": "deadline"}
+        
+        return {
+            "response": "Извините, обработка запроса заняла больше времени, чем обычно. "
+                        "Пожалуйста, повторите сообщение или уточните детали — мы обязательно поможем.",
+            "ticket": None,
+            "degraded": "deadline"
+        }
     
-    async def chat_stream(self, message: str, chat_history: List[Dict] = None):
+    async def chat_events(self, message: str, chat_history: List[Dict] = None, deadline: Optional[Deadline] = None):
+        """
+        Stream the turn as (event, payload) pairs for real-time UI updates
+        
+        Yields:
+            ("tool", {"name", "status"}) while tools run, ("chunk", text) pieces of
+            the response, then ("ticket", ticket) if one was created
+        """
+        # The agent loop is synchronous; run it off the event loop so the
+        # stream writer can keep sending heartbeats meanwhile
+        # (Full token streaming support requires more complex setup with LangChain)
+        loop = asyncio.get_running_loop()
+        events: asyncio.Queue = asyncio.Queue()
+        
+        def on_event(event: str, payload: Any) -> None:
+            loop.call_soon_threadsafe(events.put_nowait, (event, payload))
+        
+        turn = loop.run_in_executor(None, functools.partial(self.chat, message, chat_history, deadline, on_event))
+        # Tool events go out while the agent is still working
+        while True:
+            next_event = asyncio.ensure_future(events.get())
+            done, _ = await asyncio.wait({next_event, turn}, return_when=asyncio.FIRST_COMPLETED)
+            if next_event in done:
+                yield next_event.result()
+                continue
+            next_event.cancel()
+            break
+        result = await turn
+        while not events.empty():
+            yield events.get_nowait()
+        response_text = result.get("response", "")
+        
+        # Simulate streaming by yielding words
+        words = response_text.split()
+        for i, word in enumerate(words):
+            yield "chunk", word + (" " if i < len(words) - 1 else "")
+        
+        if result.get("ticket"):
+            yield "ticket", result["ticket"]
+    
+    async def chat_stream(self, message: str, chat_history: List[Dict] = None, deadline: Optional[Deadline] = None):
         """
         Stream response from agent (for real-time UI updates)
         
         Args:
             message: Student's message
             chat_history: Previous chat messages
+            deadline: Time budget for the turn
         
         Yields:
             Chunks of the response
         """
-        # For streaming, we'll use the regular chat and yield it in chunks
-        # (Full streaming support requires more complex setup with LangChain)
-        result = self.chat(message, chat_history)
-        response_text = result.get("response", "")
-        
-        # Simulate streaming by yielding words
-        words = response_text.split()
-        for i, word in enumerate(words):
-            yield word + (" " if i < len(words) - 1 else "")
+        async for event, payload in self.chat_events(message, chat_history, deadline):
+            if event == "chunk":
+                yield payload
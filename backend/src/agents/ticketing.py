@@ -0,0 +1,228 @@
+"""
+Ticket artifacts of an agent turn
+Tools hand typed tickets to the turn directly instead of encoding them into
+the text the LLM sees, so a ticket never round-trips through JSON strings.
+
+python -m src.agents.ticketing --bench
+    CPU per ticket-creating turn (scripted LLM), per issue_ticket call and
+    per response encoding, against the former JSON round trip
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Iterator, List, Optional, Tuple
+
+from src.agents.deadline import DeadlineExceeded, current_deadline
+from src.schemas.tickets import Ticket
+from src.services.metrics import METRICS
+from src.services.ticket_dedup import DUPLICATES, LOCK_SECONDS, LockTimeout
+from src.services.ticket_search import get_search_index
+from src.services.ticket_store import TICKETS
+
+logger = logging.getLogger(__name__)
+
+# Marks an id that issue_ticket still has to allocate (see draft_ticket_id)
+_DRAFT_SUFFIX = "-\x00"
+
+_turn_tickets: ContextVar[Optional[List[Ticket]]] = ContextVar("turn_tickets", default=None)
+# Student of a verified session; tools act for them whatever id the LLM passes
+_turn_owner: ContextVar[Optional[str]] = ContextVar("turn_owner", default=None)
+
+
+@contextmanager
+def collect_tickets() -> Iterator[List[Ticket]]:
+    """Collect tickets issued by tools while the block runs"""
+    tickets: List[Ticket] = []
+    token = _turn_tickets.set(tickets)
+    try:
+        yield tickets
+    finally:
+        _turn_tickets.reset(token)
+
+
+@contextmanager
+def bind_owner(student_id: Optional[str]) -> Iterator[None]:
+    """Make tools run in the block act for `student_id`; None leaves the LLM's argument in charge"""
+    token = _turn_owner.set(student_id)
+    try:
+        yield
+    finally:
+        _turn_owner.reset(token)
+
+
+def ticket_owner(claimed: Any) -> str:
+    """
+    Whom a tool acts for: the turn's verified student when one is bound,
+    otherwise the id the LLM passed (all an anonymous turn has)
+    """
+    owner = _turn_owner.get()
+    if owner is None:
+        return str(claimed) if claimed else "unknown"
+    if claimed and str(claimed) != owner:
+        logger.warning(f"Tool call for {claimed} in a turn of {owner}; acting for {owner}")
+    return owner
+
+
+def verified_owner() -> Optional[str]:
+    """Student of the turn's verified session, None in anonymous turns"""
+    return _turn_owner.get()
+
+
+def _attach(ticket: Ticket) -> None:
+    tickets = _turn_tickets.get()
+    if tickets is not None:
+        tickets.append(ticket)
+
+
+def draft_ticket_id(prefix: str) -> str:
+    """
+    Placeholder id for a ticket about to be issued, e.g. for REFUND-0042
+
+    issue_ticket replaces it (in the ticket and in the message) with a real
+    id only once the request turned out not to be a duplicate, so merged
+    duplicates do not use up ticket numbers.
+    """
+    return f"{prefix}{_DRAFT_SUFFIX}"
+
+
+def _allocate(ticket: Ticket, message: str) -> Tuple[Ticket, str]:
+    """Replace a draft id (in the ticket and in the message) with a real one"""
+    if not ticket.ticket_id.endswith(_DRAFT_SUFFIX):
+        return ticket, message
+    draft = ticket.ticket_id
+    ticket = ticket.copy(update={"ticket_id": TICKETS.next_id(draft[:-len(_DRAFT_SUFFIX)])})
+    return ticket, message.replace(draft, ticket.ticket_id)
+
+
+def issue_ticket(ticket: Ticket, message: str, dedup_text: Optional[str] = None) -> str:
+    """
+    Persist the ticket, attach it to the current turn and return the text for the LLM
+
+    If the same person already has an open ticket of this type with a
+    near-identical `dedup_text`, the request is merged into that ticket
+    instead of creating a new one. The check and the save run under the
+    owner's dedup lock, so concurrent duplicates cannot both be created;
+    the wait for the lock is bounded by the turn's deadline. Requests
+    without a student id all share the owner "unknown" and are never merged.
+    """
+    owner = TICKETS.owner_of(ticket)
+    text = dedup_text if dedup_text is not None else ticket.description
+
+    if owner == "unknown":
+        ticket, message = _allocate(ticket, message)
+        TICKETS.save(ticket)
+        get_search_index().index(ticket)
+        _attach(ticket)
+        return message
+
+    deadline = current_deadline()
+    try:
+        with DUPLICATES.locked(owner, ticket.type, deadline.remaining() if deadline is not None else LOCK_SECONDS):
+            duplicate = DUPLICATES.find(owner, ticket.type, text)
+            existing = TICKETS.get(duplicate[0]) if duplicate else None
+            if existing is not None and existing.status == "open":
+                existing.updates = (existing.updates or []) + [{
+                    "created_at": datetime.now().isoformat(),
+                    "description": ticket.description,
+                }]
+                TICKETS.update(existing)
+            else:
+                existing = None
+                ticket, message = _allocate(ticket, message)
+                TICKETS.save(ticket)
+                DUPLICATES.add(owner, ticket, text)
+    except LockTimeout as e:
+        if deadline is None:
+            raise
+        raise DeadlineExceeded(f"Deadline of {deadline.budget:.1f}s exceeded before the duplicate check") from e
+
+    if existing is not None:
+        get_search_index().index(existing)
+        _attach(existing)
+        METRICS.increment("tickets_deduplicated_total", type=ticket.type)
+        logger.info(f"Merged duplicate {ticket.type} request from {owner} into {existing.ticket_id} (similarity {duplicate[1]:.2f})")
+        return (
+            f"ℹ️ У Вас уже есть открытая заявка #{existing.ticket_id} по этому вопросу.\n\n"
+            f"Мы добавили новую информацию к ней, повторно создавать заявку не нужно. "
+            f"Ожидаемое время ответа: {existing.estimated_response}."
+        )
+
+    get_search_index().index(ticket)
+    _attach(ticket)
+    return message
+
+
+if __name__ == "__main__":
+    # Benchmark: CPU per ticket-creating chat turn, with the scripted LLM
+    import contextlib
+    import io
+    import json
+    import os
+    import sys
+    import tempfile
+    import time
+
+    if "--bench" not in sys.argv:
+        sys.exit("usage: python -m src.agents.ticketing --bench")
+
+    # Bench tickets stay in memory and in a throwaway search index
+    os.environ["STATE_BACKEND_URL"] = "memory://"
+    from src.services import ticket_search
+    ticket_search._search = ticket_search.TicketSearchIndex(
+        os.path.join(tempfile.mkdtemp(prefix="ticket-bench-"), "ticket_search.db"))
+    logging.disable(logging.WARNING)
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    from src.agents.model_tiering import ModelTiering
+    from src.agents.support_agent import StudentSupportAgent
+    from src.eval.models import ScriptedChatModel
+    from src.services.json_response import FastJSONResponse
+
+    turns = 300
+    model = ScriptedChatModel()
+    history = [{"role": "user", "content": "Хочу вернуть деньги за курс"},
+               {"role": "assistant", "content": "Уточните, пожалуйста, причину возврата."}]
+
+    def turn(n: int) -> dict:
+        agent = StudentSupportAgent(student_id=f"bench-{n}", llm=model, tiering=ModelTiering(enabled=False))
+        result = agent.chat("Переезжаю в другой город", history)
+        assert result["ticket"], result
+        return result
+
+    # The agent executor prints its chain to stdout
+    with contextlib.redirect_stdout(io.StringIO()):
+        for n in range(10):
+            turn(-1 - n)
+        started = time.process_time()
+        results = [turn(n) for n in range(turns)]
+        turn_ms = (time.process_time() - started) / turns * 1000
+
+    started = time.process_time()
+    for n in range(turns):
+        with collect_tickets():
+            issue_ticket(Ticket(**{**results[n]["ticket"], "student_id": f"direct-{n}",
+                                   "ticket_id": draft_ticket_id("REFUND")}), "ok")
+    issue_us = (time.process_time() - started) / turns * 1e6
+
+    started = time.process_time()
+    for result in results:
+        FastJSONResponse(content=result)
+    fast_us = (time.process_time() - started) / turns * 1e6
+    started = time.process_time()
+    for result in results:
+        # The previous path: the ticket went through the LLM as a JSON string,
+        # then the response through jsonable_encoder
+        json.loads(json.dumps(result["ticket"], ensure_ascii=False))
+        JSONResponse(content=jsonable_encoder(result))
+    stdlib_us = (time.process_time() - started) / turns * 1e6
+
+    print(json.dumps({
+        "turns": turns,
+        "turn_cpu_ms": round(turn_ms, 2),
+        "issue_ticket_cpu_us": round(issue_us, 1),
+        "response_encode_cpu_us": round(fast_us, 1),
+        "response_encode_cpu_us_before": round(stdlib_us, 1),
+    }, indent=2))
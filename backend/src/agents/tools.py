@@ -5,7 +5,9 @@ Tools for SAT/IELTS preparation platform and university admission support
 from langchain.tools import tool
 from typing import Optional
 import httpx
-from src.agents.business_tools import BUSINESS_TOOLS
+from src.agents.routing_rules import ticket_priority
+from src.agents.ticketing import draft_ticket_id, issue_ticket, ticket_owner
+from src.schemas.tickets import Ticket
 
 # Import business-specific tools
 from src.agents.business_tools import BUSINESS_TOOLS
@@ -33,42 +35,36 @@ def submit_technical_issue(description: str, student_id: str) -> str:
         student_id: ID студента
     
     Returns:
-        Информация о созданном тикете в JSON формате
+        Информация о созданном тикете
     """
-    import json
     from datetime import datetime
     
-    # Ensure student_id is string
-    student_id = str(student_id) if student_id else "unknown"
+    # The verified session's student, if any, overrides the id the LLM passed
+    student_id = ticket_owner(student_id)
     
     # Generate ticket ID
-    ticket_id = f"TECH-{abs(hash(description + student_id)) % 10000:04d}"
+    ticket_id = draft_ticket_id("TECH")
     
     # Determine priority based on keywords
-    priority = "medium"
-    if any(word in description.lower() for word in ["не могу войти", "срочно", "важно", "критично"]):
-        priority = "high"
-    elif any(word in description.lower() for word in ["вопрос", "уточнить", "помощь"]):
-        priority = "low"
+    priority = ticket_priority("technical", description)
     
     # Create ticket data
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "technical",
-        "status": "open",
-        "priority": priority,
-        "description": description,
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "24 часа" if priority != "high" else "4 часа"
-    }
-    
-    # Return structured response with ticket data
-    return json.dumps({
-        "success": True,
-        "message": f"✅ Тикет #{ticket_id} успешно создан!\n\nВаша заявка принята в работу. Техническая поддержка свяжется с вами в течение {ticket_data['estimated_response']}.\n\nОписание проблемы: {description}\nПриоритет: {priority}",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="technical",
+        status="open",
+        priority=priority,
+        description=description,
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="24 часа" if priority != "high" else "4 часа"
+    )
+    
+    # The ticket goes to the response as an object; the LLM only sees the message
+    return issue_ticket(
+        ticket,
+        f"✅ Тикет #{ticket_id} успешно создан!\n\nВаша заявка принята в работу. Техническая поддержка свяжется с вами в течение {ticket.estimated_response}.\n\nОписание проблемы: {description}\nПриоритет: {priority}"
+    )
 
 
 @tool
@@ -90,34 +86,33 @@ def request_document(document_type: str, student_id: str) -> str:
         student_id: ID студента
     
     Returns:
-        Информация о запросе документа в JSON формате
+        Информация о запросе документа
     """
-    import json
     from datetime import datetime
     
-    # Ensure student_id is string
-    student_id = str(student_id) if student_id else "unknown"
+    # The verified session's student, if any, overrides the id the LLM passed
+    student_id = ticket_owner(student_id)
     
     # Generate ticket ID
-    ticket_id = f"DOC-{abs(hash(document_type + student_id)) % 10000:04d}"
+    ticket_id = draft_ticket_id("DOC")
     
     # Create ticket data
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "document",
-        "status": "open",
-        "priority": "low",
-        "description": f"Запрос на получение документа: {document_type}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "3 рабочих дня"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"📄 Запрос на получение документа '{document_type}' принят.\n\nТикет #{ticket_id} создан.\nДокумент будет готов в течение 3 рабочих дней.\nВы получите уведомление на email.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="document",
+        status="open",
+        priority="low",
+        description=f"Запрос на получение документа: {document_type}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="3 рабочих дня"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"📄 Запрос на получение документа '{document_type}' принят.\n\nТикет #{ticket_id} создан.\nДокумент будет готов в течение 3 рабочих дней.\nВы получите уведомление на email.",
+        dedup_text=document_type
+    )
 @tool  
 def contact_teacher(teacher_name: str, subject: str, message: str, student_id: str) -> str:
     """
@@ -140,34 +135,33 @@ def contact_teacher(teacher_name: str, subject: str, message: str, student_id: s
         student_id: ID студента
     
     Returns:
-        Подтверждение отправки в JSON формате
+        Подтверждение отправки
     """
-    import json
     from datetime import datetime
     
-    # Ensure student_id is string
-    student_id = str(student_id) if student_id else "unknown"
+    # The verified session's student, if any, overrides the id the LLM passed
+    student_id = ticket_owner(student_id)
     
     # Generate ticket ID
-    ticket_id = f"MSG-{abs(hash(message + student_id)) % 10000:04d}"
+    ticket_id = draft_ticket_id("MSG")
     
     # Create ticket data
-    ticket_data = {
-        "ticket_id": ticket_id,
-        "type": "teacher-message",
-        "status": "open",
-        "priority": "medium",
-        "description": f"Сообщение для преподавателя {teacher_name} ({subject}): {message}",
-        "student_id": student_id,
-        "created_at": datetime.now().isoformat(),
-        "estimated_response": "1-2 рабочих дня"
-    }
-    
-    return json.dumps({
-        "success": True,
-        "message": f"✉️ Сообщение отправлено преподавателю {teacher_name} ({subject}).\n\nТикет #{ticket_id} создан.\nВы получите ответ в течение 1-2 рабочих дней.",
-        "ticket": ticket_data
-    }, ensure_ascii=False)
+    ticket = Ticket(
+        ticket_id=ticket_id,
+        type="teacher-message",
+        status="open",
+        priority="medium",
+        description=f"Сообщение для преподавателя {teacher_name} ({subject}): {message}",
+        student_id=student_id,
+        created_at=datetime.now().isoformat(),
+        estimated_response="1-2 рабочих дня"
+    )
+    
+    return issue_ticket(
+        ticket,
+        f"✉️ Сообщение отправлено преподавателю {teacher_name} ({subject}).\n\nТикет #{ticket_id} создан.\nВы получите ответ в течение 1-2 рабочих дней.",
+        dedup_text=message
+    )
 
 
 
@@ -2,12 +2,19 @@ import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from src.services.json_response import FastJSONResponse
+
 from src.routes.auth import router as auth_router
 from src.routes.chat import router as chat_router
+from src.routes.metrics import router as metrics_router
+from src.routes.tickets import router as tickets_router
+from src.routes.transcripts import router as transcripts_router
+from src.routes.usage import router as usage_router
+from src.routes.ws import router as ws_router
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="MasterEducation AI Support")
+    app = FastAPI(title="MasterEducation AI Support", default_response_class=FastJSONResponse)
 
     frontends = os.getenv("FRONTEND_ORIGINS", "http://localhost:3000")
     origins = [o.strip() for o in frontends.split(",") if o.strip()]
@@ -23,6 +30,11 @@ def create_app() -> FastAPI:
     # Register routes
     app.include_router(auth_router)
     app.include_router(chat_router)
+    app.include_router(metrics_router)
+    app.include_router(tickets_router)
+    app.include_router(transcripts_router)
+    app.include_router(usage_router)
+    app.include_router(ws_router)
 
     return app
 
@@ -0,0 +1,116 @@
+"""
+Offline classification of archived support transcripts
+
+Streams JSONL transcripts, labels each one with the local routing rules
+(business category and ticket priority, no LLM) in a process pool and writes
+JSONL results in input order. Memory stays bounded: only a fixed number of
+chunks is in flight at any time.
+
+Usage (from the backend directory):
+    python -m src.classify_transcripts transcripts.jsonl -o labels.jsonl --workers 8
+
+Input lines: {"id": ..., "student_id": ..., "messages": [{"role": "user", "content": ...}, ...]}
+             (a plain "message" string is accepted as well)
+"""
+import argparse
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, TextIO
+
+from src.agents.routing_rules import detect_intent, ticket_priority
+
+
+def transcript_text(record: Dict) -> str:
+    """Student side of the conversation, which is what the routing rules look at"""
+    if isinstance(record.get("messages"), list):
+        return "\n".join(
+            str(m.get("content", "")) for m in record["messages"]
+            if isinstance(m, dict) and m.get("role", "user") == "user"
+        )
+    return str(record.get("message", ""))
+
+
+def classify_record(record: Dict) -> Dict:
+    text = transcript_text(record)
+    intent = detect_intent(text)
+    result = {"id": record.get("id"), "student_id": record.get("student_id")}
+    if intent is None:
+        result.update({"type": None, "category": None, "priority": None, "score": 0.0})
+    else:
+        result.update({
+            "type": intent.type,
+            "category": intent.category,
+            "priority": ticket_priority(intent.type, text),
+            "score": intent.score,
+        })
+    return result
+
+
+def classify_chunk(lines: List[str]) -> List[str]:
+    """Worker entry point: raw JSONL lines in, JSONL result lines out"""
+    out = []
+    for line in lines:
+        try:
+            result = classify_record(json.loads(line))
+        except (ValueError, AttributeError) as e:
+            result = {"error": f"Malformed transcript: {e}", "line": line.strip()[:200]}
+        out.append(json.dumps(result, ensure_ascii=False))
+    return out
+
+
+def _chunks(stream: TextIO, size: int) -> Iterator[List[str]]:
+    lines = (line for line in stream if line.strip())
+    while True:
+        chunk = list(islice(lines, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def classify_stream(source: TextIO, sink: TextIO, workers: int, chunk_size: int = 1000) -> int:
+    """Classify `source` into `sink`; returns the number of records written"""
+    written = 0
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in _chunks(source, chunk_size):
+            pending.append(pool.submit(classify_chunk, chunk))
+            if len(pending) >= max_in_flight:
+                results = pending.popleft().result()
+                sink.write("\n".join(results) + "\n")
+                written += len(results)
+        while pending:
+            results = pending.popleft().result()
+            sink.write("\n".join(results) + "\n")
+            written += len(results)
+    return written
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Classify support transcripts by category and priority")
+    parser.add_argument("input", help="JSONL transcripts, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output path, or - for stdout")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    try:
+        written = classify_stream(source, sink, max(1, args.workers), max(1, args.chunk_size))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+
+    print(f"Classified {written} transcripts", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
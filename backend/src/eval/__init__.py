@@ -0,0 +1 @@
+# offline evaluation of the support agent
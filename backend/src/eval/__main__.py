@@ -0,0 +1,16 @@
+import os
+import sys
+import tempfile
+
+# Keep evaluation runs out of the real stores: in-memory state, no transcript
+# archive, a throwaway search index, and profile fetches to a closed local port
+# (never the real student API, whatever the shell or .env says)
+os.environ.setdefault("STATE_BACKEND_URL", "memory://")
+os.environ.setdefault("TRANSCRIPT_ENABLED", "false")
+os.environ.setdefault("TICKET_SEARCH_DB", os.path.join(tempfile.mkdtemp(prefix="eval-"), "ticket_search.db"))
+os.environ["EXTERNAL_API_BASE"] = "http://127.0.0.1:9"
+os.environ.setdefault("GEMINI_API_KEY", "unused-by-recorded-backend")
+
+from src.eval.harness import main  # noqa: E402
+
+sys.exit(main())
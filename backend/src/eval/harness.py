@@ -0,0 +1,227 @@
+"""
+Offline evaluation of the support agent
+
+Runs every scripted conversation in src.eval.scenarios through
+StudentSupportAgent with a pluggable model backend and scores it:
+
+- tool_correct:     the expected tool was called (and no tool for no-ticket conversations)
+- args_complete:    required arguments present, expected substrings found
+- turns_to_ticket:  student messages until the ticket was created
+- llm_calls:        model round-trips over the whole conversation, per model tier
+- cost_usd, llm_seconds: from the backend's usage and timings, or for the
+                    offline backends estimated with the tier prices and latency
+                    model in src.agents.model_tiering
+
+The JSON report can be compared with a baseline report; any scenario that
+gets a wrong tool, loses arguments, or needs more turns, LLM calls or LLM
+time than before is a regression and fails the run. --compare-tiering runs
+the suite with and without model tiering and reports what tiering saves.
+
+Usage (from the backend directory):
+    python -m src.eval --backend recorded                       # fixtures/eval_cassette.json, offline
+    python -m src.eval --backend gemini --record new.json       # real model, save a cassette
+    python -m src.eval -o report.json --baseline fixtures/eval_baseline.json
+    python -m src.eval --compare-tiering -o tiering.json
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from src.agents.deadline import Deadline
+from src.agents.model_tiering import TIERING, ModelTiering
+from src.agents.support_agent import StudentSupportAgent
+from src.eval.models import ObservedModel, Observation, build_backend, load_cassette, save_cassette
+from src.eval.scenarios import SCENARIOS, Scenario
+
+DEFAULT_CASSETTE = os.path.join(os.path.dirname(__file__), "..", "..", "fixtures", "eval_cassette.json")
+TURN_BUDGET_SECONDS = 60.0
+# LLM time may grow this much over the baseline before it counts as a regression
+LATENCY_TOLERANCE = 0.1
+
+
+def _check_args(scenario: Scenario, args: Dict[str, Any]) -> List[str]:
+    """Problems with the arguments of the expected tool call (empty when complete)"""
+    problems = [f"missing {name}" for name in scenario.required_args if not str(args.get(name) or "").strip()]
+    for name, fragment in scenario.expected_args.items():
+        if fragment.lower() not in str(args.get(name) or "").lower():
+            problems.append(f"{name} lacks {fragment!r}")
+    return problems
+
+
+def run_scenario(scenario: Scenario, backend: str, cassette: Optional[Dict], student_id: str,
+                 tiering: ModelTiering = TIERING) -> Dict[str, Any]:
+    observation = Observation()
+    result: Dict[str, Any] = {"scenario": scenario.name, "expected_tool": scenario.tool}
+    started = time.perf_counter()
+    turns_to_ticket = None
+    history: List[Dict[str, str]] = []
+    try:
+        # Both tiers share the backend (and so the cassette position)
+        model = build_backend(backend, cassette, scenario.name)
+        agent = StudentSupportAgent(
+            student_id=student_id,
+            llm=ObservedModel(model, observation, "agent"),
+            light_llm=ObservedModel(model, observation, "light"),
+            tiering=tiering,
+        )
+        for number, message in enumerate(scenario.turns, start=1):
+            reply = agent.chat(message, chat_history=list(history), deadline=Deadline(TURN_BUDGET_SECONDS))
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply["response"]}]
+            if reply.get("ticket"):
+                turns_to_ticket = number
+                break
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+
+    called = [call["name"] for call in observation.tool_calls]
+    if scenario.tool is None:
+        tool_correct = not called and turns_to_ticket is None
+        problems: List[str] = []
+    else:
+        tool_correct = scenario.tool in called
+        call = next((c for c in observation.tool_calls if c["name"] == scenario.tool), None)
+        problems = _check_args(scenario, call["args"]) if call else ["tool not called"]
+
+    cost = seconds = 0.0
+    for call in observation.calls:
+        call_cost, estimated_seconds = tiering.estimate(call["tier"], call["input_tokens"], call["output_tokens"])
+        cost += call_cost
+        seconds += estimated_seconds if backend != "gemini" else call["seconds"]
+
+    result.update({
+        "tools_called": called,
+        "tool_correct": tool_correct,
+        "args_complete": not problems,
+        "arg_problems": problems,
+        "student_turns": len(history) // 2,
+        "turns_to_ticket": turns_to_ticket,
+        "llm_calls": observation.llm_calls,
+        "llm_calls_by_tier": dict(Counter(call["tier"] for call in observation.calls)),
+        "input_tokens": sum(call["input_tokens"] for call in observation.calls),
+        "cost_usd": round(cost, 7),
+        "llm_seconds": round(seconds, 3),
+        "seconds": round(time.perf_counter() - started, 3),
+    })
+    too_slow = scenario.tool is not None and (turns_to_ticket is None or turns_to_ticket > scenario.max_turns)
+    result["passed"] = tool_correct and not problems and not too_slow and "error" not in result
+    result["_responses"] = observation.responses
+    return result
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    with_tool = [r for r in results if r["expected_tool"]]
+    ticketed = [r["turns_to_ticket"] for r in with_tool if r["turns_to_ticket"]]
+    return {
+        "scenarios": len(results),
+        "passed": len([r for r in results if r["passed"]]),
+        "tool_accuracy": round(len([r for r in results if r["tool_correct"]]) / len(results), 3),
+        "arg_completeness": round(len([r for r in with_tool if r["args_complete"]]) / max(len(with_tool), 1), 3),
+        "mean_turns_to_ticket": round(sum(ticketed) / len(ticketed), 2) if ticketed else None,
+        "llm_calls_total": sum(r["llm_calls"] for r in results),
+        "mean_llm_calls": round(sum(r["llm_calls"] for r in results) / len(results), 2),
+        "light_calls": sum(r["llm_calls_by_tier"].get("light", 0) for r in results),
+        "input_tokens_total": sum(r["input_tokens"] for r in results),
+        "cost_usd_total": round(sum(r["cost_usd"] for r in results), 6),
+        "llm_seconds_total": round(sum(r["llm_seconds"] for r in results), 2),
+    }
+
+
+def tiering_savings(without: Dict[str, Any], with_tiering: Dict[str, Any]) -> Dict[str, Any]:
+    """What the light tier saves over sending every turn to the full agent"""
+    def saved(key: str) -> Dict[str, float]:
+        before, after = without[key], with_tiering[key]
+        return {"without": before, "with": after, "saved": round(before - after, 6),
+                "saved_pct": round(100.0 * (before - after) / before, 1) if before else 0.0}
+
+    return {
+        "light_calls": with_tiering["light_calls"],
+        "input_tokens": saved("input_tokens_total"),
+        "cost_usd": saved("cost_usd_total"),
+        "llm_seconds": saved("llm_seconds_total"),
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """Per-scenario regressions against a baseline report"""
+    before = {r["scenario"]: r for r in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        old = before.get(result["scenario"])
+        if old is None:
+            continue
+        name = result["scenario"]
+        if old["tool_correct"] and not result["tool_correct"]:
+            regressions.append(f"{name}: wrong tool {result['tools_called']}")
+        if old["args_complete"] and not result["args_complete"]:
+            regressions.append(f"{name}: incomplete arguments {result['arg_problems']}")
+        if result["llm_calls"] > old["llm_calls"]:
+            regressions.append(f"{name}: {old['llm_calls']} -> {result['llm_calls']} LLM calls")
+        if "llm_seconds" in old and result["llm_seconds"] > old["llm_seconds"] * (1 + LATENCY_TOLERANCE):
+            regressions.append(f"{name}: {old['llm_seconds']}s -> {result['llm_seconds']}s LLM time")
+        if old["turns_to_ticket"] and (result["turns_to_ticket"] or 10 ** 6) > old["turns_to_ticket"]:
+            regressions.append(f"{name}: {old['turns_to_ticket']} -> {result['turns_to_ticket']} turns to ticket")
+    return regressions
+
+
+def run_suite(backend: str, cassette_path: Optional[str] = None, only: Optional[List[str]] = None,
+              tiering: ModelTiering = TIERING) -> Dict[str, Any]:
+    cassette = load_cassette(cassette_path or DEFAULT_CASSETTE) if backend == "recorded" else None
+    scenarios = [s for s in SCENARIOS if not only or s.name in only]
+    # A separate student per scenario keeps duplicate detection and dialog state
+    # apart; the id is stable so recorded tool arguments stay valid
+    results = [run_scenario(s, backend, cassette, f"{s.student_id}-{s.name}", tiering) for s in scenarios]
+    return {"backend": backend, "tiering": tiering.enabled, "summary": summarize(results), "results": results}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate tool choice, arguments, turns and LLM calls")
+    parser.add_argument("--backend", choices=["recorded", "scripted", "gemini"], default="recorded")
+    parser.add_argument("--cassette", help="responses for the recorded backend (default fixtures/eval_cassette.json)")
+    parser.add_argument("--record", help="save this run's model responses as a cassette")
+    parser.add_argument("--scenario", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default stdout)")
+    parser.add_argument("--baseline", help="report to compare against; regressions fail the run")
+    parser.add_argument("--tiering", choices=["on", "off"], default="on" if TIERING.enabled else "off",
+                        help="route easy turns to the light model (default: MODEL_TIERING_ENABLED)")
+    parser.add_argument("--compare-tiering", action="store_true",
+                        help="also run without tiering and report the savings")
+    args = parser.parse_args(argv)
+
+    tiering = ModelTiering(enabled=args.tiering == "on", threshold=TIERING.threshold, tiers=TIERING.tiers)
+    # The agent executor is verbose; keep stdout for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_suite(args.backend, args.cassette, args.scenario, tiering)
+        if args.compare_tiering:
+            untiered = ModelTiering(enabled=False, tiers=TIERING.tiers)
+            without = run_suite(args.backend, args.cassette, args.scenario, untiered)
+            report["tiering_savings"] = tiering_savings(without["summary"], report["summary"])
+    recordings = {r["scenario"]: r.pop("_responses") for r in report["results"]}
+    if args.record:
+        save_cassette(args.record, args.backend, recordings)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f))
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    summary = report["summary"]
+    print(f"{summary['passed']}/{summary['scenarios']} passed, tool accuracy {summary['tool_accuracy']}, "
+          f"{summary['llm_calls_total']} LLM calls", file=sys.stderr)
+    if "tiering_savings" in report:
+        savings = report["tiering_savings"]
+        print(f"tiering: {savings['light_calls']} light calls, saved {savings['cost_usd']['saved_pct']}% cost, "
+              f"{savings['llm_seconds']['saved_pct']}% LLM time", file=sys.stderr)
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    return 1 if report.get("regressions") else 0
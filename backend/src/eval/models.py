@@ -0,0 +1,193 @@
+"""
+Model backends for the evaluation harness
+
+- gemini:   the production model router (needs GEMINI_API_KEY)
+- recorded: replays a cassette of model responses, no network
+- scripted: stateless rule-based fake for load and soak tests, no network
+
+Whatever the backend, it is wrapped in ObservedModel, which counts LLM calls
+per model tier, captures the tool calls the model makes, sizes each call and
+can save the responses as a cassette for the recorded backend.
+"""
+import json
+import re
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from src.agents.routing_rules import detect_intent
+
+# Rough size of a token; only used where the backend reports no usage (replay)
+CHARS_PER_TOKEN = 4
+
+
+class CassetteExhausted(RuntimeError):
+    pass
+
+
+def message_to_dict(message: Any) -> Dict[str, Any]:
+    """Serializable form of a model response, as stored in cassettes"""
+    return {
+        "content": message.content if isinstance(message.content, str) else json.dumps(message.content),
+        "tool_calls": [{"name": c["name"], "args": c["args"]} for c in getattr(message, "tool_calls", None) or []],
+    }
+
+
+class RecordedChatModel(BaseChatModel):
+    """Returns the recorded responses of one scenario in order"""
+
+    responses: List[Dict[str, Any]]
+    position: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "recorded"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "RecordedChatModel":
+        # The recorded responses already contain the tool calls
+        return self
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.position >= len(self.responses):
+            raise CassetteExhausted(f"No recorded response #{self.position + 1}; re-record the cassette")
+        recorded = self.responses[self.position]
+        self.position += 1
+        message = AIMessage(
+            content=recorded.get("content", ""),
+            tool_calls=[
+                {"name": c["name"], "args": c.get("args", {}), "id": f"call_{uuid.uuid4().hex[:8]}"}
+                for c in recorded.get("tool_calls", [])
+            ],
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _prompt_chars(input: Any) -> int:
+    messages = input.to_messages() if hasattr(input, "to_messages") else input
+    if isinstance(messages, str):
+        return len(messages)
+    return sum(len(str(getattr(m, "content", m))) for m in messages)
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Answers like the agent would, from the conversation alone
+
+    A request with a detected intent gets one clarifying question, the next
+    student message triggers the matching tool with every argument filled
+    from that message, and a tool result is acknowledged. Anything else gets
+    a greeting. Holds no per-conversation state, so one instance can serve
+    any number of concurrent turns.
+    """
+
+    # tool name -> argument names, from bind_tools
+    tool_args: Dict[str, List[str]] = {}
+    delay_seconds: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ScriptedChatModel":
+        return ScriptedChatModel(tool_args={t.name: list(t.args) for t in tools}, delay_seconds=self.delay_seconds)
+
+    def _reply(self, messages: List[BaseMessage]) -> AIMessage:
+        if isinstance(messages[-1], ToolMessage):
+            return AIMessage(content="Готово, заявка передана. Мы свяжемся с Вами в ближайшее время.")
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        match = re.search(r"Student ID: (\S+)", system)
+        student_id = match.group(1) if match else "unknown"
+        said = [m.content for m in messages if isinstance(m, HumanMessage)]
+        intent = next((i for i in map(detect_intent, reversed(said)) if i), None)
+        if intent is None or intent.tool not in self.tool_args:
+            return AIMessage(content="Здравствуйте! Чем могу помочь?")
+        if detect_intent(said[-1]) and len(said) == 1:
+            return AIMessage(content="Уточните, пожалуйста, детали запроса.")
+        args = {name: said[-1] for name in self.tool_args[intent.tool]}
+        args.update({name: student_id for name in ("student_id", "staff_id") if name in args})
+        return AIMessage(content="", tool_calls=[
+            {"name": intent.tool, "args": args, "id": f"call_{uuid.uuid4().hex[:8]}"}
+        ])
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        if self.delay_seconds:
+            time.sleep(self.delay_seconds)
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+
+class ObservedModel(Runnable):
+    """Delegates to a backend model and records what it was asked and answered"""
+
+    def __init__(self, model: Any, observer: Optional["Observation"] = None, tier: str = "agent",
+                 tool_chars: int = 0):
+        self.model = model
+        self.observer = observer if observer is not None else Observation()
+        self.tier = tier
+        # Tool schemas are sent with every call of a tool-calling model
+        self.tool_chars = tool_chars
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> "ObservedModel":
+        tool_chars = sum(len(json.dumps(convert_to_openai_tool(t), ensure_ascii=False)) for t in tools)
+        return ObservedModel(self.model.bind_tools(tools, **kwargs), self.observer, self.tier, tool_chars)
+
+    def invoke(self, input: Any, config: Optional[Dict] = None, **kwargs: Any) -> Any:
+        self.observer.llm_calls += 1
+        started = time.perf_counter()
+        output = self.model.invoke(input, config, **kwargs)
+        seconds = time.perf_counter() - started
+        response = message_to_dict(output)
+        self.observer.responses.append(response)
+        self.observer.tool_calls.extend(response["tool_calls"])
+
+        usage = getattr(output, "usage_metadata", None) or {}
+        output_chars = len(response["content"]) + len(json.dumps(response["tool_calls"], ensure_ascii=False))
+        self.observer.calls.append({
+            "tier": self.tier,
+            "input_tokens": usage.get("input_tokens") or (_prompt_chars(input) + self.tool_chars) // CHARS_PER_TOKEN,
+            "output_tokens": usage.get("output_tokens") or output_chars // CHARS_PER_TOKEN,
+            "seconds": seconds,
+        })
+        return output
+
+
+class Observation:
+    def __init__(self):
+        self.llm_calls = 0
+        self.responses: List[Dict[str, Any]] = []
+        self.tool_calls: List[Dict[str, Any]] = []
+        # One entry per model call: tier, input/output tokens, seconds
+        self.calls: List[Dict[str, Any]] = []
+
+
+def load_cassette(path: str) -> Dict[str, List[Dict[str, Any]]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["scenarios"]
+
+
+def save_cassette(path: str, backend: str, recordings: Dict[str, List[Dict[str, Any]]]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"backend": backend, "scenarios": recordings}, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+
+def build_backend(name: str, cassette: Optional[Dict[str, List[Dict[str, Any]]]], scenario: str) -> Any:
+    """A fresh model for one scenario"""
+    if name == "recorded":
+        if cassette is None or scenario not in cassette:
+            raise CassetteExhausted(f"Scenario {scenario} is not in the cassette")
+        return RecordedChatModel(responses=cassette[scenario])
+    if name == "scripted":
+        return ScriptedChatModel()
+    if name == "gemini":
+        from src.agents.support_agent import build_model_router
+
+        return build_model_router()
+    raise ValueError(f"Unknown backend {name!r}")
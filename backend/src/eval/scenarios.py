@@ -0,0 +1,117 @@
+"""
+Scripted conversations for the evaluation harness
+At least one per agent tool, plus conversations that must not create a
+ticket. `turns` are the student's messages in order; the harness stops
+sending them once a ticket exists. `max_turns` is the number of student
+messages a good agent needs before the ticket is created.
+"""
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Scenario(NamedTuple):
+    name: str
+    # Tool the agent should call, None for conversations without a ticket
+    tool: Optional[str]
+    turns: List[str]
+    # Arguments the tool call must carry (non-empty)
+    required_args: Tuple[str, ...] = ()
+    # Argument -> substring its value must contain (case-insensitive)
+    expected_args: Dict[str, str] = {}
+    max_turns: int = 2
+    student_id: str = "eval-student"
+
+
+SCENARIOS: List[Scenario] = [
+    Scenario(
+        "refund_reason_in_second_turn", "request_refund",
+        ["Хочу вернуть деньги за курс", "Переезжаю в другой город и не смогу заниматься"],
+        ("reason",), {"reason": "переезж"},
+    ),
+    Scenario(
+        "refund_reason_upfront", "request_refund",
+        ["Прошу оформить возврат средств: у меня изменился график работы, не успеваю на занятия"],
+        ("reason",), {"reason": "график"}, max_turns=1,
+    ),
+    Scenario(
+        "freeze_with_dates", "request_freeze",
+        ["Хочу заморозить обучение", "С 1 декабря по 31 января, уезжаю в командировку"],
+        ("duration_start", "duration_end", "reason"), {"reason": "командировк"},
+    ),
+    Scenario(
+        "unfreeze", "request_unfreeze",
+        ["Хочу разморозить обучение и продолжить занятия", "С 15 марта"],
+        ("preferred_date",), {"preferred_date": "03-15"},
+    ),
+    Scenario(
+        "bonus_consultation", "use_bonus",
+        ["Хочу использовать свой бонус", "Консультацию с преподавателем по эссе"],
+        ("bonus_type", "details"), {"bonus_type": "консульт"},
+    ),
+    Scenario(
+        "group_change", "change_group_or_teacher",
+        ["Хочу сменить группу", "Не подходит время, удобно по будням после 19:00"],
+        ("reason", "preferences"), {"preferences": "19"},
+    ),
+    Scenario(
+        "link_not_working_after_kb", "tech_issue_platform",
+        ["Ссылка на урок не открывается", "Не помогло, всё равно не открывается, пишет ошибку доступа"],
+        ("issue_type", "description"),
+    ),
+    Scenario(
+        "platform_error", "submit_technical_issue",
+        ["На сайте не загружаются видео уроков SAT", "С утра ошибка 500, пробовал другой браузер — то же самое"],
+        ("description",), {"description": "500"},
+    ),
+    Scenario(
+        "attendance_certificate", "request_attendance_certificate",
+        ["Нужна справка о посещении занятий", "Для визы"],
+        ("purpose",), {"purpose": "виз"},
+    ),
+    Scenario(
+        "course_extension", "extend_or_purchase_course",
+        ["Хочу продлить курс", "IELTS ещё на 2 месяца"],
+        ("request_type", "details"), {"details": "IELTS"},
+    ),
+    Scenario(
+        "partner_program", "partner_program_request",
+        ["Хочу пригласить друга по партнёрской программе",
+         "Иванов Иван, @ivan_ivanov, +7 701 123 45 67"],
+        ("invitee_name", "invitee_telegram", "invitee_phone"), {"invitee_telegram": "@ivan_ivanov"},
+    ),
+    Scenario(
+        "staff_issue", "staff_issue",
+        ["Я преподаватель, у меня проблема", "Не пришла зарплата за октябрь, бухгалтерия не отвечает"],
+        ("issue_description", "staff_id"), {"issue_description": "зарплат"},
+    ),
+    Scenario(
+        "document_request", "request_document",
+        ["Мне нужен документ от школы", "Сертификат об окончании курса SAT"],
+        ("document_type",), {"document_type": "сертификат"},
+    ),
+    Scenario(
+        "message_to_teacher", "contact_teacher",
+        ["Хочу написать преподавателю",
+         "Анне Петровой по математике SAT: не понял разбор задания 12 из домашки про вероятности"],
+        ("teacher_name", "subject", "message"), {"teacher_name": "Анн"},
+    ),
+    Scenario(
+        "greeting_no_ticket", None,
+        ["Здравствуйте! Спасибо за вчерашний урок"],
+        max_turns=0,
+    ),
+    Scenario(
+        "thanks_no_ticket", None,
+        ["Спасибо большое, всё понятно!"],
+        max_turns=0,
+    ),
+    Scenario(
+        "process_question_no_ticket", None,
+        ["Сколько длится одно занятие и где его найти в расписании?"],
+        max_turns=0,
+    ),
+    Scenario(
+        "kb_answer_no_llm", None,
+        ["Ссылка на урок не открывается"],
+        max_turns=0,
+    ),
+]
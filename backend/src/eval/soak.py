@@ -0,0 +1,307 @@
+"""
+Soak test: hours of simulated chat traffic with memory-growth detection
+
+Runs the FastAPI app in-process (TestClient) with the scripted fake LLM and
+replays the evaluation conversations from many students with growing
+histories, plus ticket list and metrics reads. At every --interval the
+traffic pauses, the in-memory state backend is emptied (it stands in for
+Redis, which lives outside the worker) and garbage is collected; then RSS
+and tracemalloc's traced memory are sampled.
+
+After the --warmup period, the growth rate of both is estimated (median of
+pairwise slopes, robust to one-off steps); a slope above --max-rss-slope / --max-traced-slope (MB per hour) fails
+the run. The JSON report lists the samples, the slopes and the allocation
+sites that grew the most between the first post-warmup snapshot and the end.
+
+Usage (from the backend directory):
+    python -m src.eval.soak --duration 7200 --interval 60 -o soak.json
+    python -m src.eval.soak --duration 300 --interval 10 --llm-delay 0.05
+"""
+import os
+import sys
+import tempfile
+
+# Configure the app before it is imported: in-memory state, throwaway files,
+# no real profile API, sessions signed with a throwaway secret
+_WORKDIR = tempfile.mkdtemp(prefix="soak-")
+os.environ.setdefault("STATE_BACKEND_URL", "memory://")
+os.environ.setdefault("TICKET_SEARCH_DB", os.path.join(_WORKDIR, "ticket_search.db"))
+os.environ.setdefault("TRANSCRIPT_DIR", os.path.join(_WORKDIR, "transcripts"))
+# Bounded caches small enough to fill during warmup, so filling them does not read as growth
+os.environ.setdefault("TRANSCRIPT_INDEX_CACHE_KEYS", "500")
+os.environ.setdefault("AUTH_VERIFIED_CACHE_SIZE", "500")
+os.environ.setdefault("PROFILE_CACHE_SIZE", "500")
+os.environ.setdefault("EXTERNAL_API_BASE", "http://127.0.0.1:9")
+os.environ.setdefault("GEMINI_API_KEY", "unused-by-scripted-backend")
+os.environ.setdefault("AUTH_JWT_SECRET", "soak-" + os.urandom(8).hex())
+
+import argparse  # noqa: E402
+import contextlib  # noqa: E402
+import gc  # noqa: E402
+import itertools  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import random  # noqa: E402
+import resource  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+import uuid  # noqa: E402
+from typing import Any, Dict, List, Optional, Tuple  # noqa: E402
+
+import jwt  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src.agents import support_agent  # noqa: E402
+from src.eval.models import ScriptedChatModel  # noqa: E402
+from src.eval.scenarios import SCENARIOS  # noqa: E402
+from src.routes import chat as chat_routes  # noqa: E402
+from src.services.state import InMemoryState, get_state  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_FOLLOW_UPS = ["Спасибо!", "Понятно, спасибо", "А сколько ждать ответа?", "Хорошо"]
+
+
+def rss_mb() -> float:
+    """Current resident set size; the peak where /proc is not available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE / 2 ** 20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10
+
+
+def slope_per_hour(points: List[Tuple[float, float]]) -> Optional[float]:
+    """
+    Growth rate of (seconds, MB) points in MB per hour
+
+    Median of the pairwise slopes (Theil-Sen), so a one-off step such as a
+    new allocator arena or a cache reaching its size does not read as steady
+    growth the way it would in a least-squares fit.
+    """
+    if len(points) < 3:
+        return None
+    slopes = sorted(
+        (v2 - v1) / (t2 - t1)
+        for (t1, v1), (t2, v2) in itertools.combinations(points, 2) if t2 > t1
+    )
+    if not slopes:
+        return None
+    middle = len(slopes) // 2
+    median = slopes[middle] if len(slopes) % 2 else (slopes[middle - 1] + slopes[middle]) / 2
+    return median * 3600
+
+
+def session_headers(student_id: str) -> Dict[str, str]:
+    claims = {"studentId": student_id, "exp": int(time.time()) + 86400}
+    return {"Authorization": "Bearer " + jwt.encode(claims, os.environ["AUTH_JWT_SECRET"], algorithm="HS256")}
+
+
+def top_growth(before: tracemalloc.Snapshot, after: tracemalloc.Snapshot, limit: int) -> List[Dict[str, Any]]:
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    stats = after.filter_traces(ignore).compare_to(before.filter_traces(ignore), "lineno")
+    return [
+        {
+            "site": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "count_diff": stat.count_diff,
+            "size_kb": round(stat.size / 1024, 1),
+        }
+        for stat in stats[:limit] if stat.size_diff > 0
+    ]
+
+
+class Traffic:
+    """Worker threads replaying conversations until stopped, pausable between requests"""
+
+    def __init__(self, client: TestClient, workers: int, students: int, seed: int):
+        self.client = client
+        self.workers = workers
+        self.students = students
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.conversations = 0
+        self._lock = threading.Lock()
+        self._running = threading.Event()
+        self._stopped = threading.Event()
+        self._idle = threading.Semaphore(0)
+        self._threads: List[threading.Thread] = []
+
+    def _call(self, method: str, path: str, **kwargs: Any) -> Optional[Dict]:
+        response = self.client.request(method, path, **kwargs)
+        with self._lock:
+            self.requests += 1
+            if response.status_code >= 400:
+                self.errors += 1
+                return None
+        return response.json()
+
+    def _conversation(self, rng: random.Random) -> None:
+        scenario = rng.choice(SCENARIOS)
+        student_id = f"soak-{rng.randrange(self.students)}"
+        headers = session_headers(student_id)
+        session_id = uuid.uuid4().hex
+        history: List[Dict[str, str]] = []
+        turns = scenario.turns + rng.sample(_FOLLOW_UPS, rng.randint(0, len(_FOLLOW_UPS)))
+        for message in turns:
+            reply = self._call("POST", "/api/chat", headers=headers, json={
+                "message": message, "student_id": student_id, "session_id": session_id, "history": history,
+            })
+            if reply is None:
+                break
+            history += [{"role": "user", "content": message}, {"role": "assistant", "content": reply["response"]}]
+        self._call("GET", "/api/tickets", headers=headers)
+        if rng.random() < 0.05:
+            self._call("GET", "/api/metrics")
+        with self._lock:
+            self.conversations += 1
+
+    def _worker(self, seed: int) -> None:
+        rng = random.Random(seed)
+        while not self._stopped.is_set():
+            if not self._running.is_set():
+                self._idle.release()
+                self._running.wait()
+                continue
+            try:
+                self._conversation(rng)
+            except Exception as e:
+                logger.error(f"Soak conversation failed: {e}")
+                with self._lock:
+                    self.errors += 1
+
+    def start(self) -> None:
+        self._running.set()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(self.random.random(),), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @contextlib.contextmanager
+    def paused(self):
+        """Block with every worker idle between conversations"""
+        self._running.clear()
+        for _ in self._threads:
+            self._idle.acquire()
+        try:
+            yield
+        finally:
+            self._running.set()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._running.set()
+        for thread in self._threads:
+            thread.join()
+
+
+def soak(duration: float, interval: float, warmup: float, workers: int, students: int, llm_delay: float,
+         frames: int, top: int, seed: int = 0) -> Dict[str, Any]:
+    model = ScriptedChatModel(delay_seconds=llm_delay)
+    # Every agent the app builds gets the fake model (both tiers)
+    support_agent.build_model_router = chat_routes.build_model_router = lambda *args, **kwargs: model
+
+    from src.app import app
+
+    tracemalloc.start(frames)
+    samples: List[Dict[str, Any]] = []
+    baseline: Optional[tracemalloc.Snapshot] = None
+    started = time.monotonic()
+    with TestClient(app) as client:
+        traffic = Traffic(client, workers, students, seed)
+        traffic.start()
+        for tick in itertools.count(1):
+            time.sleep(max(0.0, started + tick * interval - time.monotonic()))
+            with traffic.paused():
+                state = get_state()
+                if isinstance(state, InMemoryState):
+                    state.clear()
+                gc.collect()
+                elapsed = time.monotonic() - started
+                sample = {
+                    "seconds": round(elapsed, 1),
+                    "requests": traffic.requests,
+                    "conversations": traffic.conversations,
+                    "errors": traffic.errors,
+                    "rss_mb": round(rss_mb(), 2),
+                    "traced_mb": round(tracemalloc.get_traced_memory()[0] / 2 ** 20, 2),
+                    "warmup": elapsed < warmup,
+                }
+                samples.append(sample)
+                if baseline is None and not sample["warmup"]:
+                    baseline = tracemalloc.take_snapshot()
+                final = tracemalloc.take_snapshot() if elapsed >= duration else None
+            print(json.dumps(sample), file=sys.stderr)
+            if final is not None:
+                break
+        traffic.stop()
+    tracemalloc.stop()
+
+    measured = [s for s in samples if not s["warmup"]]
+    rss_slope = slope_per_hour([(s["seconds"], s["rss_mb"]) for s in measured])
+    traced_slope = slope_per_hour([(s["seconds"], s["traced_mb"]) for s in measured])
+    return {
+        "duration_seconds": round(samples[-1]["seconds"], 1),
+        "requests": traffic.requests,
+        "conversations": traffic.conversations,
+        "errors": traffic.errors,
+        "requests_per_second": round(traffic.requests / samples[-1]["seconds"], 1),
+        "rss_slope_mb_per_hour": None if rss_slope is None else round(rss_slope, 2),
+        "traced_slope_mb_per_hour": None if traced_slope is None else round(traced_slope, 2),
+        "top_growth": top_growth(baseline, final, top) if baseline is not None else [],
+        "samples": samples,
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Soak the chat API and fail on memory growth")
+    parser.add_argument("--duration", type=float, default=7200, help="seconds of traffic")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between memory samples")
+    parser.add_argument("--warmup", type=float, help="seconds excluded from the slope (default 10%% of duration)")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent simulated clients")
+    parser.add_argument("--students", type=int, default=2000, help="distinct student ids")
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds per fake LLM call")
+    parser.add_argument("--max-rss-slope", type=float, default=20.0, help="MB per hour")
+    parser.add_argument("--max-traced-slope", type=float, default=1.0, help="MB per hour")
+    parser.add_argument("--frames", type=int, default=10, help="traceback depth kept by tracemalloc")
+    parser.add_argument("--top", type=int, default=20, help="allocation sites in the report")
+    parser.add_argument("-o", "--output", help="write the JSON report here (default stdout)")
+    args = parser.parse_args(argv)
+
+    warmup = args.warmup if args.warmup is not None else max(args.interval, args.duration * 0.1)
+    # The agent executor is verbose; keep stdout for the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        report = soak(args.duration, args.interval, warmup, args.workers, args.students, args.llm_delay,
+                      args.frames, args.top)
+
+    failures = []
+    for key, limit in (("rss_slope_mb_per_hour", args.max_rss_slope),
+                       ("traced_slope_mb_per_hour", args.max_traced_slope)):
+        if report[key] is None:
+            failures.append(f"{key}: fewer than 3 samples after warmup")
+        elif report[key] > limit:
+            failures.append(f"{key}: {report[key]} > {limit}")
+    report["thresholds"] = {"rss_mb_per_hour": args.max_rss_slope, "traced_mb_per_hour": args.max_traced_slope}
+    report["failures"] = failures
+    report["passed"] = not failures
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    print(f"{report['requests']} requests, {report['errors']} errors, RSS {report['rss_slope_mb_per_hour']} MB/h, "
+          f"traced {report['traced_slope_mb_per_hour']} MB/h", file=sys.stderr)
+    for failure in failures:
+        print(f"FAIL {failure}", file=sys.stderr)
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""
+Streaming benchmark: turns per second over one WebSocket vs. the SSE route
+
+Runs the FastAPI app in-process (TestClient) with the scripted fake LLM.
+The same conversation (a refund request and its follow-up, which creates a
+ticket) is sent --turns times over /api/chat/stream, one POST per turn, and
+over one /ws/chat connection, first one turn at a time and then pipelined
+up to WS_MAX_CONCURRENT_TURNS. Reports turns per second and frames per turn.
+
+Usage (from the backend directory):
+    python -m src.eval.stream_bench --turns 200
+    python -m src.eval.stream_bench --turns 200 --llm-delay 0.02
+"""
+import os
+import sys
+import tempfile
+
+# Configure the app before it is imported, as the soak harness does
+_WORKDIR = tempfile.mkdtemp(prefix="stream-bench-")
+os.environ.setdefault("STATE_BACKEND_URL", "memory://")
+os.environ.setdefault("TICKET_SEARCH_DB", os.path.join(_WORKDIR, "ticket_search.db"))
+os.environ.setdefault("TRANSCRIPT_DIR", os.path.join(_WORKDIR, "transcripts"))
+os.environ.setdefault("EXTERNAL_API_BASE", "http://127.0.0.1:9")
+os.environ.setdefault("GEMINI_API_KEY", "unused-by-scripted-backend")
+os.environ.setdefault("AUTH_JWT_SECRET", "bench-" + os.urandom(8).hex())
+
+import argparse  # noqa: E402
+import contextlib  # noqa: E402
+import io  # noqa: E402
+import json  # noqa: E402
+import logging  # noqa: E402
+import time  # noqa: E402
+from typing import Any, Dict, List  # noqa: E402
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src.agents import support_agent  # noqa: E402
+from src.eval.models import ScriptedChatModel  # noqa: E402
+from src.eval.soak import session_headers  # noqa: E402
+from src.routes import ws as ws_routes  # noqa: E402
+
+REQUEST = "Хочу вернуть деньги за курс"
+CLARIFY = "Уточните, пожалуйста, причину возврата."
+FOLLOW_UP = "Переезжаю в другой город"
+
+
+def bench_sse(client: TestClient, turns: int) -> Dict[str, Any]:
+    frames = 0
+    started = time.perf_counter()
+    # One student, like the single WebSocket connection: repeats merge into one open ticket
+    student_id = "sse-bench"
+    for n in range(turns):
+        body = {
+            "message": FOLLOW_UP, "student_id": student_id,
+            "history": [{"role": "user", "content": REQUEST}, {"role": "assistant", "content": CLARIFY}],
+        }
+        with client.stream("POST", "/api/chat/stream", json=body, headers=session_headers(student_id)) as resp:
+            frames += sum(1 for line in resp.iter_lines() if line.startswith("data: "))
+    elapsed = time.perf_counter() - started
+    return {"turns_per_s": round(turns / elapsed, 1), "frames_per_turn": round(frames / turns, 2)}
+
+
+def bench_ws(client: TestClient, turns: int, window: int) -> Dict[str, Any]:
+    """`window` turns in flight at a time on one connection"""
+    frames = 0
+    headers = session_headers("ws-bench")
+    token = headers["Authorization"].split(" ", 1)[1]
+    started = time.perf_counter()
+    with client.websocket_connect("/ws/chat", cookies={"token": token}) as socket:
+        sent = done = 0
+        while done < turns:
+            while sent < turns and sent - done < window:
+                # The history lives on the connection; the follow-up alone still reaches the tool
+                socket.send_json({"id": f"m{sent}", "message": f"{REQUEST}. {FOLLOW_UP}"})
+                sent += 1
+            frame = socket.receive_json()
+            if frame.get("type") == "ping":
+                socket.send_json({"type": "pong"})
+                continue
+            frames += 1
+            if frame["type"] in ("done", "error"):
+                done += 1
+    elapsed = time.perf_counter() - started
+    return {"turns_per_s": round(turns / elapsed, 1), "frames_per_turn": round(frames / turns, 2)}
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Turns per second: WebSocket vs. SSE")
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--llm-delay", type=float, default=0.0, help="seconds per fake LLM call")
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    model = ScriptedChatModel(delay_seconds=args.llm_delay)
+    support_agent.build_model_router = lambda *a, **k: model
+    from src.app import app
+
+    # The agent executor prints its chain to stdout; keep the report readable
+    with TestClient(app) as client, contextlib.redirect_stdout(io.StringIO()):
+        # Warm-up: imports, caches, first ticket ids
+        bench_sse(client, 5)
+        report = {
+            "turns": args.turns,
+            "llm_delay_s": args.llm_delay,
+            "sse": bench_sse(client, args.turns),
+            "ws_sequential": bench_ws(client, args.turns, 1),
+            "ws_pipelined": bench_ws(client, args.turns, ws_routes.MAX_CONCURRENT_TURNS),
+        }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+"""
+Columnar export of tickets and transcript metadata for analytics
+
+Streams rows into Parquet (or Arrow IPC) files in record batches of
+--batch-size rows, so memory stays flat however many rows are exported.
+Low-cardinality columns (type, status, priority, category, assigned_to) are
+dictionary-encoded with one dictionary per column that only grows during a
+run, so every batch shares it. Each run continues from the watermark kept in
+the output directory and writes one new part file; the watermark only moves
+once that file is complete, so an interrupted run is simply repeated.
+
+Usage (from the backend directory; needs `pip install pyarrow`):
+    python -m src.export_analytics tickets -o exports/ [--format parquet|arrow] [--full]
+    python -m src.export_analytics transcripts -o exports/ [--transcripts-dir transcripts]
+
+Tickets: every ticket created or changed since the watermark, in its current
+state; a ticket changed again later reappears in a later part, so readers
+keep the newest row per ticket_id (highest exported_at). Once the watermark
+is saved, the change log is trimmed up to it, so keep a single output
+directory per state backend (another one falls back to a full export).
+Transcripts: one row per archived chat turn, without the message texts.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional, only this CLI needs it
+    pa = None
+
+from src.services import transcript_log
+from src.services.state import get_state
+from src.services.ticket_store import TicketStore
+
+WATERMARK_FILE = "_watermarks.json"
+
+# Columns: (name, kind); "dict" columns are dictionary-encoded strings
+TICKET_COLUMNS = [
+    ("ticket_id", "string"),
+    ("type", "dict"),
+    ("status", "dict"),
+    ("priority", "dict"),
+    ("category", "dict"),
+    ("assigned_to", "dict"),
+    ("student_id", "string"),
+    ("staff_id", "string"),
+    ("created_at", "timestamp"),
+    ("resolved_at", "timestamp"),
+    ("turnaround_hours", "float"),
+    ("follow_ups", "int"),
+    ("exported_at", "timestamp"),
+]
+TRANSCRIPT_COLUMNS = [
+    ("ts", "timestamp"),
+    ("student_id", "string"),
+    ("session_id", "string"),
+    ("ticket_id", "string"),
+    ("tools", "dict"),
+    ("tool_calls", "int"),
+    ("message_chars", "int"),
+    ("response_chars", "int"),
+]
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    try:
+        return datetime.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def ticket_row(ticket: Any, exported_at: datetime) -> Dict[str, Any]:
+    created_at = _timestamp(ticket.created_at)
+    resolved_at = _timestamp(getattr(ticket, "resolved_at", None))
+    turnaround = None
+    if created_at and resolved_at:
+        turnaround = round((resolved_at - created_at).total_seconds() / 3600, 3)
+    return {
+        "ticket_id": ticket.ticket_id,
+        "type": ticket.type,
+        "status": ticket.status,
+        "priority": ticket.priority,
+        "category": ticket.category,
+        "assigned_to": ticket.assigned_to,
+        "student_id": ticket.student_id,
+        "staff_id": ticket.staff_id,
+        "created_at": created_at,
+        "resolved_at": resolved_at,
+        "turnaround_hours": turnaround,
+        "follow_ups": len(ticket.updates or []),
+        "exported_at": exported_at,
+    }
+
+
+def transcript_row(record: Dict[str, Any]) -> Dict[str, Any]:
+    calls = record.get("tool_calls") or []
+    return {
+        "ts": _timestamp(record.get("ts")),
+        "student_id": record.get("student_id"),
+        "session_id": record.get("session_id"),
+        "ticket_id": record.get("ticket_id"),
+        # Tool sequence of the turn, e.g. "request_refund"; few distinct values
+        "tools": ",".join(str(c.get("tool")) for c in calls) or None,
+        "tool_calls": len(calls),
+        "message_chars": len(record.get("message") or ""),
+        "response_chars": len(record.get("response") or ""),
+    }
+
+
+class TicketSource:
+    """Tickets changed after change-log position `since` (all tickets when None)"""
+
+    def __init__(self, store: TicketStore, since: Optional[int], batch_size: int):
+        self.store = store
+        self.since = since
+        self.batch_size = batch_size
+        self.watermark = since
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        exported_at = datetime.now()
+        position = self.since
+        while position is not None:
+            ticket_ids = self.store.changes(position, self.batch_size)
+            if ticket_ids is None:
+                # Trimmed past our watermark (e.g. by another output directory): start over
+                print(f"Change log was trimmed past position {position}, exporting all tickets", file=sys.stderr)
+                break
+            if not ticket_ids:
+                return
+            # A ticket changed several times within one chunk is exported once
+            for ticket in self.store.get_many(list(dict.fromkeys(ticket_ids))):
+                yield ticket_row(ticket, exported_at)
+            position += len(ticket_ids)
+            self.watermark = position
+        # Changes logged while the full pass runs are exported again next time
+        self.watermark = self.store.changes_end()
+        for ticket in self.store.iter_all(self.batch_size):
+            yield ticket_row(ticket, exported_at)
+
+
+class TranscriptSource:
+    """Archived turns after the (segment, offset) watermark"""
+
+    def __init__(self, directory: str, since: Optional[Dict[str, int]]):
+        self.directory = directory
+        self.since = since
+        self.watermark = since
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        since = self.since or {"segment": 0, "offset": 0}
+        for segment, offset, record in transcript_log.scan(self.directory, since["segment"], since["offset"]):
+            yield transcript_row(record)
+            self.watermark = {"segment": segment, "offset": offset}
+
+
+class BatchBuilder:
+    """Accumulates rows column-wise and turns them into Arrow record batches"""
+
+    def __init__(self, columns: List[tuple]):
+        self.columns = columns
+        self.schema = pa.schema([
+            pa.field(name, pa.dictionary(pa.int32(), pa.string()) if kind == "dict" else self._arrow_type(kind))
+            for name, kind in columns
+        ])
+        self._values: Dict[str, List[Any]] = {name: [] for name, _ in columns}
+        # value -> code, insertion ordered, so each batch's dictionary extends the previous one
+        self._dictionaries: Dict[str, Dict[str, int]] = {name: {} for name, kind in columns if kind == "dict"}
+
+    @staticmethod
+    def _arrow_type(kind: str) -> Any:
+        return {"string": pa.string(), "timestamp": pa.timestamp("ms"), "float": pa.float64(), "int": pa.int64()}[kind]
+
+    def __len__(self) -> int:
+        return len(self._values[self.columns[0][0]])
+
+    def add(self, row: Dict[str, Any]) -> None:
+        for name, values in self._values.items():
+            values.append(row.get(name))
+
+    def flush(self) -> Any:
+        arrays = []
+        for field in self.schema:
+            values = self._values[field.name]
+            if field.name in self._dictionaries:
+                dictionary = self._dictionaries[field.name]
+                codes = [None if v is None else dictionary.setdefault(str(v), len(dictionary)) for v in values]
+                arrays.append(pa.DictionaryArray.from_arrays(
+                    pa.array(codes, type=pa.int32()), pa.array(list(dictionary), type=pa.string())
+                ))
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        self._values = {name: [] for name, _ in self.columns}
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+
+class _PartWriter:
+    def __init__(self, path: str, schema: Any, file_format: str):
+        self.path = path
+        if file_format == "parquet":
+            self._parquet = pq.ParquetWriter(path, schema, compression="zstd")
+            self._ipc = None
+        else:
+            self._parquet = None
+            # The file format allows dictionary deltas, which is all BatchBuilder produces
+            self._ipc = pa.ipc.new_file(path, schema, options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True))
+
+    def write(self, batch: Any) -> None:
+        if self._parquet is not None:
+            self._parquet.write_table(pa.Table.from_batches([batch]))
+        else:
+            self._ipc.write_batch(batch)
+
+    def close(self) -> None:
+        (self._parquet or self._ipc).close()
+
+
+def load_watermarks(output: str) -> Dict[str, Any]:
+    path = os.path.join(output, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_watermarks(output: str, watermarks: Dict[str, Any]) -> None:
+    path = os.path.join(output, WATERMARK_FILE)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(watermarks, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def export(dataset: str, source: Any, columns: List[tuple], output: str, file_format: str = "parquet",
+           batch_size: int = 65536) -> Dict[str, Any]:
+    """Write the source's rows as one new part file and advance the dataset's watermark"""
+    directory = os.path.join(output, dataset)
+    os.makedirs(directory, exist_ok=True)
+    extension = "parquet" if file_format == "parquet" else "arrow"
+    part = os.path.join(directory, f"part-{datetime.now():%Y%m%dT%H%M%S%f}.{extension}")
+
+    builder = BatchBuilder(columns)
+    writer = _PartWriter(part + ".tmp", builder.schema, file_format)
+    rows = batches = 0
+    try:
+        for row in source.rows():
+            builder.add(row)
+            if len(builder) >= batch_size:
+                writer.write(builder.flush())
+                batches += 1
+            rows += 1
+        if len(builder):
+            writer.write(builder.flush())
+            batches += 1
+    finally:
+        writer.close()
+
+    if rows:
+        os.replace(part + ".tmp", part)
+    else:
+        os.remove(part + ".tmp")
+        part = None
+    watermarks = load_watermarks(output)
+    if source.watermark is not None:
+        watermarks[dataset] = source.watermark
+        save_watermarks(output, watermarks)
+    return {"dataset": dataset, "rows": rows, "batches": batches, "file": part, "watermark": source.watermark}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export tickets or transcript metadata to Parquet / Arrow IPC")
+    parser.add_argument("dataset", choices=["tickets", "transcripts"])
+    parser.add_argument("-o", "--output", default="exports", help="output directory (holds the watermarks)")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    parser.add_argument("--batch-size", type=int, default=65536, help="rows per record batch")
+    parser.add_argument("--full", action="store_true", help="ignore the watermark and export everything")
+    parser.add_argument("--transcripts-dir", default=transcript_log.TRANSCRIPT_DIR)
+    args = parser.parse_args(argv)
+
+    if pa is None:
+        print("pyarrow is required for exports: pip install pyarrow", file=sys.stderr)
+        return 1
+
+    os.makedirs(args.output, exist_ok=True)
+    since = None if args.full else load_watermarks(args.output).get(args.dataset)
+    batch_size = max(1, args.batch_size)
+    store = TicketStore(get_state())
+    if args.dataset == "tickets":
+        source = TicketSource(store, since, min(batch_size, 1000))
+        columns = TICKET_COLUMNS
+    else:
+        source = TranscriptSource(args.transcripts_dir, since)
+        columns = TRANSCRIPT_COLUMNS
+
+    started = time.perf_counter()
+    result = export(args.dataset, source, columns, args.output, args.format, batch_size)
+    if args.dataset == "tickets" and source.watermark is not None:
+        # The watermark is saved: change-log entries before it are never read again
+        result["trimmed"] = store.trim_changes(source.watermark)
+    result["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
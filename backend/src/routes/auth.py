@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException, Response
 from src.schemas.models import LoginIn
 from src.services.auth_service import forward_login
+from src.services.profile_cache import PROFILES
 import logging
 
 # Configure logging
@@ -20,6 +21,8 @@ async def login(payload: LoginIn, response: Response):
         
         # Extract token from result
         token = result.get("token")
+        # Load the profile in the background so the first chat turn finds it cached
+        PROFILES.prefetch(payload.studentId, token, seed=result.get("user"))
         if token:
             # Set token in httpOnly cookie (more secure than localStorage)
             response.set_cookie(
@@ -1,33 +1,55 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
-from src.schemas.chat import ChatRequest
-from src.agents.support_agent import StudentSupportAgent
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import Response, StreamingResponse
+from src.schemas.chat import ChatBatchRequest, ChatRequest
+from src.agents.support_agent import StudentSupportAgent, build_light_model, build_model_router
+from src.agents.model_tiering import TIERING
+from src.agents.deadline import Deadline, deadline_from_header
+from src.services.idempotency import IDEMPOTENCY, MAX_KEY_LENGTH, IdempotencyConflict, IdempotencyPending, fingerprint
+from src.services.json_response import FastJSONResponse
+from src.services.metrics import METRICS
+from src.services.session_auth import Session, current_session, require_staff, resolve_student_id
+from src.services.sse import SSEWriter
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, Optional, Tuple
+import asyncio
 import logging
 import json
+import os
+import threading
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "1000"))
+BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "8"))
 
-@router.post("/api/chat")
-async def chat(request: ChatRequest):
-    """
-    AI chat endpoint for student support
-    Automatically detects problems and provides solutions using LangChain + Groq
-    """
+_batch_models: Optional[Tuple[Any, Any]] = None
+_batch_models_lock = threading.Lock()
+
+
+def _shared_batch_models() -> Tuple[Any, Any]:
+    """(agent router, light-tier router) shared by every batch, built on first use"""
+    global _batch_models
+    if _batch_models is None:
+        with _batch_models_lock:
+            if _batch_models is None:
+                light = build_light_model(TIERING) if TIERING.enabled else None
+                _batch_models = (build_model_router(), light)
+    return _batch_models
+
+
+def _chat_turn(request: ChatRequest, student_id: str, deadline: Deadline, verified: bool) -> Tuple[Dict, bool]:
+    """One agent turn of /api/chat: (response payload, whether it was answered normally)"""
     try:
-        # Ensure student_id is a string
-        student_id = str(request.student_id) if request.student_id else "unknown"
-        
         # Create agent for this student
-        agent = StudentSupportAgent(student_id=student_id)
+        agent = StudentSupportAgent(student_id=student_id, session_id=request.session_id, verified=verified)
         
         # Convert history to dict format
         history = [{"role": msg.role, "content": msg.content} for msg in request.history]
         
         # Get response from agent (now returns dict with response and ticket)
-        result = agent.chat(request.message, chat_history=history)
+        result = agent.chat(request.message, chat_history=history, deadline=deadline)
         
         # Build response
         response_data = {
@@ -39,33 +61,88 @@ async def chat(request: ChatRequest):
         if result.get("ticket"):
             response_data["ticket"] = result["ticket"]
         
-        return response_data
+        return response_data, not result.get("degraded")
     
     except Exception as e:
         logger.error(f"Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/api/chat")
+async def chat(
+    request: ChatRequest,
+    x_request_timeout: Optional[str] = Header(None),
+    idempotency_key: Optional[str] = Header(None),
+    session: Optional[Session] = Depends(current_session),
+):
+    """
+    AI chat endpoint for student support
+    Automatically detects problems and provides solutions using LangChain + Groq
+    
+    With an Idempotency-Key header, a retried request gets the stored response
+    of the first attempt (or waits for it) instead of running the agent again.
+    """
+    deadline = deadline_from_header(x_request_timeout)
+    # The verified session decides the student; the body can only repeat it
+    student_id = resolve_student_id(session, request.student_id)
+    
+    # The agent turn is synchronous; off the event loop, duplicates can wait for it
+    if not idempotency_key:
+        # Already plain data: serialize once, skipping FastAPI's jsonable_encoder pass
+        payload, _ = await run_in_threadpool(_chat_turn, request, student_id, deadline, session is not None)
+        return FastJSONResponse(payload)
+    
+    if len(idempotency_key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key is longer than {MAX_KEY_LENGTH} characters")
+    
+    async def render() -> Tuple[bytes, bool]:
+        # Fallback, partial and error answers are sent but not kept for replays
+        payload, normal = await run_in_threadpool(_chat_turn, request, student_id, deadline, session is not None)
+        return FastJSONResponse(payload).body, normal
+    
+    try:
+        body, replayed = await IDEMPOTENCY.run(
+            f"{student_id}:{idempotency_key}",
+            fingerprint(json.dumps(request.dict(), sort_keys=True, ensure_ascii=False).encode()),
+            render,
+        )
+    except IdempotencyConflict:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    except IdempotencyPending:
+        raise HTTPException(status_code=409, detail="The first request with this Idempotency-Key is still running",
+                            headers={"Retry-After": "1"})
+    
+    if replayed:
+        METRICS.increment("chat_idempotent_replays_total")
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"Idempotent-Replayed": "true"} if replayed else None,
+    )
+
+
 @router.post("/api/chat/stream")
-async def chat_stream(request: ChatRequest):
+async def chat_stream(
+    request: ChatRequest,
+    x_request_timeout: Optional[str] = Header(None),
+    session: Optional[Session] = Depends(current_session),
+):
     """
     Streaming version of chat endpoint
     Returns responses in real-time as they're generated
     """
+    deadline = deadline_from_header(x_request_timeout)
+    student_id = resolve_student_id(session, request.student_id)
     try:
-        # Ensure student_id is a string
-        student_id = str(request.student_id) if request.student_id else "unknown"
-        
-        agent = StudentSupportAgent(student_id=student_id)
+        agent = StudentSupportAgent(student_id=student_id, session_id=request.session_id,
+                                    verified=session is not None)
         history = [{"role": msg.role, "content": msg.content} for msg in request.history]
         
-        async def generate():
-            async for chunk in agent.chat_stream(request.message, chat_history=history):
-                yield f"data: {json.dumps({'chunk': chunk})}\n\n"
-            yield "data: [DONE]\n\n"
+        # Word chunks are coalesced into fewer frames; the ticket event flushes immediately
+        events = agent.chat_events(request.message, chat_history=history, deadline=deadline)
         
         return StreamingResponse(
-            generate(),
+            SSEWriter().stream(events),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
@@ -76,3 +153,62 @@ async def chat_stream(request: ChatRequest):
     except Exception as e:
         logger.error(f"Chat stream error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/api/chat/batch")
+async def chat_batch(
+    request: ChatBatchRequest,
+    x_request_timeout: Optional[str] = Header(None),
+    session: Session = Depends(require_staff),
+):
+    """
+    Run many chat messages through the agent with bounded concurrency
+    Results are streamed as NDJSON lines in completion order, tagged with the item index
+    
+    Staff only: each item names the student it runs as.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="items must not be empty")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+    student_ids = [str(item.student_id) if item.student_id else "unknown" for item in request.items]
+
+    concurrency = max(1, min(request.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    # The model routers (and their HTTP clients) are shared by all batches; agents
+    # are cheap wrappers around them and are reused per student and session
+    llm, light_llm = _shared_batch_models()
+    agents: Dict[tuple, StudentSupportAgent] = {}
+
+    async def run_item(index: int, item: ChatRequest) -> Dict:
+        student_id = student_ids[index]
+        async with semaphore:
+            try:
+                key = (student_id, item.session_id)
+                agent = agents.get(key)
+                if agent is None:
+                    agent = agents[key] = StudentSupportAgent(student_id=student_id, llm=llm,
+                                                              light_llm=light_llm,
+                                                              session_id=item.session_id)
+                history = [{"role": msg.role, "content": msg.content} for msg in item.history]
+                deadline = deadline_from_header(x_request_timeout)
+                result = await run_in_threadpool(agent.chat, item.message, history, deadline)
+                line = {"index": index, "student_id": student_id, "response": result.get("response", "")}
+                if result.get("ticket"):
+                    line["ticket"] = result["ticket"]
+                return line
+            except Exception as e:
+                logger.error(f"Batch item {index} failed: {str(e)}")
+                return {"index": index, "student_id": student_id, "error": str(e)}
+
+    async def generate():
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(request.items)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished, ensure_ascii=False) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(generate(), media_type="application/x-ndjson")
@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from src.services.metrics import METRICS
+from src.agents.model_router import latency_snapshot
+from src.services.circuit_breaker import breaker_snapshot
+
+router = APIRouter()
+
+
+@router.get("/api/metrics")
+async def metrics():
+    """Export in-process metrics, per-model latency statistics and circuit breaker states"""
+    snapshot = METRICS.snapshot()
+    snapshot["models"] = latency_snapshot()
+    snapshot["circuit_breakers"] = breaker_snapshot()
+    return snapshot
@@ -0,0 +1,152 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from src.schemas.tickets import TicketStatusUpdate
+from src.services import ticket_feed, ticket_stats
+from src.services.session_auth import Session, require_session, require_staff, resolve_student_id
+from src.services.sse import HEARTBEAT_INTERVAL, sse_event
+from src.services.ticket_dedup import DUPLICATES
+from src.services.ticket_search import get_search_index
+from src.services.ticket_store import TICKETS
+from typing import Optional
+
+TICKET_STATUSES = {"open", "in_progress", "resolved", "closed"}
+
+router = APIRouter()
+
+
+def _student(session: Session, student_id: Optional[str]) -> str:
+    """Whose tickets to show: the caller's own; staff may name any student"""
+    if student_id and session.is_staff:
+        return str(student_id)
+    return resolve_student_id(session, student_id)
+
+
+@router.get("/api/tickets")
+async def list_tickets(
+    response: Response,
+    student_id: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    session: Session = Depends(require_session),
+):
+    """
+    List tickets created for a student, newest first
+    The ETag is the student's latest change-feed sequence, so an unchanged
+    poll is answered with 304 after a single list-tail read.
+    """
+    student_id = _student(session, student_id)
+    seq = ticket_feed.latest_seq(TICKETS.state, student_id)
+    etag = f'W/"{seq}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    # The cursor lets the client continue with /api/tickets/changes or /api/tickets/feed
+    return {"tickets": [ticket.payload() for ticket in TICKETS.list_for_student(student_id)], "cursor": seq}
+
+
+@router.get("/api/tickets/changes")
+async def ticket_changes(
+    student_id: Optional[str] = None,
+    cursor: int = Query(0, ge=0),
+    timeout: float = Query(25.0, ge=0, le=60),
+    session: Session = Depends(require_session),
+):
+    """Long poll: ticket events after `cursor`, waiting up to `timeout` seconds for the first one"""
+    student_id = _student(session, student_id)
+    return await ticket_feed.NOTIFIER.wait(TICKETS.state, student_id, cursor, timeout)
+
+
+@router.get("/api/tickets/feed")
+async def ticket_feed_stream(
+    student_id: Optional[str] = None,
+    cursor: int = Query(0, ge=0),
+    last_event_id: Optional[str] = Header(None),
+    session: Session = Depends(require_session),
+):
+    """
+    SSE stream of ticket events ("created", "updated", "status") for a student
+    Resumes after `cursor`, or after Last-Event-ID when the browser reconnects.
+    """
+    student_id = _student(session, student_id)
+    if last_event_id and last_event_id.isdigit():
+        cursor = max(cursor, int(last_event_id))
+
+    async def stream():
+        position = cursor
+        while True:
+            page = await ticket_feed.NOTIFIER.wait(TICKETS.state, student_id, position, HEARTBEAT_INTERVAL)
+            if page["reset"]:
+                yield sse_event({"cursor": page["cursor"]}, "reset")
+            for event in page["events"]:
+                yield sse_event(event, "ticket", event["seq"])
+            if not page["events"] and not page["reset"]:
+                yield ": ping\n\n"
+            position = page["cursor"]
+
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+@router.get("/api/tickets/search")
+async def search_tickets(
+    q: str,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    sort: str = Query("relevance", regex="^(relevance|recent)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    staff: Session = Depends(require_staff),
+):
+    """Full-text search over ticket description, category and assignee (staff only)"""
+    try:
+        page = get_search_index().search(
+            q, status=status, priority=priority, date_from=date_from, date_to=date_to,
+            sort=sort, cursor=cursor, limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    tickets = {t.ticket_id: t for t in TICKETS.get_many(page["ticket_ids"])}
+    return {
+        "tickets": [tickets[i].payload() for i in page["ticket_ids"] if i in tickets],
+        "next_cursor": page["next_cursor"],
+    }
+
+
+@router.get("/api/tickets/stats")
+async def ticket_dashboard_stats(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    staff: Session = Depends(require_staff),
+):
+    """Dashboard aggregates read from materialized counters (staff only); supports conditional GET"""
+    stats = ticket_stats.read(TICKETS.state)
+    etag = f'W/"{stats["version"]}-{stats["sla_breached"]}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return stats
+
+
+@router.get("/api/tickets/{ticket_id}")
+async def get_ticket(ticket_id: str, session: Session = Depends(require_session)):
+    """One ticket, for its owner or staff; ids are sequential, so others get 404 as if it did not exist"""
+    ticket = TICKETS.get(ticket_id)
+    if ticket is None or not (session.is_staff or TICKETS.owner_of(ticket) == session.student_id):
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    return ticket.payload()
+
+
+@router.patch("/api/tickets/{ticket_id}/status")
+async def update_ticket_status(ticket_id: str, payload: TicketStatusUpdate, staff: Session = Depends(require_staff)):
+    """Move a ticket through its workflow (staff only)"""
+    if payload.status not in TICKET_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {sorted(TICKET_STATUSES)}")
+    ticket = TICKETS.set_status(ticket_id, payload.status)
+    if ticket is None:
+        raise HTTPException(status_code=404, detail="Ticket not found")
+    if ticket.status != "open":
+        DUPLICATES.discard(TICKETS.owner_of(ticket), ticket)
+    get_search_index().index(ticket)
+    return ticket.payload()
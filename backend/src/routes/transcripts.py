@@ -0,0 +1,31 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from starlette.concurrency import run_in_threadpool
+from src.services.session_auth import Session, require_session, resolve_student_id
+from src.services.transcript_log import TRANSCRIPTS, TranscriptLog
+
+router = APIRouter()
+
+
+@router.get("/api/transcripts")
+async def list_transcripts(
+    student_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    session: Session = Depends(require_session),
+):
+    """
+    Archived chat turns of a student, or of one of their conversations, oldest first
+
+    Students read their own archive; staff name the student or conversation to read.
+    """
+    if not isinstance(TRANSCRIPTS, TranscriptLog):
+        raise HTTPException(status_code=404, detail="Transcript archive is disabled")
+    if session.is_staff:
+        if not student_id and not session_id:
+            raise HTTPException(status_code=400, detail="student_id or session_id is required")
+    else:
+        student_id = resolve_student_id(session, student_id)
+    # Segment reads touch the disk; keep them off the event loop
+    turns = await run_in_threadpool(TRANSCRIPTS.read, student_id, session_id, limit)
+    return {"student_id": student_id, "session_id": session_id, "turns": turns}
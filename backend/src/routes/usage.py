@@ -0,0 +1,26 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from src.services.session_auth import Session, require_staff
+from src.services.token_usage import USAGE, DAILY_TOKEN_BUDGET
+
+router = APIRouter()
+
+
+@router.get("/api/usage")
+async def usage_report(day: Optional[str] = None, limit: int = Query(20, ge=1, le=200),
+                       staff: Session = Depends(require_staff)):
+    """LLM token usage for a day (YYYY-MM-DD, default today): totals, per category, top students"""
+    return USAGE.report(day, limit)
+
+
+@router.get("/api/usage/students/{student_id}")
+async def student_usage(student_id: str, day: Optional[str] = None, staff: Session = Depends(require_staff)):
+    """Token usage of one student and how much of the daily budget is left"""
+    usage = USAGE.student_usage(student_id, day)
+    spent = usage["prompt"] + usage["completion"]
+    return {
+        "student_id": student_id,
+        "usage": usage,
+        "daily_budget": DAILY_TOKEN_BUDGET,
+        "remaining": max(DAILY_TOKEN_BUDGET - spent, 0) if DAILY_TOKEN_BUDGET else None,
+    }
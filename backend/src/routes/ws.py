@@ -0,0 +1,199 @@
+"""
+WebSocket chat endpoint
+One authenticated connection carries many turns: the agent and the
+conversation history stay on the server, turns are multiplexed by message ID
+and results are streamed back as JSON frames.
+
+Client -> server: {"id": "m1", "message": "...", "timeout": 20}
+                  {"type": "pong"} in reply to a ping
+Server -> client: {"id": "m1", "type": "tool" | "chunk" | "ticket" | "done" | "error", ...}
+                  {"type": "ping"} heartbeats
+
+Turns use the same event source as /api/chat/stream, with text chunks
+coalesced the same way as its SSE frames. A malformed frame or one over the
+per-connection limit of unfinished turns gets an "error" frame; the
+connection stays open. A client that sends nothing (not even a pong) for
+WS_HEARTBEAT_SECONDS + WS_PONG_TIMEOUT_SECONDS, or stops reading, is
+disconnected with code 4408.
+
+python -m src.routes.ws --bench
+    turns per second over one WebSocket vs. the SSE route, scripted model
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+
+from src.agents.deadline import deadline_from_header
+from src.agents.support_agent import StudentSupportAgent
+from src.services.session_auth import VERIFIER, session_from_token
+from src.services.sse import coalesce
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_SECONDS", "20"))
+# How long past a heartbeat a client may stay silent (or a ping may wait to be sent)
+PONG_TIMEOUT = float(os.getenv("WS_PONG_TIMEOUT_SECONDS", "10"))
+MAX_CONCURRENT_TURNS = int(os.getenv("WS_MAX_CONCURRENT_TURNS", "4"))
+SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# Turns running or waiting for a slot; frames beyond this are rejected
+MAX_PENDING_TURNS = int(os.getenv("WS_MAX_PENDING_TURNS", "16"))
+# Most recent messages of the conversation sent to the agent with each turn
+MAX_HISTORY = int(os.getenv("WS_MAX_HISTORY_MESSAGES", "20"))
+
+
+class ChatConnection:
+    def __init__(self, websocket: WebSocket, student_id: str, verified: bool = False):
+        self.websocket = websocket
+        self.student_id = student_id
+        # One archived conversation per connection
+        self.agent = StudentSupportAgent(student_id=student_id, session_id=f"ws-{uuid.uuid4().hex}",
+                                         verified=verified)
+        self.history: List[Dict] = []
+        # Bounded outbox: producers wait when the client reads slower than we write
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.turns = asyncio.Semaphore(MAX_CONCURRENT_TURNS)
+        self.tasks: Dict[str, asyncio.Task] = {}
+        # Pings bypass the outbox; the lock keeps them from interleaving with frames
+        self.send_lock = asyncio.Lock()
+        self.last_seen = time.monotonic()
+
+    async def send(self, frame: Dict) -> None:
+        async with self.send_lock:
+            await self.websocket.send_json(frame)
+
+    async def writer(self):
+        while True:
+            await self.send(await self.outbox.get())
+
+    async def heartbeat(self):
+        """Ping every HEARTBEAT_INTERVAL; returns once the client stops answering"""
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_seen > HEARTBEAT_INTERVAL + PONG_TIMEOUT:
+                return
+            try:
+                # A client that stopped reading blocks the send once the socket buffers fill up
+                await asyncio.wait_for(self.send({"type": "ping"}), timeout=PONG_TIMEOUT)
+            except asyncio.TimeoutError:
+                return
+
+    async def run_turn(self, message_id: str, message: str, timeout):
+        async with self.turns:
+            try:
+                deadline = deadline_from_header(str(timeout) if timeout is not None else None)
+                history = list(self.history)
+                # Same event source as /api/chat/stream, batched the same way as its SSE frames
+                events = self.agent.chat_events(message, history, deadline)
+                response = []
+                error = None
+                async for event, payload in coalesce(events, heartbeat_interval=math.inf):
+                    if event == "error":
+                        error = payload
+                        break
+                    if event == "chunk":
+                        response.append(payload)
+                    await self.outbox.put({"id": message_id, "type": event, event: payload})
+
+                if error is not None:
+                    logger.error(f"WebSocket turn {message_id} failed: {error}")
+                    await self.outbox.put({"id": message_id, "type": "error", "detail": error})
+                    return
+                self.history.append({"role": "user", "content": message})
+                self.history.append({"role": "assistant", "content": "".join(response)})
+                del self.history[:-MAX_HISTORY]
+                await self.outbox.put({"id": message_id, "type": "done"})
+            except Exception as e:
+                logger.error(f"WebSocket turn {message_id} failed: {str(e)}")
+                await self.outbox.put({"id": message_id, "type": "error", "detail": str(e)})
+            finally:
+                self.tasks.pop(message_id, None)
+
+    async def reader(self):
+        """Start a turn per message frame; returns when the client disconnects"""
+        try:
+            while True:
+                frame = await _receive_frame(self.websocket)
+                self.last_seen = time.monotonic()
+                if isinstance(frame, dict) and frame.get("type") == "pong":
+                    continue
+                if not isinstance(frame, dict):
+                    await self.outbox.put({"id": None, "type": "error", "detail": "Frame must be a JSON object"})
+                    continue
+                message_id = str(frame.get("id") or "")
+                message = frame.get("message")
+                if not message_id or not isinstance(message, str):
+                    await self.outbox.put({"id": message_id or None, "type": "error", "detail": "id and message are required"})
+                    continue
+                if message_id in self.tasks:
+                    await self.outbox.put({"id": message_id, "type": "error", "detail": "Duplicate message id"})
+                    continue
+                if len(self.tasks) >= MAX_PENDING_TURNS:
+                    await self.outbox.put({"id": message_id, "type": "error", "detail": "Too many unfinished turns"})
+                    continue
+                self.tasks[message_id] = asyncio.create_task(
+                    self.run_turn(message_id, message, frame.get("timeout"))
+                )
+        except WebSocketDisconnect:
+            return
+
+
+def _authenticate(websocket: WebSocket):
+    """Resolve the student for this connection once, at handshake time"""
+    token = websocket.cookies.get("token")
+    if not token:
+        return None
+    if not VERIFIER.enabled:
+        # No signing keys configured: keep trusting the query parameter
+        return websocket.query_params.get("student_id") or None
+    session = session_from_token(token)
+    return session.student_id if session else None
+
+
+async def _receive_frame(websocket: WebSocket) -> Optional[Any]:
+    """Next client frame decoded from JSON, None if it is not valid JSON"""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    data = message.get("text")
+    if data is None:
+        data = message.get("bytes") or b""
+    try:
+        return json.loads(data)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+@router.websocket("/ws/chat")
+async def chat_socket(websocket: WebSocket):
+    # A cold key cache means an HTTP fetch; keep it off the event loop
+    student_id = await run_in_threadpool(_authenticate, websocket)
+    if student_id is None:
+        await websocket.close(code=4401)
+        return
+
+    await websocket.accept()
+    # Without signing keys the student ID is the client's claim, not a verified session
+    connection = ChatConnection(websocket, student_id, verified=VERIFIER.enabled)
+    reader = asyncio.create_task(connection.reader())
+    heartbeat = asyncio.create_task(connection.heartbeat())
+    writer = asyncio.create_task(connection.writer())
+    try:
+        done, _ = await asyncio.wait({reader, heartbeat, writer}, return_when=asyncio.FIRST_COMPLETED)
+        if heartbeat in done:
+            logger.info(f"WebSocket of student {student_id} missed its heartbeat, closing")
+            await websocket.close(code=4408)
+        else:
+            logger.info(f"WebSocket closed for student {student_id}")
+    finally:
+        for task in list(connection.tasks.values()) + [reader, heartbeat, writer]:
+            task.cancel()
@@ -11,3 +11,9 @@ class ChatRequest(BaseModel):
     message: str
     history: Optional[List[ChatMessage]] = []
     student_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+
+class ChatBatchRequest(BaseModel):
+    items: List[ChatRequest]
+    concurrency: Optional[int] = None
@@ -0,0 +1,30 @@
+from pydantic import BaseModel
+from typing import Dict, List, Optional
+
+
+class Ticket(BaseModel):
+    """Ticket created by an agent tool; type-specific fields are kept as extras"""
+    ticket_id: str
+    type: str
+    status: str = "open"
+    priority: str
+    description: str
+    student_id: Optional[str] = None
+    staff_id: Optional[str] = None
+    created_at: str
+    estimated_response: str
+    assigned_to: Optional[str] = None
+    category: Optional[str] = None
+    actions_required: Optional[List[str]] = None
+    # Follow-up requests merged into this ticket by duplicate detection
+    updates: Optional[List[Dict[str, str]]] = None
+
+    class Config:
+        extra = "allow"
+
+    def payload(self) -> dict:
+        return self.dict(exclude_none=True)
+
+
+class TicketStatusUpdate(BaseModel):
+    status: str  # "open", "in_progress", "resolved" or "closed"
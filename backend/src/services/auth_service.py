@@ -2,23 +2,42 @@ import os
 import httpx
 from fastapi import HTTPException
 from src.schemas.models import LoginIn
+from src.services.circuit_breaker import get_breaker
 
 EXTERNAL_BASE = os.getenv("EXTERNAL_API_BASE", "https://api.mastereducation.kz")
+AUTH_TIMEOUT = float(os.getenv("EXTERNAL_API_TIMEOUT_SECONDS", "10"))
+
+_breaker = get_breaker("auth_api")
 
 
 async def forward_login(payload: LoginIn):
     url = f"{EXTERNAL_BASE}/api/Students/login"
+    if not _breaker.allow():
+        # Fail fast instead of waiting for the timeout on a dead upstream
+        raise HTTPException(
+            status_code=503,
+            detail="External auth service is temporarily unavailable",
+            headers={"Retry-After": str(int(_breaker.retry_after()) or 1)},
+        )
+
     async with httpx.AsyncClient() as client:
         try:
             resp = await client.post(
                 url,
                 json={"studentId": payload.studentId, "password": payload.password},
                 headers={"Accept": "application/json, text/plain, */*", "Content-Type": "application/json"},
-                timeout=10.0,
+                timeout=AUTH_TIMEOUT,
             )
         except httpx.RequestError:
+            _breaker.record_failure()
             raise HTTPException(status_code=502, detail="Failed to reach external auth service")
 
+    # Wrong credentials (4xx) still mean the upstream is healthy
+    if resp.status_code >= 500:
+        _breaker.record_failure()
+    else:
+        _breaker.record_success()
+
     content_type = resp.headers.get("content-type", "")
 
     if "application/json" in content_type:
@@ -0,0 +1,163 @@
+"""
+Circuit breakers for upstream services
+Closed: calls pass and outcomes go into a rolling time window. Once the window
+has enough calls and the failure rate passes the threshold, the breaker opens
+and calls fail fast. After the open period a limited number of probe calls is
+let through (half-open); a successful probe closes the breaker, a failed one
+opens it again. States are exported as gauges (0 closed, 1 half-open, 2 open).
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from src.services.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker {name} is open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = float(os.getenv("CB_FAILURE_RATE", "0.5")),
+        min_calls: int = int(os.getenv("CB_MIN_CALLS", "10")),
+        window: float = float(os.getenv("CB_WINDOW_SECONDS", "30")),
+        open_seconds: float = float(os.getenv("CB_OPEN_SECONDS", "30")),
+        half_open_probes: int = int(os.getenv("CB_HALF_OPEN_PROBES", "1")),
+    ):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        # Start times of probes in flight; a probe that never reports back
+        # (hung call) stops counting after open_seconds
+        self._probes: List[float] = []
+        METRICS.set_gauge("circuit_breaker_state", 0, breaker=name)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._maybe_half_open()
+            return self._state
+
+    def _transition(self, state: str) -> None:
+        if state == self._state:
+            return
+        logger.warning(f"Circuit breaker {self.name}: {self._state} -> {state}")
+        self._state = state
+        METRICS.set_gauge("circuit_breaker_state", _STATE_GAUGE[state], breaker=self.name)
+        METRICS.increment("circuit_breaker_transitions_total", breaker=self.name, state=state)
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._probes = []
+        elif state == CLOSED:
+            self._outcomes.clear()
+            self._probes = []
+
+    def _maybe_half_open(self) -> None:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(self.open_seconds - (time.monotonic() - self._opened_at), 0.0)
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open state this reserves a probe"""
+        with self._lock:
+            self._maybe_half_open()
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN:
+                now = time.monotonic()
+                self._probes = [t for t in self._probes if now - t < self.open_seconds]
+                if len(self._probes) < self.half_open_probes:
+                    self._probes.append(now)
+                    return True
+        METRICS.increment("circuit_breaker_rejected_total", breaker=self.name)
+        return False
+
+    def check(self) -> None:
+        """allow() that raises CircuitOpenError instead of returning False"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after() or self.open_seconds)
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(CLOSED)
+            elif self._state == CLOSED:
+                self._outcomes.append((time.monotonic(), True))
+                self._prune()
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._transition(OPEN)
+                return
+            if self._state != CLOSED:
+                return
+            self._outcomes.append((time.monotonic(), False))
+            self._prune()
+            if len(self._outcomes) >= self.min_calls:
+                failures = len([ok for _, ok in self._outcomes if not ok])
+                if failures / len(self._outcomes) >= self.failure_rate:
+                    self._transition(OPEN)
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.window
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            self._maybe_half_open()
+            self._prune()
+            failures = len([ok for _, ok in self._outcomes if not ok])
+            return {
+                "state": self._state,
+                "calls_in_window": len(self._outcomes),
+                "failures_in_window": failures,
+            }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str, **settings: Any) -> CircuitBreaker:
+    """Process-wide breaker for `name`; settings apply on first use only"""
+    breaker: Optional[CircuitBreaker] = _BREAKERS.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _BREAKERS.get(name)
+            if breaker is None:
+                breaker = _BREAKERS[name] = CircuitBreaker(name, **settings)
+    return breaker
+
+
+def breaker_snapshot() -> Dict[str, Dict[str, Any]]:
+    return {name: breaker.snapshot() for name, breaker in list(_BREAKERS.items())}
@@ -0,0 +1,342 @@
+"""
+Group schedule index
+Answers "groups at level X with free seats that meet when the student can"
+for the unfreeze and group-change tools. The week is cut into 30-minute slots
+(7 x 48 = 336); a group's lessons and a student's preferences are both
+bitmasks over those slots. Per level the index keeps, for every slot, a bitset
+of the groups that meet in it, so a lookup is a few hundred big-int ORs and
+never scans the groups themselves.
+
+The feed is a JSON file (GROUP_SCHEDULE_PATH), reloaded when it changes:
+    {"groups": [{"id": "G-12", "name": "B1 вечер", "level": "B1", "teacher": "...",
+                 "capacity": 8, "enrolled": 6,
+                 "sessions": [{"day": "пн", "start": "19:00", "end": "20:30"}, ...]}]}
+
+python -m src.services.group_schedule --bench
+    build and lookup timings for 10k synthetic groups
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_PATH = os.getenv("GROUP_SCHEDULE_PATH", "")
+RELOAD_SECONDS = float(os.getenv("GROUP_SCHEDULE_RELOAD_SECONDS", "60"))
+CANDIDATES_LIMIT = int(os.getenv("GROUP_CANDIDATES_LIMIT", "3"))
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WEEK_SLOTS = 7 * SLOTS_PER_DAY
+ANY_TIME = (1 << WEEK_SLOTS) - 1
+
+DAY_NAMES = ("пн", "вт", "ср", "чт", "пт", "сб", "вс")
+_FEED_DAYS = {name: i for i, name in enumerate(DAY_NAMES)}
+_FEED_DAYS.update({name: i for i, name in enumerate(("mon", "tue", "wed", "thu", "fri", "sat", "sun"))})
+
+# Day words in student preferences -> day indexes
+_DAY_WORDS = [
+    (re.compile(r"понедельн\w*|\bпн\b"), (0,)),
+    (re.compile(r"вторн\w*|\bвт\b"), (1,)),
+    (re.compile(r"сред[аыу]\b|\bср\b"), (2,)),
+    (re.compile(r"четверг\w*|\bчт\b"), (3,)),
+    (re.compile(r"пятниц\w*|\bпт\b"), (4,)),
+    (re.compile(r"суббот\w*|\bсб\b"), (5,)),
+    (re.compile(r"воскресен\w*|\bвс\b"), (6,)),
+    (re.compile(r"будн\w*|рабоч\w* дн\w*"), (0, 1, 2, 3, 4)),
+    (re.compile(r"выходн\w*"), (5, 6)),
+]
+# Parts of the day -> (start hour, end hour)
+_DAY_PARTS = [
+    (re.compile(r"утр\w*|\bутром\b"), (8, 12)),
+    (re.compile(r"\bдн[её]м\b|обед\w*|днев\w*"), (12, 17)),
+    (re.compile(r"вечер\w*"), (17, 22)),
+]
+_TIME = r"(\d{1,2})(?:[:.](\d{2}))?"
+_RANGE = re.compile(r"(?:с\s*)?" + _TIME + r"\s*(?:-|–|—|до)\s*" + _TIME)
+_AFTER = re.compile(r"после\s*" + _TIME)
+_AT = re.compile(r"\bв\s*" + _TIME + r"\b")
+
+
+def _slot(day: int, hours: int, minutes: int = 0) -> int:
+    return day * SLOTS_PER_DAY + min(hours * 60 + minutes, 24 * 60) // SLOT_MINUTES
+
+
+def _span(days: Iterable[int], start: Tuple[int, int], end: Tuple[int, int]) -> int:
+    """Bits of [start, end) on each of `days`; a lesson ending mid-slot still occupies it"""
+    mask = 0
+    for day in days:
+        first = _slot(day, *start)
+        end_minutes = min(end[0] * 60 + end[1], 24 * 60)
+        last = day * SLOTS_PER_DAY + -(-end_minutes // SLOT_MINUTES)
+        if last > first:
+            mask |= ((1 << (last - first)) - 1) << first
+    return mask
+
+
+def _clock(value: str) -> Tuple[int, int]:
+    hours, _, minutes = str(value).partition(":")
+    return int(hours), int(minutes or 0)
+
+
+def parse_preferences(text: str) -> int:
+    """
+    Weekly slot mask for free-text preferences such as "будни после 18:00" or
+    "пн, ср вечером"; days or times that are not mentioned mean "any"
+    """
+    text = (text or "").lower()
+    days = sorted({d for pattern, found in _DAY_WORDS if pattern.search(text) for d in found}) or range(7)
+
+    hours: List[Tuple[Tuple[int, int], Tuple[int, int]]] = []
+    for match in _RANGE.finditer(text):
+        start = (int(match.group(1)), int(match.group(2) or 0))
+        end = (int(match.group(3)), int(match.group(4) or 0))
+        if start < end <= (24, 0):
+            hours.append((start, end))
+    for match in _AFTER.finditer(text):
+        hours.append(((int(match.group(1)), int(match.group(2) or 0)), (24, 0)))
+    if not hours:
+        for match in _AT.finditer(text):
+            hour = int(match.group(1))
+            if hour < 24:
+                hours.append(((hour, int(match.group(2) or 0)), (min(hour + 2, 24), 0)))
+    if not hours:
+        hours = [((start, 0), (end, 0)) for pattern, (start, end) in _DAY_PARTS if pattern.search(text)]
+    if not hours:
+        hours = [((0, 0), (24, 0))]
+
+    mask = 0
+    for start, end in hours:
+        mask |= _span(days, start, end)
+    return mask
+
+
+class Group(NamedTuple):
+    group_id: str
+    name: str
+    level: str
+    teacher: str
+    capacity: int
+    enrolled: int
+    schedule: str
+    mask: int
+
+    @property
+    def free_seats(self) -> int:
+        return max(self.capacity - self.enrolled, 0)
+
+    def payload(self) -> Dict[str, Any]:
+        return {
+            "group_id": self.group_id,
+            "name": self.name,
+            "level": self.level,
+            "teacher": self.teacher,
+            "schedule": self.schedule,
+            "free_seats": self.free_seats,
+        }
+
+
+def _level_key(level: Any) -> str:
+    return str(level or "").strip().lower()
+
+
+def group_from_feed(raw: Dict[str, Any]) -> Group:
+    mask = 0
+    parts = []
+    for session in raw.get("sessions", []):
+        day = session["day"]
+        day = int(day) if isinstance(day, int) or str(day).isdigit() else _FEED_DAYS[str(day).strip().lower()[:3]]
+        start, end = _clock(session["start"]), _clock(session["end"])
+        mask |= _span((day,), start, end)
+        parts.append(f"{DAY_NAMES[day]} {start[0]:02d}:{start[1]:02d}–{end[0]:02d}:{end[1]:02d}")
+    return Group(
+        group_id=str(raw["id"]),
+        name=str(raw.get("name") or raw["id"]),
+        level=str(raw.get("level", "")),
+        teacher=str(raw.get("teacher", "")),
+        capacity=int(raw.get("capacity", 0)),
+        enrolled=int(raw.get("enrolled", 0)),
+        schedule=", ".join(parts),
+        mask=mask,
+    )
+
+
+class _LevelIndex:
+    def __init__(self, groups: List[Group]):
+        # Most free seats first: lower bit positions are the better candidates
+        self.groups = sorted(groups, key=lambda g: -g.free_seats)
+        self.by_slot = [0] * WEEK_SLOTS
+        # Slots where any group meets; the rest are skipped by lookups
+        self.occupied = 0
+        for position, group in enumerate(self.groups):
+            bit = 1 << position
+            self.occupied |= group.mask
+            mask = group.mask
+            while mask:
+                low = mask & -mask
+                self.by_slot[low.bit_length() - 1] |= bit
+                mask ^= low
+        self.everyone = (1 << len(self.groups)) - 1
+
+    def meeting_in(self, mask: int) -> int:
+        """Bitset of groups with at least one lesson inside `mask`"""
+        if mask == ANY_TIME:
+            return self.everyone
+        found = 0
+        by_slot = self.by_slot
+        mask &= self.occupied
+        while mask:
+            low = mask & -mask
+            found |= by_slot[low.bit_length() - 1]
+            mask ^= low
+        return found
+
+    def take(self, bits: int, limit: int) -> List[Group]:
+        picked = []
+        while bits and len(picked) < limit:
+            low = bits & -bits
+            picked.append(self.groups[low.bit_length() - 1])
+            bits ^= low
+        return picked
+
+
+class ScheduleIndex:
+    def __init__(self, groups: Iterable[Group]):
+        by_level: Dict[str, List[Group]] = {}
+        self.size = 0
+        for group in groups:
+            self.size += 1
+            if group.free_seats > 0 and group.mask:
+                by_level.setdefault(_level_key(group.level), []).append(group)
+        self._levels = {level: _LevelIndex(groups) for level, groups in by_level.items()}
+
+    def find(self, level: str, preferences: int = ANY_TIME, limit: int = CANDIDATES_LIMIT) -> List[Group]:
+        """
+        Groups at `level` with free seats that meet within `preferences`
+
+        Groups whose every lesson fits the preferences come first, then groups
+        that only partly overlap them; ties go to the group with more free seats.
+        """
+        index = self._levels.get(_level_key(level))
+        if index is None or not preferences:
+            return []
+        overlapping = index.meeting_in(preferences)
+        outside = index.meeting_in(ANY_TIME & ~preferences) if preferences != ANY_TIME else 0
+        fitting = overlapping & ~outside
+        picked = index.take(fitting, limit)
+        if len(picked) < limit:
+            picked += index.take(overlapping & outside, limit - len(picked))
+        return picked
+
+
+def load_index(path: str) -> ScheduleIndex:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    rows = data.get("groups", []) if isinstance(data, dict) else data
+    groups = []
+    for raw in rows:
+        try:
+            groups.append(group_from_feed(raw))
+        except (KeyError, ValueError, IndexError) as e:
+            logger.warning(f"Skipping group {raw.get('id')!r} in {path}: {e!r}")
+    return ScheduleIndex(groups)
+
+
+class ScheduleFeed:
+    """Index over the feed file, rebuilt when its mtime changes (checked every RELOAD_SECONDS)"""
+
+    def __init__(self, path: str = SCHEDULE_PATH, reload_seconds: float = RELOAD_SECONDS):
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self._index: Optional[ScheduleIndex] = None
+        self._mtime = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def index(self) -> Optional[ScheduleIndex]:
+        if not self.path:
+            return None
+        if time.monotonic() - self._checked_at < self.reload_seconds:
+            return self._index
+        with self._lock:
+            if time.monotonic() - self._checked_at < self.reload_seconds:
+                return self._index
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime != self._mtime:
+                    started = time.perf_counter()
+                    self._index = load_index(self.path)
+                    self._mtime = mtime
+                    logger.info(f"Loaded {self._index.size} groups from {self.path} "
+                                f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+            except (OSError, ValueError) as e:
+                # Keep answering from the last good index
+                logger.error(f"Group schedule reload from {self.path} failed: {e}")
+        return self._index
+
+    def candidates(self, level: Optional[str], preferences: str = "",
+                   limit: int = CANDIDATES_LIMIT) -> List[Dict[str, Any]]:
+        """Candidate groups as ticket payloads; empty if the level or the feed is unknown"""
+        index = self.index()
+        if index is None or not level:
+            return []
+        return [g.payload() for g in index.find(level, parse_preferences(preferences), limit)]
+
+
+SCHEDULE = ScheduleFeed()
+
+
+if __name__ == "__main__":
+    # Benchmark: 10k synthetic groups over six levels
+    import random
+    import statistics
+    import sys
+
+    if "--bench" not in sys.argv:
+        sys.exit("usage: python -m src.services.group_schedule --bench")
+
+    rng = random.Random(42)
+    levels = ["A1", "A2", "B1", "B2", "C1", "IELTS"]
+    patterns = [(0, 2, 4), (1, 3), (5, 6), (0, 3), (1, 4), (2,)]
+    groups = []
+    for i in range(10000):
+        hour = rng.choice(range(8, 21))
+        start, end = f"{hour}:{rng.choice(('00', '30'))}", f"{hour + 1}:{rng.choice(('00', '30'))}"
+        groups.append(group_from_feed({
+            "id": f"G-{i}", "level": rng.choice(levels), "capacity": 8, "enrolled": rng.randint(3, 8),
+            "sessions": [{"day": d, "start": start, "end": end} for d in rng.choice(patterns)],
+        }))
+
+    started = time.perf_counter()
+    index = ScheduleIndex(groups)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    queries = ["будни после 18:00", "пн, ср вечером", "выходные утром", "вт чт с 10 до 14", "в 19:00", ""]
+    masks = [parse_preferences(q) for q in queries]
+    timings = []
+    for _ in range(2000):
+        level, mask = rng.choice(levels), rng.choice(masks)
+        t = time.perf_counter()
+        found = index.find(level, mask)
+        timings.append((time.perf_counter() - t) * 1e6)
+        assert all(g.level == level and g.free_seats > 0 and g.mask & mask for g in found)
+
+    started = time.perf_counter()
+    for _ in range(2000):
+        parse_preferences(rng.choice(queries))
+    parse_us = (time.perf_counter() - started) / 2000 * 1e6
+
+    timings.sort()
+    print(json.dumps({
+        "groups": len(groups),
+        "build_ms": round(build_ms, 1),
+        "find_p50_us": round(statistics.median(timings), 1),
+        "find_p99_us": round(timings[int(len(timings) * 0.99)], 1),
+        "parse_preferences_us": round(parse_us, 1),
+        "sample": [g.payload() for g in index.find("B1", parse_preferences("пн, ср вечером"))],
+    }, ensure_ascii=False, indent=2))
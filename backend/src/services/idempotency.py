@@ -0,0 +1,174 @@
+"""
+Idempotency keys for chat turns
+A client that retries POST /api/chat with the same Idempotency-Key header
+gets the first attempt's response (ticket included) instead of a second
+agent run: no extra LLM tokens, no second ticket.
+
+Keys live on the shared state backend, so a retry that lands on another
+worker is answered too. The first attempt claims the key (SET NX with a
+lease of IDEMPOTENCY_LEASE_SECONDS, in case its worker dies mid-turn); once
+it completes normally, the rendered JSON body replaces the claim for
+IDEMPOTENCY_TTL_SECONDS. A duplicate in the same process waits for the
+running attempt and gets its outcome; a duplicate on another worker polls
+the key every IDEMPOTENCY_POLL_SECONDS until the body appears, for at most
+IDEMPOTENCY_MAX_WAIT_SECONDS. State backend calls run in the threadpool, so
+a slow Redis does not stall the event loop.
+
+Only normal answers are stored. A failed turn, or one answered by the
+fallback engine or cut short by its deadline, releases the key and the next
+retry runs the turn again. Keys are scoped per student, and a key reused
+with a different request body is rejected.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from src.services.state import get_state
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+IDEMPOTENCY_LEASE = float(os.getenv("IDEMPOTENCY_LEASE_SECONDS", "120"))
+IDEMPOTENCY_POLL = float(os.getenv("IDEMPOTENCY_POLL_SECONDS", "0.1"))
+# Longest a duplicate waits for the attempt running on another worker
+IDEMPOTENCY_MAX_WAIT = float(os.getenv("IDEMPOTENCY_MAX_WAIT_SECONDS", "30"))
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+
+class IdempotencyPending(Exception):
+    """The first attempt is still running on another worker; retry later"""
+
+
+def fingerprint(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, state: Any = None, ttl: float = IDEMPOTENCY_TTL, lease: float = IDEMPOTENCY_LEASE,
+                 poll: float = IDEMPOTENCY_POLL, max_wait: float = IDEMPOTENCY_MAX_WAIT):
+        self._state = state
+        self.ttl = ttl
+        self.lease = lease
+        self.poll = poll
+        self.max_wait = max_wait
+        # Attempts running in this process: key -> (fingerprint, outcome)
+        self._in_flight: Dict[str, Tuple[str, Future]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> Any:
+        return self._state if self._state is not None else get_state()
+
+    @staticmethod
+    def _key(key: str) -> str:
+        return f"idempotency:{key}"
+
+    def _lookup(self, key: str, print_: str) -> Tuple[Optional[bytes], bool]:
+        """(stored body, claimed): a replay, or whether some worker is running the turn"""
+        raw = self.state.get(self._key(key))
+        if raw is None:
+            return None, False
+        record = json.loads(raw)
+        if record["fingerprint"] != print_:
+            raise IdempotencyConflict(key)
+        body = record.get("body")
+        return (body.encode() if body is not None else None), body is None
+
+    def _claim(self, key: str, print_: str) -> Tuple[Optional[bytes], Optional[Future], bool]:
+        """(stored body, future, owner): a replay, a local run to wait for, or a run the caller must do"""
+        with self._lock:
+            running = self._in_flight.get(key)
+            if running is not None:
+                if running[0] != print_:
+                    raise IdempotencyConflict(key)
+                return None, running[1], False
+        body, claimed = self._lookup(key, print_)
+        if body is not None or claimed:
+            return body, None, False
+        if not self.state.set(self._key(key), json.dumps({"fingerprint": print_}), ttl=self.lease, nx=True):
+            # Claimed by another worker in the meantime
+            return None, None, False
+        future: Future = Future()
+        with self._lock:
+            self._in_flight[key] = (print_, future)
+        return None, future, True
+
+    def _finish(self, key: str, print_: str, future: Future, body: Optional[bytes], storable: bool,
+                error: Optional[BaseException]) -> None:
+        try:
+            if error is None and storable:
+                record = {"fingerprint": print_, "body": body.decode()}
+                self.state.set(self._key(key), json.dumps(record, ensure_ascii=False), ttl=self.ttl)
+            else:
+                # Released: the next retry runs the turn again
+                self.state.delete(self._key(key))
+        except Exception as e:
+            logger.error(f"Could not record idempotency key {key}: {e}")
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            if error is None:
+                future.set_result(body)
+            else:
+                future.set_exception(error)
+
+    async def run(self, key: str, print_: str,
+                  compute: Callable[[], Awaitable[Tuple[bytes, bool]]]) -> Tuple[bytes, bool]:
+        """
+        Body for `key`: stored, awaited from the running attempt, or computed now
+
+        `compute` returns (body, storable); only storable bodies are replayed
+        to later retries.
+
+        Returns:
+            (body, replayed); raises IdempotencyConflict if the key belongs to
+            another request, IdempotencyPending if another worker's attempt
+            outlasts max_wait
+        """
+        give_up_at = time.monotonic() + self.max_wait
+        while True:
+            body, future, owner = await run_in_threadpool(self._claim, key, print_)
+            if body is not None:
+                return body, True
+            if future is not None:
+                break
+            # Running on another worker: wait for its body, or for the key to be released
+            if time.monotonic() + self.poll > give_up_at:
+                raise IdempotencyPending(key)
+            await asyncio.sleep(self.poll)
+        if not owner:
+            # A failed first attempt re-raises its error here as well
+            return await asyncio.wrap_future(future), True
+
+        async def attempt() -> Tuple[bytes, bool]:
+            try:
+                body, storable = await compute()
+            except BaseException as e:
+                await run_in_threadpool(self._finish, key, print_, future, None, False, e)
+                raise
+            await run_in_threadpool(self._finish, key, print_, future, body, storable, None)
+            return body, storable
+
+        # The run outlives a caller that goes away (the dropped connection a
+        # retry is made for), so the retry still finds its result
+        body, _ = await asyncio.shield(asyncio.ensure_future(attempt()))
+        return body, False
+
+
+IDEMPOTENCY = IdempotencyStore()
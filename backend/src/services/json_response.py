@@ -0,0 +1,11 @@
+"""
+Fast JSON response class
+orjson-backed when available, with the stdlib-backed JSONResponse as fallback
+"""
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as FastJSONResponse
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    from fastapi.responses import JSONResponse as FastJSONResponse
+
+__all__ = ["FastJSONResponse"]
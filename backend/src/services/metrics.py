@@ -0,0 +1,55 @@
+"""
+In-process metrics registry
+Counters, gauges and simple histograms exported as JSON by /api/metrics
+"""
+import threading
+from typing import Any, Dict, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Dict[str, float]]] = {}
+
+    def increment(self, name: str, value: float = 1, **labels: Any) -> None:
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._gauges.setdefault(name, {})[_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels: Any) -> None:
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.setdefault(_key(labels), {"count": 0, "sum": 0.0, "max": 0.0})
+            hist["count"] += 1
+            hist["sum"] += value
+            hist["max"] = max(hist["max"], value)
+
+    def snapshot(self) -> Dict[str, Any]:
+        def export(metrics):
+            return {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in metrics.items()
+            }
+
+        with self._lock:
+            return {
+                "counters": export(self._counters),
+                "gauges": export(self._gauges),
+                "histograms": export(self._histograms),
+            }
+
+
+METRICS = Metrics()
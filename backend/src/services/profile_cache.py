@@ -0,0 +1,277 @@
+"""
+Student profile cache
+Level, group, bonus balance and course from the MasterEducation API, fetched
+in the background when the student logs in so tools read them locally and
+never wait on the upstream inside an agent turn.
+
+Entries are fresh for PROFILE_TTL_SECONDS; for PROFILE_STALE_SECONDS after
+that they are still served while one background refresh runs (stale-while-
+revalidate). Concurrent refreshes of a student share one request
+(single-flight) and the cache holds at most PROFILE_CACHE_SIZE students (LRU).
+
+Agent turns of students without a verified session run under
+profile_fetches(False): they read what is cached but never start a fetch, so
+a claimed student ID cannot make us call the upstream on its behalf.
+
+python -m src.services.profile_cache --check
+    exercises the cache against a local stub of the profile API
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import httpx
+
+from src.services.circuit_breaker import get_breaker
+
+logger = logging.getLogger(__name__)
+
+EXTERNAL_BASE = os.getenv("EXTERNAL_API_BASE", "https://api.mastereducation.kz")
+PROFILE_PATH = os.getenv("PROFILE_API_PATH", "/api/Students/{student_id}")
+PROFILE_TTL = float(os.getenv("PROFILE_TTL_SECONDS", "300"))
+PROFILE_STALE = float(os.getenv("PROFILE_STALE_SECONDS", "3600"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "10000"))
+PROFILE_TIMEOUT = float(os.getenv("PROFILE_API_TIMEOUT_SECONDS", "5"))
+
+# Profile field -> keys the upstream may use for it
+_FIELDS = {
+    "level": ("level", "Level", "englishLevel", "levelName"),
+    "group": ("group", "groupName", "Group"),
+    "bonus_balance": ("bonusBalance", "bonuses", "bonus_balance", "bonus"),
+    "course": ("course", "courseName", "Course"),
+}
+# Profile field -> extra field name on tickets
+_TICKET_FIELDS = {"level": "student_level", "group": "student_group", "bonus_balance": "bonus_balance",
+                  "course": "student_course"}
+
+
+def normalize_profile(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """Pick the fields tools use out of an upstream student document"""
+    profile = {}
+    for field, keys in _FIELDS.items():
+        for key in keys:
+            value = raw.get(key)
+            if isinstance(value, dict):
+                value = value.get("name") or value.get("title")
+            if value not in (None, ""):
+                profile[field] = value
+                break
+    return profile
+
+
+def fetch_profile(student_id: str, token: Optional[str]) -> Dict[str, Any]:
+    """Student profile from the external API (raises on failure)"""
+    breaker = get_breaker("profile_api")
+    breaker.check()
+    headers = {"Accept": "application/json"}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    try:
+        resp = httpx.get(EXTERNAL_BASE + PROFILE_PATH.format(student_id=student_id), headers=headers,
+                         timeout=PROFILE_TIMEOUT)
+    except httpx.RequestError:
+        breaker.record_failure()
+        raise
+    if resp.status_code >= 500:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    resp.raise_for_status()
+    data = resp.json()
+    return normalize_profile(data.get("student") or data.get("user") or data)
+
+
+_fetch_allowed: ContextVar[bool] = ContextVar("profile_fetch_allowed", default=True)
+
+
+@contextmanager
+def profile_fetches(allowed: bool):
+    """Allow or forbid starting profile fetches for the code run inside the block"""
+    reset_token = _fetch_allowed.set(allowed)
+    try:
+        yield
+    finally:
+        _fetch_allowed.reset(reset_token)
+
+
+class _Entry(NamedTuple):
+    profile: Dict[str, Any]
+    fetched_at: float
+    token: Optional[str]
+
+
+class ProfileCache:
+    def __init__(
+        self,
+        fetcher: Callable[[str, Optional[str]], Dict[str, Any]] = fetch_profile,
+        ttl: float = PROFILE_TTL,
+        stale: float = PROFILE_STALE,
+        max_entries: int = PROFILE_CACHE_SIZE,
+        workers: int = int(os.getenv("PROFILE_FETCH_WORKERS", "4")),
+    ):
+        self.fetcher = fetcher
+        self.ttl = ttl
+        self.stale = stale
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._in_flight: Dict[str, Future] = {}
+        # Latest login token per student (LRU, same bound as the entries)
+        self._tokens: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="profile-fetch")
+
+    def _store(self, student_id: str, entry: _Entry) -> None:
+        self._entries[student_id] = entry
+        self._entries.move_to_end(student_id)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._tokens.pop(evicted, None)
+
+    def _refresh(self, student_id: str, token: Optional[str]) -> Dict[str, Any]:
+        try:
+            profile = self.fetcher(student_id, token)
+        except Exception as e:
+            logger.warning(f"Profile refresh for student {student_id} failed: {e}")
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(student_id, None)
+        with self._lock:
+            self._store(student_id, _Entry(profile, time.monotonic(), token))
+        return profile
+
+    def refresh(self, student_id: str, token: Optional[str] = None) -> Future:
+        """Start a background refresh, or join the one already running for this student"""
+        with self._lock:
+            future = self._in_flight.get(student_id)
+            if future is not None:
+                return future
+            if token:
+                self._tokens[student_id] = token
+                self._tokens.move_to_end(student_id)
+                while len(self._tokens) > self.max_entries:
+                    self._tokens.popitem(last=False)
+            token = token or self._tokens.get(student_id)
+            future = self._in_flight[student_id] = self._executor.submit(self._refresh, student_id, token)
+        return future
+
+    def prefetch(self, student_id: str, token: Optional[str] = None, seed: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Warm the cache for a student who just logged in
+
+        `seed` (the user object from the login response) is served right away
+        until the full profile arrives.
+        """
+        student_id = str(student_id)
+        if seed:
+            profile = normalize_profile(seed)
+            if profile:
+                with self._lock:
+                    if student_id not in self._entries:
+                        # Already stale, so the first read still triggers a refresh
+                        self._store(student_id, _Entry(profile, time.monotonic() - self.ttl, token))
+        self.refresh(student_id, token)
+
+    def get(self, student_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Cached profile without waiting on the upstream
+
+        Fresh: returned as is. Stale: returned and refreshed in the background.
+        Missing or expired: None, with a background fetch started.
+        No fetch is started under profile_fetches(False).
+        """
+        student_id = str(student_id)
+        with self._lock:
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                self._entries.move_to_end(student_id)
+        age = time.monotonic() - entry.fetched_at if entry is not None else None
+        if age is not None and age < self.ttl:
+            return entry.profile
+        if _fetch_allowed.get():
+            self.refresh(student_id, entry.token if entry is not None else None)
+        if age is not None and age < self.ttl + self.stale:
+            return entry.profile
+        return None
+
+    def get_or_fetch(self, student_id: str, timeout: float = PROFILE_TIMEOUT) -> Optional[Dict[str, Any]]:
+        """Like get(), but waits for the fetch on a miss (for code outside the chat turn)"""
+        profile = self.get(student_id)
+        if profile is not None or not _fetch_allowed.get():
+            return profile
+        try:
+            return self.refresh(str(student_id)).result(timeout=timeout)
+        except Exception:
+            return None
+
+    def ticket_fields(self, student_id: str) -> Dict[str, Any]:
+        """Profile data to attach to a ticket, e.g. {"student_level": "B1", ...}"""
+        profile = self.get(student_id) or {}
+        return {_TICKET_FIELDS[field]: value for field, value in profile.items()}
+
+
+PROFILES = ProfileCache()
+
+
+if __name__ == "__main__":
+    # Stub API check: prefetch, hit, single-flight, stale-while-revalidate, LRU bound
+    import json
+    import sys
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    if "--check" not in sys.argv:
+        sys.exit("usage: python -m src.services.profile_cache --check")
+
+    class StubAPI(BaseHTTPRequestHandler):
+        hits = 0
+
+        def do_GET(self):
+            StubAPI.hits += 1
+            time.sleep(0.05)
+            student_id = self.path.rsplit("/", 1)[-1]
+            body = json.dumps({"id": student_id, "level": "B1", "groupName": f"G-{student_id}",
+                               "bonusBalance": 2, "courseName": "IELTS"}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    EXTERNAL_BASE = f"http://127.0.0.1:{server.server_port}"
+
+    cache = ProfileCache(ttl=0.3, stale=5, max_entries=100)
+    cache.prefetch("1", token="t")
+    futures = [cache.refresh("1") for _ in range(50)]
+    futures[0].result()
+    assert StubAPI.hits == 1, "single-flight"
+
+    started = time.perf_counter()
+    for _ in range(10000):
+        cache.get("1")
+    hit_us = (time.perf_counter() - started) / 10000 * 1e6
+    assert cache.get("1")["group"] == "G-1"
+    fields = cache.ticket_fields("1")
+
+    time.sleep(0.35)
+    assert cache.get("1") is not None, "stale entry is served"
+    time.sleep(0.2)
+    assert StubAPI.hits == 2, "stale read triggers one refresh"
+
+    for i in range(300):
+        cache.prefetch(str(1000 + i))
+    while cache._in_flight:
+        time.sleep(0.05)
+    assert len(cache._entries) <= 100, "bounded"
+    print(json.dumps({"hit_us": round(hit_us, 2), "upstream_requests": StubAPI.hits,
+                      "entries": len(cache._entries), "ticket_fields": fields}, ensure_ascii=False))
+    server.shutdown()
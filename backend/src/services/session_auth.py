@@ -0,0 +1,332 @@
+"""
+Local verification of session tokens
+The `token` cookie set by /api/auth/login is a JWT signed by the external API.
+Signature, expiry and claims are checked in-process: signing keys come from
+the JWKS endpoint (AUTH_JWKS_URL) through a TTL cache refreshed in the
+background, or from a shared secret (AUTH_JWT_SECRET). Verified tokens are
+memoized until they expire, so a chat turn costs a dict lookup and no network
+I/O in steady state.
+
+python -m src.services.session_auth --bench
+    verification latency against a local key-server stub
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+import httpx
+import jwt
+from fastapi import Depends, HTTPException, Request
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+JWKS_URL = os.getenv("AUTH_JWKS_URL", "")
+JWT_SECRET = os.getenv("AUTH_JWT_SECRET", "")
+ALGORITHMS = [a.strip() for a in os.getenv("AUTH_JWT_ALGORITHMS", "RS256").split(",") if a.strip()]
+ISSUER = os.getenv("AUTH_JWT_ISSUER") or None
+AUDIENCE = os.getenv("AUTH_JWT_AUDIENCE") or None
+STUDENT_CLAIMS = [c.strip() for c in os.getenv("AUTH_STUDENT_CLAIM", "studentId,sub").split(",") if c.strip()]
+# Claim holding the caller's role(s), and the roles that may act on any student's tickets
+STAFF_CLAIM = os.getenv("AUTH_STAFF_CLAIM", "role")
+STAFF_ROLES = {r.strip().lower() for r in os.getenv("AUTH_STAFF_ROLES", "admin,staff,support").split(",") if r.strip()}
+JWKS_REFRESH_SECONDS = float(os.getenv("AUTH_JWKS_REFRESH_SECONDS", "600"))
+# Keep using the last good key set this long if the key server is unreachable
+JWKS_MAX_STALE_SECONDS = float(os.getenv("AUTH_JWKS_MAX_STALE_SECONDS", "86400"))
+LEEWAY_SECONDS = float(os.getenv("AUTH_JWT_LEEWAY_SECONDS", "30"))
+VERIFIED_CACHE_SIZE = int(os.getenv("AUTH_VERIFIED_CACHE_SIZE", "10000"))
+# When true, chat endpoints reject requests without a valid session token
+AUTH_REQUIRED = os.getenv("CHAT_AUTH_REQUIRED", "false").lower() == "true"
+
+
+class InvalidSessionToken(ValueError):
+    pass
+
+
+class Session(NamedTuple):
+    student_id: str
+    expires_at: float
+    claims: Dict[str, Any]
+
+    @property
+    def is_staff(self) -> bool:
+        roles = self.claims.get(STAFF_CLAIM) or []
+        if isinstance(roles, str):
+            roles = [roles]
+        return any(str(role).lower() in STAFF_ROLES for role in roles)
+
+
+class JWKSCache:
+    """Signing keys by kid; refreshed in the background, and on an unknown kid (key rotation)"""
+
+    def __init__(self, url: str, refresh_interval: float = JWKS_REFRESH_SECONDS,
+                 max_stale: float = JWKS_MAX_STALE_SECONDS, min_refetch_interval: float = 30.0):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.max_stale = max_stale
+        self.min_refetch_interval = min_refetch_interval
+        self._keys: Dict[str, Any] = {}
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+        self._lock = threading.Lock()
+        self._refresher: Optional[threading.Thread] = None
+        self.fetches = 0
+
+    def _fetch(self) -> None:
+        # The new key set replaces the old one in a single assignment, so
+        # readers never need the lock and the HTTP request runs without it
+        self._last_attempt = time.monotonic()
+        self.fetches += 1
+        resp = httpx.get(self.url, timeout=5.0)
+        resp.raise_for_status()
+        keys = {}
+        for jwk in resp.json().get("keys", []):
+            try:
+                keys[jwk.get("kid", "")] = jwt.PyJWK(jwk).key
+            except jwt.PyJWTError as e:
+                logger.warning(f"Skipping unusable JWKS key {jwk.get('kid')}: {e}")
+        self._keys = keys
+        self._fetched_at = time.monotonic()
+
+    def _refresh_loop(self) -> None:
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self._fetch()
+            except Exception as e:
+                logger.error(f"JWKS refresh from {self.url} failed: {e}")
+
+    def get(self, kid: str) -> Any:
+        key = self._keys.get(kid)
+        if key is not None and time.monotonic() - self._fetched_at < self.max_stale:
+            return key
+
+        with self._lock:
+            key = self._keys.get(kid)
+            stale = time.monotonic() - self._fetched_at >= self.max_stale
+            needs_fetch = not self._fetched_at or key is None or stale
+            may_fetch = not self._last_attempt or time.monotonic() - self._last_attempt >= self.min_refetch_interval
+            if needs_fetch and may_fetch:
+                try:
+                    self._fetch()
+                except Exception as e:
+                    logger.error(f"JWKS fetch from {self.url} failed: {e}")
+                key = self._keys.get(kid)
+            if self._refresher is None and self._fetched_at:
+                self._refresher = threading.Thread(target=self._refresh_loop, name="jwks-refresh", daemon=True)
+                self._refresher.start()
+
+        if key is None:
+            raise InvalidSessionToken(f"Unknown signing key {kid!r}")
+        if time.monotonic() - self._fetched_at >= self.max_stale:
+            raise InvalidSessionToken("Signing keys are stale")
+        return key
+
+
+class SessionVerifier:
+    def __init__(self, jwks: Optional[JWKSCache] = None, secret: str = JWT_SECRET,
+                 cache_size: int = VERIFIED_CACHE_SIZE):
+        self.jwks = jwks
+        self.secret = secret
+        self.cache_size = cache_size
+        self._verified: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.jwks is not None or bool(self.secret)
+
+    def _key_for(self, token: str) -> Any:
+        if self.jwks is None:
+            return self.secret
+        try:
+            kid = jwt.get_unverified_header(token).get("kid", "")
+        except jwt.PyJWTError as e:
+            raise InvalidSessionToken(str(e))
+        return self.jwks.get(kid)
+
+    def cached(self, token: str) -> Optional[Session]:
+        """Session for a token verified before and not expired yet; never does I/O"""
+        with self._lock:
+            session = self._verified.get(token)
+            if session is not None:
+                if session.expires_at > time.time():
+                    self._verified.move_to_end(token)
+                    return session
+                del self._verified[token]
+        return None
+
+    def verify(self, token: str) -> Session:
+        """
+        Verified session for `token`; raises InvalidSessionToken
+
+        May fetch signing keys over HTTP (unknown kid), so async code calls it
+        in a worker thread unless cached() already has the answer.
+        """
+        session = self.cached(token)
+        if session is not None:
+            return session
+
+        try:
+            claims = jwt.decode(
+                token,
+                self._key_for(token),
+                algorithms=ALGORITHMS if self.jwks is not None else ["HS256"],
+                issuer=ISSUER,
+                audience=AUDIENCE,
+                leeway=LEEWAY_SECONDS,
+                options={"require": ["exp"], "verify_aud": AUDIENCE is not None},
+            )
+        except jwt.PyJWTError as e:
+            raise InvalidSessionToken(str(e))
+
+        student_id = next((str(claims[c]) for c in STUDENT_CLAIMS if claims.get(c)), None)
+        if student_id is None:
+            raise InvalidSessionToken("Token has no student id claim")
+
+        session = Session(student_id, float(claims["exp"]), claims)
+        with self._lock:
+            self._verified[token] = session
+            if len(self._verified) > self.cache_size:
+                self._verified.popitem(last=False)
+        return session
+
+
+VERIFIER = SessionVerifier(JWKSCache(JWKS_URL) if JWKS_URL else None)
+
+
+def _token_from(request: Any) -> Optional[str]:
+    token = request.cookies.get("token")
+    if token:
+        return token
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        return authorization[7:].strip() or None
+    return None
+
+
+def session_from_token(token: Optional[str]) -> Optional[Session]:
+    """Verified session for a raw token, or None if missing or invalid"""
+    if not token or not VERIFIER.enabled:
+        return None
+    try:
+        return VERIFIER.verify(token)
+    except InvalidSessionToken as e:
+        logger.info(f"Rejected session token: {e}")
+        return None
+
+
+async def current_session(request: Request) -> Optional[Session]:
+    """
+    FastAPI dependency: the verified session of the caller
+
+    A present but invalid token is always rejected. Without a token the
+    request passes anonymously unless CHAT_AUTH_REQUIRED is set.
+    """
+    token = _token_from(request)
+    if token and VERIFIER.enabled:
+        try:
+            return VERIFIER.cached(token) or await run_in_threadpool(VERIFIER.verify, token)
+        except InvalidSessionToken as e:
+            raise HTTPException(status_code=401, detail=f"Invalid session token: {e}")
+    if AUTH_REQUIRED:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return None
+
+
+async def require_session(session: Optional[Session] = Depends(current_session)) -> Session:
+    """FastAPI dependency: a verified session, whatever CHAT_AUTH_REQUIRED says"""
+    if session is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return session
+
+
+async def require_staff(session: Session = Depends(require_session)) -> Session:
+    """FastAPI dependency: a verified session with a staff role (see AUTH_STAFF_ROLES)"""
+    if not session.is_staff:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    return session
+
+
+def resolve_student_id(session: Optional[Session], claimed: Optional[str]) -> str:
+    """
+    Student the request acts for: the token's, never a different one from the body
+
+    Once tokens can be verified, an anonymous caller cannot act for a
+    student by naming one; only deployments without signing keys still
+    trust the claimed id.
+    """
+    if session is None:
+        if claimed and VERIFIER.enabled:
+            raise HTTPException(status_code=401, detail="Sign in to act for a student")
+        return str(claimed) if claimed else "unknown"
+    if claimed and str(claimed) != session.student_id:
+        raise HTTPException(status_code=403, detail="student_id does not match the session")
+    return session.student_id
+
+
+if __name__ == "__main__":
+    # Benchmark: RS256 tokens verified against a JWKS served by a local stub
+    import sys
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    if "--bench" not in sys.argv:
+        sys.exit("usage: python -m src.services.session_auth --bench")
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+    jwk.update(kid="bench", alg="RS256", use="sig")
+    body = json.dumps({"keys": [jwk]}).encode()
+
+    class KeyServer(BaseHTTPRequestHandler):
+        hits = 0
+
+        def do_GET(self):
+            KeyServer.hits += 1
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeyServer)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    verifier = SessionVerifier(JWKSCache(f"http://127.0.0.1:{server.server_port}/jwks"))
+
+    def token(student: int) -> str:
+        claims = {"studentId": str(student), "exp": int(time.time()) + 3600}
+        return jwt.encode(claims, private_key, algorithm="RS256", headers={"kid": "bench"})
+
+    tokens = [token(i) for i in range(2000)]
+
+    started = time.perf_counter()
+    verifier.verify(tokens[0])
+    cold = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for t in tokens[1:]:
+        verifier.verify(t)
+    first_seen = (time.perf_counter() - started) / (len(tokens) - 1)
+
+    rounds = 20
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for t in tokens:
+            verifier.verify(t)
+    cached = (time.perf_counter() - started) / (rounds * len(tokens))
+
+    print(json.dumps({
+        "cold_first_verify_ms": round(cold * 1000, 2),
+        "signature_verify_us": round(first_seen * 1e6, 1),
+        "cached_verify_us": round(cached * 1e6, 2),
+        "key_server_hits": KeyServer.hits,
+    }))
+    server.shutdown()
@@ -0,0 +1,135 @@
+"""
+Server-Sent Events writer with frame coalescing
+Text chunks are batched into one frame per size/time window; tool and ticket
+events flush the batch and go out immediately. Idle streams get comment
+heartbeats so proxies keep the connection open. The batching itself
+(coalesce) is shared with the WebSocket endpoint.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Any, AsyncIterator, Tuple
+
+from src.services.metrics import METRICS
+
+_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+_END = object()
+
+FLUSH_BYTES = int(os.getenv("SSE_FLUSH_BYTES", "512"))
+FLUSH_INTERVAL = float(os.getenv("SSE_FLUSH_MS", "20")) / 1000.0
+HEARTBEAT_INTERVAL = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+
+def sse_frame(payload: Any) -> str:
+    return f"data: {_ENCODER.encode(payload)}\n\n"
+
+
+def sse_event(payload: Any, event: str, event_id: Any = None) -> str:
+    """Named event frame; `event_id` is echoed back by browsers as Last-Event-ID on reconnect"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {_ENCODER.encode(payload)}\n\n"
+
+
+async def coalesce(
+    events: AsyncIterator[Tuple[str, Any]],
+    flush_bytes: int = FLUSH_BYTES,
+    flush_interval: float = FLUSH_INTERVAL,
+    heartbeat_interval: float = HEARTBEAT_INTERVAL,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Batch (event, payload) pairs into frames, transport-agnostic
+
+    Consecutive `chunk` texts are joined until `flush_bytes` or
+    `flush_interval`; any other event flushes the batch and passes through.
+    An error raised by `events` becomes an ("error", message) pair. After
+    `heartbeat_interval` without output a ("heartbeat", None) pair is yielded.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for event in events:
+                await queue.put(event)
+        except Exception as e:
+            await queue.put(("error", str(e)))
+        finally:
+            await queue.put(_END)
+
+    producer = asyncio.create_task(pump())
+    buffer = []
+    buffered_bytes = 0
+    flush_at = None
+    last_write = time.monotonic()
+
+    try:
+        while True:
+            now = time.monotonic()
+            wake_at = flush_at if flush_at is not None else last_write + heartbeat_interval
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=max(0.0, wake_at - now))
+            except asyncio.TimeoutError:
+                if buffer:
+                    yield "chunk", "".join(buffer)
+                    buffer, buffered_bytes, flush_at = [], 0, None
+                else:
+                    yield "heartbeat", None
+                last_write = time.monotonic()
+                continue
+
+            if item is _END:
+                if buffer:
+                    yield "chunk", "".join(buffer)
+                break
+
+            event, payload = item
+            if event == "chunk":
+                buffer.append(payload)
+                buffered_bytes += len(payload.encode("utf-8"))
+                if flush_at is None:
+                    flush_at = time.monotonic() + flush_interval
+                if buffered_bytes < flush_bytes:
+                    continue
+                yield "chunk", "".join(buffer)
+                buffer, buffered_bytes, flush_at = [], 0, None
+            else:
+                if buffer:
+                    yield "chunk", "".join(buffer)
+                    buffer, buffered_bytes, flush_at = [], 0, None
+                yield event, payload
+            last_write = time.monotonic()
+    finally:
+        producer.cancel()
+
+
+class SSEWriter:
+    """
+    Turns a stream of (event, payload) pairs into SSE frames.
+
+    `chunk` events carry text and are coalesced; any other event (e.g.
+    `ticket`, `tool`) is written as `{event: payload}` right away.
+    """
+
+    def __init__(
+        self,
+        flush_bytes: int = FLUSH_BYTES,
+        flush_interval: float = FLUSH_INTERVAL,
+        heartbeat_interval: float = HEARTBEAT_INTERVAL,
+    ):
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.frames = 0
+
+    def _frame(self, payload: Any) -> str:
+        self.frames += 1
+        return sse_frame(payload)
+
+    async def stream(self, events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+        try:
+            async for event, payload in coalesce(events, self.flush_bytes, self.flush_interval,
+                                                 self.heartbeat_interval):
+                yield ": ping\n\n" if event == "heartbeat" else self._frame({event: payload})
+            yield "data: [DONE]\n\n"
+        finally:
+            METRICS.observe("sse_frames_per_response", self.frames)
@@ -0,0 +1,434 @@
+"""
+Shared state layer
+Pluggable key-value backend for state that must be shared between workers
+(tickets, sessions, caches, rate limits). Selected by STATE_BACKEND_URL:
+
+- memory://            in-process dicts (single worker, default)
+- redis://host:6379/0  any Redis-protocol server
+- fakeredis://         in-memory Redis stand-in (requires `fakeredis`), for local runs
+"""
+import bisect
+import copy
+import heapq
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+
+class WatchError(Exception):
+    """A watched key changed before the transaction was executed"""
+
+
+class Pipeline:
+    """
+    Buffers commands and sends them in one batch on execute().
+
+    With transaction=True the batch is applied atomically (MULTI/EXEC on
+    Redis, a single lock hold in memory). A pipeline from watch() runs
+    commands immediately until multi(), and execute() raises WatchError if
+    a watched key changed in the meantime.
+    """
+
+    def __init__(self, backend: "InMemoryState", watched: Optional[Dict[str, Any]] = None):
+        self._backend = backend
+        self._commands: List[Tuple[str, tuple, dict]] = []
+        # Watched key -> its value when watched; compared again on execute()
+        self._watched = watched
+        self._buffering = watched is None
+
+    def __getattr__(self, name: str):
+        if name.startswith("_") or not callable(getattr(self._backend, name, None)):
+            raise AttributeError(name)
+        if not self._buffering:
+            return getattr(self._backend, name)
+
+        def buffer(*args, **kwargs):
+            self._commands.append((name, args, kwargs))
+            return self
+
+        return buffer
+
+    def multi(self) -> None:
+        """Start buffering the commands of a watch() transaction"""
+        self._buffering = True
+
+    def execute(self) -> List[Any]:
+        try:
+            with self._backend._lock:
+                for key, value in (self._watched or {}).items():
+                    if self._backend._snapshot(key) != value:
+                        raise WatchError(key)
+                return [getattr(self._backend, name)(*args, **kwargs) for name, args, kwargs in self._commands]
+        finally:
+            self._commands = []
+
+    def __enter__(self) -> "Pipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._commands = []
+
+
+class _SortedSet:
+    """Members ordered by score; count-by-range in O(log n)"""
+
+    def __init__(self):
+        self.scores: Dict[str, float] = {}
+        self.entries: List[Tuple[float, str]] = []
+
+    def add(self, member: str, score: float) -> bool:
+        added = member not in self.scores
+        if not added:
+            self.remove(member)
+        self.scores[member] = score
+        bisect.insort(self.entries, (score, member))
+        return added
+
+    def remove(self, member: str) -> bool:
+        score = self.scores.pop(member, None)
+        if score is None:
+            return False
+        del self.entries[bisect.bisect_left(self.entries, (score, member))]
+        return True
+
+    def count(self, low: float, high: float) -> int:
+        return bisect.bisect_right(self.entries, (high, "\U0010ffff")) - bisect.bisect_left(self.entries, (low, ""))
+
+
+class InMemoryState:
+    """
+    Process-local implementation of the Redis command subset we use
+
+    Expired keys are dropped when read, and on every write with a TTL the
+    ones whose time has come are purged, so keys nobody reads again (replayed
+    responses, leases, rate-limit windows) do not pile up.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data: Dict[str, Any] = {}
+        self._expires: Dict[str, float] = {}
+        # (expires_at, key), earliest first; entries whose key got another TTL are skipped
+        self._expiry_heap: List[Tuple[float, str]] = []
+
+    def clear(self) -> None:
+        """Drop every key, like FLUSHDB"""
+        with self._lock:
+            self._data.clear()
+            self._expires.clear()
+            self._expiry_heap.clear()
+
+    def _set_expiry(self, key: str, ttl: float) -> None:
+        now = time.monotonic()
+        expires_at = self._expires[key] = now + ttl
+        heapq.heappush(self._expiry_heap, (expires_at, key))
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._expiry_heap)
+            if self._expires.get(key) == expires_at:
+                self._data.pop(key, None)
+                del self._expires[key]
+        # Keys whose TTL keeps being renewed leave stale entries behind; rebuild once they dominate
+        if len(self._expiry_heap) > 2 * len(self._expires) + 1024:
+            self._expiry_heap = [(expires_at, key) for key, expires_at in self._expires.items()]
+            heapq.heapify(self._expiry_heap)
+
+    def _alive(self, key: str) -> bool:
+        expires_at = self._expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._data.pop(key, None)
+            self._expires.pop(key, None)
+            return False
+        return key in self._data
+
+    def _snapshot(self, key: str) -> Any:
+        """Copy of a key's value, for watch() to compare against"""
+        return copy.deepcopy(self._data[key]) if self._alive(key) else None
+
+    def _container(self, key: str, factory):
+        if not self._alive(key):
+            self._data[key] = factory()
+        return self._data[key]
+
+    # Strings
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            return self._data.get(key) if self._alive(key) else None
+
+    def mget(self, keys: Iterable[str]) -> List[Optional[str]]:
+        with self._lock:
+            return [self.get(key) for key in keys]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        with self._lock:
+            if nx and self._alive(key):
+                return False
+            self._data[key] = value
+            if ttl:
+                self._set_expiry(key, ttl)
+            else:
+                self._expires.pop(key, None)
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            removed = 0
+            for key in keys:
+                if self._alive(key):
+                    removed += 1
+                self._data.pop(key, None)
+                self._expires.pop(key, None)
+            return removed
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        with self._lock:
+            value = int(self.get(key) or 0) + amount
+            self._data[key] = str(value)
+            return value
+
+    def expire(self, key: str, ttl: float) -> bool:
+        with self._lock:
+            if not self._alive(key):
+                return False
+            self._set_expiry(key, ttl)
+            return True
+
+    # Hashes
+    def hset(self, key: str, mapping: Dict[str, Any]) -> int:
+        with self._lock:
+            hash_ = self._container(key, dict)
+            added = len([f for f in mapping if f not in hash_])
+            hash_.update({f: str(v) for f, v in mapping.items()})
+            return added
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        with self._lock:
+            return self._data[key].get(field) if self._alive(key) else None
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._lock:
+            return dict(self._data[key]) if self._alive(key) else {}
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        with self._lock:
+            hash_ = self._container(key, dict)
+            value = int(hash_.get(field, 0)) + amount
+            hash_[field] = str(value)
+            return value
+
+    def hdel(self, key: str, *fields: str) -> int:
+        with self._lock:
+            if not self._alive(key):
+                return 0
+            return len([f for f in fields if self._data[key].pop(f, None) is not None])
+
+    # Sets
+    def sadd(self, key: str, *members: str) -> int:
+        with self._lock:
+            set_ = self._container(key, set)
+            added = len([m for m in members if m not in set_])
+            set_.update(members)
+            return added
+
+    def srem(self, key: str, *members: str) -> int:
+        with self._lock:
+            if not self._alive(key):
+                return 0
+            set_ = self._data[key]
+            removed = len([m for m in members if m in set_])
+            set_.difference_update(members)
+            return removed
+
+    def smembers(self, key: str) -> set:
+        with self._lock:
+            return set(self._data[key]) if self._alive(key) else set()
+
+    # Lists
+    def rpush(self, key: str, *values: str) -> int:
+        with self._lock:
+            list_ = self._container(key, list)
+            list_.extend(values)
+            return len(list_)
+
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        with self._lock:
+            if not self._alive(key):
+                return []
+            list_ = self._data[key]
+            end = len(list_) if end == -1 else end + 1
+            return list_[start:end]
+
+    def llen(self, key: str) -> int:
+        with self._lock:
+            return len(self._data[key]) if self._alive(key) else 0
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        with self._lock:
+            if self._alive(key):
+                list_ = self._data[key]
+                end = len(list_) if end == -1 else end + 1
+                self._data[key] = list_[start:end]
+            return True
+
+    # Sorted sets
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        with self._lock:
+            zset = self._container(key, _SortedSet)
+            return len([m for m, score in mapping.items() if zset.add(m, float(score))])
+
+    def zrem(self, key: str, *members: str) -> int:
+        with self._lock:
+            if not self._alive(key):
+                return 0
+            return len([m for m in members if self._data[key].remove(m)])
+
+    def zcount(self, key: str, low: float, high: float) -> int:
+        with self._lock:
+            return self._data[key].count(low, high) if self._alive(key) else 0
+
+    def zrange_withscores(self, key: str) -> List[Tuple[str, float]]:
+        """Every (member, score), lowest score first"""
+        with self._lock:
+            if not self._alive(key):
+                return []
+            return [(member, score) for score, member in self._data[key].entries]
+
+    def watch(self, *keys: str) -> Pipeline:
+        """Optimistic transaction (WATCH ... MULTI/EXEC) on `keys`, see Pipeline"""
+        with self._lock:
+            return Pipeline(self, {key: self._snapshot(key) for key in keys})
+
+    def pipeline(self, transaction: bool = False) -> Pipeline:
+        return Pipeline(self)
+
+
+class RedisState:
+    """Redis-protocol backend; method names and results mirror InMemoryState"""
+
+    def __init__(self, client: Any):
+        self._client = client
+
+    def get(self, key: str) -> Optional[str]:
+        return self._client.get(key)
+
+    def mget(self, keys: Iterable[str]) -> List[Optional[str]]:
+        keys = list(keys)
+        return self._client.mget(keys) if keys else []
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None, nx: bool = False) -> bool:
+        px = int(ttl * 1000) if ttl else None
+        return self._client.set(key, value, px=px, nx=nx)
+
+    def delete(self, *keys: str) -> int:
+        return self._client.delete(*keys)
+
+    def incr(self, key: str, amount: int = 1) -> int:
+        return self._client.incrby(key, amount)
+
+    def expire(self, key: str, ttl: float) -> bool:
+        return self._client.pexpire(key, int(ttl * 1000))
+
+    def hset(self, key: str, mapping: Dict[str, Any]) -> int:
+        return self._client.hset(key, mapping=mapping)
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        return self._client.hget(key, field)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        return self._client.hgetall(key)
+
+    def hincrby(self, key: str, field: str, amount: int = 1) -> int:
+        return self._client.hincrby(key, field, amount)
+
+    def hdel(self, key: str, *fields: str) -> int:
+        return self._client.hdel(key, *fields)
+
+    def sadd(self, key: str, *members: str) -> int:
+        return self._client.sadd(key, *members)
+
+    def srem(self, key: str, *members: str) -> int:
+        return self._client.srem(key, *members)
+
+    def smembers(self, key: str) -> set:
+        return self._client.smembers(key)
+
+    def rpush(self, key: str, *values: str) -> int:
+        return self._client.rpush(key, *values)
+
+    def lrange(self, key: str, start: int, end: int) -> List[str]:
+        return self._client.lrange(key, start, end)
+
+    def llen(self, key: str) -> int:
+        return self._client.llen(key)
+
+    def ltrim(self, key: str, start: int, end: int) -> bool:
+        return self._client.ltrim(key, start, end)
+
+    def zadd(self, key: str, mapping: Dict[str, float]) -> int:
+        return self._client.zadd(key, mapping)
+
+    def zrem(self, key: str, *members: str) -> int:
+        return self._client.zrem(key, *members)
+
+    def zcount(self, key: str, low: float, high: float) -> int:
+        return self._client.zcount(key, low, high)
+
+    def zrange_withscores(self, key: str) -> List[Tuple[str, float]]:
+        return self._client.zrange(key, 0, -1, withscores=True)
+
+    def watch(self, *keys: str) -> "RedisPipeline":
+        pipe = self._client.pipeline(transaction=True)
+        pipe.watch(*keys)
+        return RedisPipeline(pipe)
+
+    def pipeline(self, transaction: bool = False) -> "RedisPipeline":
+        return RedisPipeline(self._client.pipeline(transaction=transaction))
+
+
+class RedisPipeline(RedisState):
+    """RedisState over a redis-py pipeline: commands are buffered until execute()"""
+
+    def multi(self) -> None:
+        self._client.multi()
+
+    def execute(self) -> List[Any]:
+        from redis.exceptions import WatchError as RedisWatchError
+
+        try:
+            return self._client.execute()
+        except RedisWatchError as e:
+            raise WatchError(str(e)) from e
+
+    def __enter__(self) -> "RedisPipeline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._client.reset()
+
+
+def create_state(url: str) -> Any:
+    if url.startswith("memory://"):
+        return InMemoryState()
+    if url.startswith("fakeredis://"):
+        import fakeredis
+
+        return RedisState(fakeredis.FakeRedis(decode_responses=True))
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        import redis
+
+        return RedisState(redis.Redis.from_url(url, decode_responses=True))
+    raise ValueError(f"Unsupported STATE_BACKEND_URL: {url}")
+
+
+_state = None
+_state_lock = threading.Lock()
+
+
+def get_state() -> Any:
+    """Process-wide state backend configured by STATE_BACKEND_URL"""
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = create_state(os.getenv("STATE_BACKEND_URL", "memory://"))
+    return _state
@@ -0,0 +1,184 @@
+"""
+Near-duplicate detection for open tickets
+Each open ticket keeps a bottom-k MinHash sketch of its free-text part,
+grouped by (student, ticket type) on the shared state backend. A new request
+is compared only against the student's open tickets of the same type, so a
+check costs one HGETALL and a few set operations regardless of the total
+number of open tickets.
+
+python -m src.services.ticket_dedup --bench
+    lookup latency against 100k open tickets of 20k students
+"""
+import heapq
+import os
+import re
+import time
+import uuid
+import zlib
+from contextlib import contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+
+from src.schemas.tickets import Ticket
+from src.services.state import WatchError, get_state
+
+_NON_WORD = re.compile(r"[^\w]+", re.UNICODE)
+
+DEFAULT_THRESHOLD = float(os.getenv("TICKET_DEDUP_THRESHOLD", "0.7"))
+SKETCH_SIZE = int(os.getenv("TICKET_DEDUP_SKETCH_SIZE", "64"))
+SHINGLE_SIZE = 3
+# A lock holder that died is forgotten after this long
+LOCK_SECONDS = float(os.getenv("TICKET_DEDUP_LOCK_SECONDS", "5"))
+
+
+class LockTimeout(TimeoutError):
+    """The duplicate-check lock was not acquired within the allowed wait"""
+
+
+def normalize(text: str) -> str:
+    return _NON_WORD.sub(" ", text.lower()).strip()
+
+
+def sketch(text: str, k: int = SKETCH_SIZE) -> List[int]:
+    """k smallest CRC32 hashes of the character shingles of `text`"""
+    text = normalize(text)
+    if len(text) <= SHINGLE_SIZE:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    hashes = {zlib.crc32(s.encode("utf-8")) for s in shingles}
+    return sorted(heapq.nsmallest(k, hashes))
+
+
+def similarity(a: List[int], b: List[int], k: int = SKETCH_SIZE) -> float:
+    """Bottom-k estimate of the Jaccard similarity of two shingle sets"""
+    if not a or not b:
+        return 0.0
+    set_a, set_b = set(a), set(b)
+    union_k = heapq.nsmallest(k, set_a | set_b)
+    both = sum(1 for h in union_k if h in set_a and h in set_b)
+    return both / len(union_k)
+
+
+class DuplicateIndex:
+    def __init__(self, state: Any = None, threshold: float = DEFAULT_THRESHOLD):
+        self._state = state
+        self.threshold = threshold
+
+    @property
+    def state(self) -> Any:
+        return self._state if self._state is not None else get_state()
+
+    def _key(self, owner: str, ticket_type: str) -> str:
+        return f"tickets:open_sketches:{owner}:{ticket_type}"
+
+    @contextmanager
+    def locked(self, owner: str, ticket_type: str, wait: float = LOCK_SECONDS) -> Iterator[None]:
+        """
+        Cluster-wide lock (SET NX with a TTL) on one owner's tickets of a type
+
+        Held around find-then-save, so two workers handling the same request
+        at once create one ticket and merge the other into it. Raises
+        LockTimeout after `wait` seconds without the lock.
+        """
+        key = f"{self._key(owner, ticket_type)}:lock"
+        token = uuid.uuid4().hex
+        give_up_at = time.monotonic() + wait
+        while not self.state.set(key, token, ttl=LOCK_SECONDS, nx=True):
+            if time.monotonic() >= give_up_at:
+                raise LockTimeout(f"Duplicate check for {owner}/{ticket_type} is busy")
+            time.sleep(0.01)
+        try:
+            yield
+        finally:
+            self._release(key, token)
+
+    def _release(self, key: str, token: str) -> None:
+        """Delete the lock only while it still holds our token (compare-and-delete)"""
+        with self.state.watch(key) as tx:
+            if tx.get(key) != token:
+                # Our lease ran out and the lock belongs to the next holder
+                return
+            tx.multi()
+            tx.delete(key)
+            try:
+                tx.execute()
+            except WatchError:
+                pass
+
+    def find(self, owner: str, ticket_type: str, text: str) -> Optional[Tuple[str, float]]:
+        """Most similar open ticket of the same owner and type above the threshold"""
+        candidates = self.state.hgetall(self._key(owner, ticket_type))
+        if not candidates:
+            return None
+        probe = sketch(text)
+        best: Optional[Tuple[str, float]] = None
+        for ticket_id, encoded in candidates.items():
+            score = similarity(probe, [int(h) for h in encoded.split(",") if h])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (ticket_id, score)
+        return best
+
+    def add(self, owner: str, ticket: Ticket, text: str) -> None:
+        encoded = ",".join(str(h) for h in sketch(text))
+        self.state.hset(self._key(owner, ticket.type), {ticket.ticket_id: encoded})
+
+    def discard(self, owner: str, ticket: Ticket) -> None:
+        self.state.hdel(self._key(owner, ticket.type), ticket.ticket_id)
+
+
+DUPLICATES = DuplicateIndex()
+
+
+if __name__ == "__main__":
+    # Benchmark: duplicate lookups against 100k open tickets on the in-memory backend
+    import json
+    import random
+    import statistics
+    import sys
+
+    from src.services.state import InMemoryState
+
+    if "--bench" not in sys.argv:
+        sys.exit("usage: python -m src.services.ticket_dedup --bench")
+
+    rng = random.Random(42)
+    words = ["курс", "оплата", "возврат", "группа", "преподаватель", "урок", "перенос", "заморозка",
+             "переезд", "болезнь", "работа", "расписание", "сертификат", "доступ", "платформа", "вечер"]
+    types = ["refund", "freeze", "technical", "change_group_or_teacher", "complaint"]
+    students = 20000
+
+    def request() -> str:
+        return " ".join(rng.choice(words) for _ in range(rng.randint(6, 16)))
+
+    index = DuplicateIndex(InMemoryState())
+    started = time.perf_counter()
+    texts = {}
+    for n in range(100000):
+        owner, ticket_type, text = f"s{rng.randrange(students)}", rng.choice(types), request()
+        ticket = Ticket(ticket_id=f"T-{n}", type=ticket_type, status="open", priority="medium",
+                        description=text, student_id=owner, created_at="2026-01-01T00:00:00",
+                        estimated_response="24 часа")
+        index.add(owner, ticket, text)
+        texts[(owner, ticket_type)] = text
+    build_s = time.perf_counter() - started
+
+    repeats = list(texts.items())
+    timings, merged = [], 0
+    for i in range(5000):
+        (owner, ticket_type), text = rng.choice(repeats)
+        # Half repeat an open request, half are new requests
+        probe = text if i % 2 == 0 else request()
+        t = time.perf_counter()
+        found = index.find(owner, ticket_type, probe)
+        timings.append((time.perf_counter() - t) * 1e6)
+        merged += found is not None
+
+    timings.sort()
+    print(json.dumps({
+        "open_tickets": 100000,
+        "students": students,
+        "build_s": round(build_s, 2),
+        "find_p50_us": round(statistics.median(timings), 1),
+        "find_p99_us": round(timings[int(len(timings) * 0.99)], 1),
+        "merged_share": round(merged / len(timings), 3),
+    }, indent=2))
@@ -0,0 +1,121 @@
+"""
+Ticket change feed
+Every ticket insert, update and status change appends an event to its
+owner's feed (a capped list on the shared state backend) inside the same
+MULTI/EXEC pipeline as the ticket write, together with an increment of the
+owner's event counter. An event's sequence number is its position in the
+owner's feed (1, 2, 3, ...), derived at read time from the counter and the
+list length, so events are numbered in the order they were committed and
+clients use the number as a resume cursor. Waiters in this process are woken
+immediately; changes made by other workers are picked up by polling the
+state backend every FEED_POLL_SECONDS.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from src.schemas.tickets import Ticket
+
+MAX_EVENTS = int(os.getenv("TICKET_FEED_MAX_EVENTS", "200"))
+POLL_SECONDS = float(os.getenv("TICKET_FEED_POLL_SECONDS", "2"))
+
+
+def feed_key(owner: str) -> str:
+    return f"tickets:feed:{owner}"
+
+
+def count_key(owner: str) -> str:
+    # Events ever appended to the owner's feed, trimmed ones included
+    return f"tickets:feed_count:{owner}"
+
+
+def append(pipe: Any, owner: str, event_type: str, ticket: Ticket) -> None:
+    """Queue a "created" / "updated" / "status" event for `owner` on the ticket write pipeline"""
+    event = {
+        "type": event_type,
+        "ticket_id": ticket.ticket_id,
+        "status": ticket.status,
+        "at": datetime.now().isoformat(),
+        "ticket": ticket.payload(),
+    }
+    key = feed_key(owner)
+    pipe.rpush(key, json.dumps(event, ensure_ascii=False))
+    pipe.ltrim(key, -MAX_EVENTS, -1)
+    pipe.incr(count_key(owner))
+
+
+def read(state: Any, owner: str, cursor: int = 0) -> Dict[str, Any]:
+    """
+    Events after `cursor`, oldest first
+
+    `reset` is true when events past the cursor were trimmed from the feed,
+    or the cursor is ahead of the feed (state was wiped); the client should
+    then reload the full ticket list.
+    """
+    with state.pipeline(transaction=True) as pipe:
+        pipe.get(count_key(owner))
+        pipe.lrange(feed_key(owner), 0, -1)
+        count, raws = pipe.execute()
+    count = max(int(count or 0), len(raws))
+    # Position of the oldest event still in the list
+    first = count - len(raws) + 1
+    if cursor > count:
+        return {"events": [], "cursor": count, "reset": True}
+    start = max(cursor + 1 - first, 0)
+    events = []
+    for offset, raw in enumerate(raws[start:], start=first + start):
+        events.append(dict(json.loads(raw), seq=offset))
+    reset = bool(cursor) and cursor + 1 < first
+    return {"events": events, "cursor": count, "reset": reset}
+
+
+def latest_seq(state: Any, owner: str) -> int:
+    """Position of the owner's newest event (0 if none); changes on every ticket write"""
+    return int(state.get(count_key(owner)) or 0)
+
+
+class FeedNotifier:
+    """Wakes asyncio waiters of an owner when this process writes to their feed"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def notify(self, owner: str) -> None:
+        # Called from worker threads (agent turns), so hop onto each waiter's loop
+        with self._lock:
+            waiters = list(self._waiters.get(owner, ()))
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+
+    async def wait(self, state: Any, owner: str, cursor: int, timeout: float) -> Dict[str, Any]:
+        """Events after `cursor`, waiting up to `timeout` seconds for the first one"""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(owner, set()).add(waiter)
+        try:
+            stop_at = time.monotonic() + timeout
+            while True:
+                waiter[1].clear()
+                page = read(state, owner, cursor)
+                remaining = stop_at - time.monotonic()
+                if page["events"] or page["reset"] or remaining <= 0:
+                    return page
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), timeout=min(remaining, POLL_SECONDS))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(owner)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[owner]
+
+
+NOTIFIER = FeedNotifier()
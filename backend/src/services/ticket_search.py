@@ -0,0 +1,229 @@
+"""
+Full-text ticket search for staff
+SQLite FTS5 index over ticket description, category and assignee. Text is
+run through the Russian stemmer before indexing and querying, so "возврат"
+finds "возврата"/"возвратом". Filter columns live in a side table joined by
+rowid; results page with opaque cursors.
+
+The index is updated incrementally when tickets are created or changed
+(see src/agents/ticketing.py) and can be rebuilt from the ticket store.
+All workers share one index file; writers take SQLite's write lock up front
+and wait up to TICKET_SEARCH_BUSY_TIMEOUT_MS for each other.
+"""
+import base64
+import json
+from datetime import date, timedelta
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.schemas.tickets import Ticket
+from src.services.russian_stemmer import stem_tokens
+
+SEARCH_DB_PATH = os.getenv("TICKET_SEARCH_DB", "ticket_search.db")
+# How long a worker waits for another one holding the write lock of the shared file
+SEARCH_BUSY_TIMEOUT_MS = int(os.getenv("TICKET_SEARCH_BUSY_TIMEOUT_MS", "10000"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ticket_meta (
+    rowid INTEGER PRIMARY KEY,
+    ticket_id TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ticket_meta_created ON ticket_meta (created_at, rowid);
+CREATE VIRTUAL TABLE IF NOT EXISTS ticket_fts USING fts5(
+    description, category, assigned_to,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+def _stemmed(text: Optional[str]) -> str:
+    return " ".join(stem_tokens(text or ""))
+
+
+def _encode_cursor(values: Tuple) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor: str, key_type: Any) -> Tuple:
+    """(sort key, rowid) from a cursor made by _encode_cursor; ValueError for anything else"""
+    try:
+        values = tuple(json.loads(base64.urlsafe_b64decode(cursor.encode())))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if (len(values) != 2 or not isinstance(values[0], key_type) or isinstance(values[0], bool)
+            or not isinstance(values[1], int) or isinstance(values[1], bool)):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _date_to_bound(date_to: str) -> Tuple[str, str]:
+    """(operator, value) for an upper date bound; a bare date includes that whole day"""
+    if len(date_to) == 10:
+        try:
+            return "<", (date.fromisoformat(date_to) + timedelta(days=1)).isoformat()
+        except ValueError:
+            raise ValueError("date_to must be YYYY-MM-DD or an ISO timestamp")
+    return "<=", date_to
+
+
+class TicketSearchIndex:
+    def __init__(self, path: str = SEARCH_DB_PATH):
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            # Every worker opens the same file: wait for the others' locks instead
+            # of failing, starting with the journal mode switch and schema setup
+            self._conn.execute(f"PRAGMA busy_timeout={SEARCH_BUSY_TIMEOUT_MS}")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in _SCHEMA.split(";"):
+                    if statement.strip():
+                        self._conn.execute(statement)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def index(self, ticket: Ticket) -> None:
+        """Insert or refresh one ticket (one short transaction)"""
+        self.index_many([ticket])
+
+    def index_many(self, tickets: Iterable[Ticket]) -> int:
+        """Insert or refresh tickets in a single transaction; used for bulk rebuilds"""
+        count = 0
+        with self._lock:
+            conn = self._conn
+            # Take the write lock up front: workers sharing the file then wait
+            # on each other instead of failing to upgrade a read transaction
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for ticket in tickets:
+                    self._upsert(conn, ticket)
+                    count += 1
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def _upsert(self, conn: sqlite3.Connection, ticket: Ticket) -> None:
+        text = ticket.description + " " + " ".join(u.get("description", "") for u in ticket.updates or [])
+        row = conn.execute("SELECT rowid FROM ticket_meta WHERE ticket_id = ?", (ticket.ticket_id,)).fetchone()
+        if row:
+            rowid = row[0]
+            conn.execute(
+                "UPDATE ticket_meta SET status = ?, priority = ? WHERE rowid = ?",
+                (ticket.status, ticket.priority, rowid),
+            )
+            conn.execute("DELETE FROM ticket_fts WHERE rowid = ?", (rowid,))
+        else:
+            rowid = conn.execute(
+                "INSERT INTO ticket_meta (ticket_id, status, priority, created_at) VALUES (?, ?, ?, ?)",
+                (ticket.ticket_id, ticket.status, ticket.priority, ticket.created_at),
+            ).lastrowid
+        conn.execute(
+            "INSERT INTO ticket_fts (rowid, description, category, assigned_to) VALUES (?, ?, ?, ?)",
+            (rowid, _stemmed(text), _stemmed(ticket.category), _stemmed(ticket.assigned_to)),
+        )
+
+    def search(
+        self,
+        query: str,
+        status: Optional[str] = None,
+        priority: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        sort: str = "relevance",
+        cursor: Optional[str] = None,
+        limit: int = 20,
+    ) -> Dict[str, Any]:
+        """
+        Returns {"ticket_ids": [...], "next_cursor": str | None}
+
+        Query terms are AND-ed stem prefixes. `sort` is "relevance" (bm25)
+        or "recent" (created_at, newest first).
+        """
+        terms = stem_tokens(query)
+        if not terms:
+            return {"ticket_ids": [], "next_cursor": None}
+        match = " AND ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+
+        where = ["ticket_fts MATCH ?"]
+        params: List[Any] = [match]
+        for column, value in (("status", status), ("priority", priority)):
+            if value:
+                where.append(f"m.{column} = ?")
+                params.append(value)
+        if date_from:
+            where.append("m.created_at >= ?")
+            params.append(date_from)
+        if date_to:
+            operator, bound = _date_to_bound(date_to)
+            where.append(f"m.created_at {operator} ?")
+            params.append(bound)
+
+        if sort == "recent":
+            order = "m.created_at DESC, m.rowid DESC"
+            if cursor:
+                created_at, rowid = _decode_cursor(cursor, str)
+                where.append("(m.created_at, m.rowid) < (?, ?)")
+                params.extend([created_at, rowid])
+            sql = (
+                "SELECT m.ticket_id, m.created_at, m.rowid FROM ticket_fts "
+                "JOIN ticket_meta m ON m.rowid = ticket_fts.rowid "
+                f"WHERE {' AND '.join(where)} ORDER BY {order} LIMIT ?"
+            )
+        else:
+            outer = ""
+            outer_params: List[Any] = []
+            if cursor:
+                score, rowid = _decode_cursor(cursor, (int, float))
+                outer = "WHERE (score, rowid) > (?, ?)"
+                outer_params = [score, rowid]
+            sql = (
+                "SELECT ticket_id, score, rowid FROM ("
+                "SELECT m.ticket_id, bm25(ticket_fts) AS score, m.rowid AS rowid FROM ticket_fts "
+                "JOIN ticket_meta m ON m.rowid = ticket_fts.rowid "
+                f"WHERE {' AND '.join(where)}) {outer} ORDER BY score, rowid LIMIT ?"
+            )
+            params.extend(outer_params)
+
+        params.append(limit + 1)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+
+        next_cursor = _encode_cursor(rows[limit - 1][1:]) if len(rows) > limit else None
+        return {"ticket_ids": [row[0] for row in rows[:limit]], "next_cursor": next_cursor}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.executescript("DELETE FROM ticket_meta; DELETE FROM ticket_fts;")
+
+
+_search: Optional[TicketSearchIndex] = None
+_search_lock = threading.Lock()
+
+
+def get_search_index() -> TicketSearchIndex:
+    global _search
+    if _search is None:
+        with _search_lock:
+            if _search is None:
+                _search = TicketSearchIndex()
+    return _search
+
+
+if __name__ == "__main__":
+    # python -m src.services.ticket_search  -- rebuild the index from the ticket store
+    from src.services.ticket_store import TICKETS
+
+    index = get_search_index()
+    index.clear()
+    print(f"Indexed {index.index_many(TICKETS.iter_all())} tickets")
@@ -0,0 +1,167 @@
+"""
+Materialized dashboard aggregates for tickets
+Counters live in one hash on the shared state backend and are updated inside
+the same MULTI/EXEC pipeline as the ticket write (see TicketStore), so the
+dashboard reads a handful of counters instead of grouping over all tickets.
+SLA breaches are tracked as a sorted set of response deadlines of active
+tickets and counted with ZCOUNT at read time.
+
+python -m src.services.ticket_stats          # check counters and SLA deadlines for drift
+python -m src.services.ticket_stats --fix    # recompute them from the ticket store
+"""
+import re
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from src.schemas.tickets import Ticket
+
+STATS_KEY = "tickets:stats"
+SLA_KEY = "tickets:sla_due"
+ACTIVE_STATUSES = {"open", "in_progress"}
+
+_NUMBER = re.compile(r"\d+")
+
+
+def response_window(estimated_response: str) -> timedelta:
+    """Parse tool SLA strings like "4 часа", "48 часов", "1-2 рабочих дня" (upper bound)"""
+    numbers = [int(n) for n in _NUMBER.findall(estimated_response or "")]
+    amount = max(numbers) if numbers else 24
+    if "дн" in estimated_response or "день" in estimated_response:
+        return timedelta(days=amount)
+    return timedelta(hours=amount)
+
+
+def sla_due(ticket: Ticket) -> float:
+    created = datetime.fromisoformat(ticket.created_at)
+    return (created + response_window(ticket.estimated_response)).timestamp()
+
+
+def counter_fields(ticket: Ticket) -> List[str]:
+    """Hash fields a ticket contributes to"""
+    fields = ["total", f"status:{ticket.status}"]
+    if ticket.status in ACTIVE_STATUSES:
+        fields += [
+            "open",
+            f"open:type:{ticket.type}",
+            f"open:category:{ticket.category or 'Без категории'}",
+            f"open:priority:{ticket.priority}",
+            f"open:assignee:{ticket.assigned_to or 'Не назначен'}",
+        ]
+    return fields
+
+
+def apply(pipe: Any, ticket: Ticket, delta: int) -> None:
+    """Queue counter and SLA updates for adding (+1) or removing (-1) a ticket version"""
+    for field in counter_fields(ticket):
+        pipe.hincrby(STATS_KEY, field, delta)
+    if delta > 0 and ticket.status in ACTIVE_STATUSES:
+        pipe.zadd(SLA_KEY, {ticket.ticket_id: sla_due(ticket)})
+    elif delta < 0:
+        pipe.zrem(SLA_KEY, ticket.ticket_id)
+    pipe.hincrby(STATS_KEY, "version", 1)
+
+
+_SECTIONS = [
+    ("open:category:", "open_by_category"),
+    ("open:assignee:", "open_by_assignee"),
+    ("open:priority:", "open_by_priority"),
+    ("open:type:", "open_by_type"),
+    ("status:", "by_status"),
+]
+
+
+def _split_field(field: str) -> Tuple[Optional[str], str]:
+    """(dashboard section, name) of a counter field; names may contain ":" themselves"""
+    for prefix, section in _SECTIONS:
+        if field.startswith(prefix):
+            return section, field[len(prefix):]
+    return None, field
+
+
+def read(state: Any) -> Dict[str, Any]:
+    """Current aggregates, shaped for the dashboard"""
+    with state.pipeline() as pipe:
+        pipe.hgetall(STATS_KEY)
+        pipe.zcount(SLA_KEY, float("-inf"), datetime.now().timestamp())
+        counters, breached = pipe.execute()
+
+    stats: Dict[str, Any] = {
+        "version": int(counters.pop("version", 0)),
+        "total": int(counters.pop("total", 0)),
+        "open": int(counters.pop("open", 0)),
+        "sla_breached": int(breached),
+        "by_status": {},
+        "open_by_type": {},
+        "open_by_category": {},
+        "open_by_priority": {},
+        "open_by_assignee": {},
+    }
+    for field, value in counters.items():
+        section, name = _split_field(field)
+        if section is not None and int(value):
+            stats[section][name] = int(value)
+    return stats
+
+
+def recompute(tickets: Iterable[Ticket]) -> Dict[str, int]:
+    counters: Dict[str, int] = {}
+    for ticket in tickets:
+        for field in counter_fields(ticket):
+            counters[field] = counters.get(field, 0) + 1
+    return counters
+
+
+def check_drift(state: Any, tickets: Iterable[Ticket]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fields whose stored value differs from a full recomputation
+
+    SLA deadlines are checked too: an active ticket missing from the sorted
+    set, a closed one still in it, or a wrong deadline shows up as
+    "sla:<ticket_id>" with the stored and expected due timestamps.
+    """
+    tickets = list(tickets)
+    expected = recompute(tickets)
+    stored = {k: int(v) for k, v in state.hgetall(STATS_KEY).items() if k != "version"}
+    drift: Dict[str, Dict[str, Any]] = {
+        field: {"stored": stored.get(field, 0), "expected": expected.get(field, 0)}
+        for field in set(expected) | set(stored)
+        if stored.get(field, 0) != expected.get(field, 0)
+    }
+
+    expected_due = {t.ticket_id: sla_due(t) for t in tickets if t.status in ACTIVE_STATUSES}
+    stored_due = {member: float(score) for member, score in state.zrange_withscores(SLA_KEY)}
+    for ticket_id in set(expected_due) | set(stored_due):
+        due, should_be = stored_due.get(ticket_id), expected_due.get(ticket_id)
+        if due is None or should_be is None or abs(due - should_be) > 1e-3:
+            drift[f"sla:{ticket_id}"] = {"stored": due, "expected": should_be}
+    return drift
+
+
+def rebuild(state: Any, tickets: Iterable[Ticket]) -> Dict[str, int]:
+    """Replace counters and SLA deadlines with values recomputed from scratch"""
+    tickets = list(tickets)
+    counters = recompute(tickets)
+    version = int(state.hget(STATS_KEY, "version") or 0) + 1
+    due = {t.ticket_id: sla_due(t) for t in tickets if t.status in ACTIVE_STATUSES}
+    with state.pipeline(transaction=True) as pipe:
+        pipe.delete(STATS_KEY, SLA_KEY)
+        pipe.hset(STATS_KEY, dict(counters, version=version))
+        if due:
+            pipe.zadd(SLA_KEY, due)
+        pipe.execute()
+    return counters
+
+
+if __name__ == "__main__":
+    from src.services.ticket_store import TICKETS
+
+    drift = check_drift(TICKETS.state, TICKETS.iter_all())
+    for field, values in sorted(drift.items()):
+        print(f"{field}: stored={values['stored']} expected={values['expected']}")
+    if "--fix" in sys.argv:
+        rebuild(TICKETS.state, TICKETS.iter_all())
+        print("Counters rebuilt")
+    elif not drift:
+        print("No drift")
+    sys.exit(1 if drift and "--fix" not in sys.argv else 0)
@@ -0,0 +1,151 @@
+"""
+Ticket persistence on the shared state backend
+Tickets are stored as JSON documents so every worker sees the same data
+"""
+from datetime import datetime
+from typing import Any, Iterator, List, Optional
+
+from src.schemas.tickets import Ticket
+from src.services import ticket_feed, ticket_stats
+from src.services.state import WatchError, get_state
+
+# Ticket IDs in order of every create / update / status change; analytics exports read it incrementally
+CHANGES_KEY = "tickets:changes"
+# Entries trimmed off the head of CHANGES_KEY; positions in the change log are absolute
+CHANGES_BASE_KEY = "tickets:changes_base"
+_DONE_STATUSES = ("resolved", "closed")
+
+
+class TicketStore:
+    def __init__(self, state: Any = None):
+        self._state = state
+
+    @property
+    def state(self) -> Any:
+        # Resolved lazily so tools can import the store before config is loaded
+        return self._state if self._state is not None else get_state()
+
+    def next_id(self, prefix: str) -> str:
+        """Cluster-wide unique ticket ID, e.g. REFUND-0042"""
+        return f"{prefix}-{self.state.incr(f'ticket:seq:{prefix}'):04d}"
+
+    def owner_of(self, ticket: Ticket) -> str:
+        return str(ticket.student_id or ticket.staff_id or "unknown")
+
+    def save(self, ticket: Ticket) -> Ticket:
+        ticket_id = ticket.ticket_id
+        with self.state.pipeline(transaction=True) as pipe:
+            pipe.set(f"ticket:{ticket_id}", ticket.json(exclude_none=True, ensure_ascii=False))
+            pipe.sadd(f"tickets:owner:{self.owner_of(ticket)}", ticket_id)
+            pipe.rpush("tickets:all", ticket_id)
+            pipe.rpush(CHANGES_KEY, ticket_id)
+            ticket_stats.apply(pipe, ticket, +1)
+            ticket_feed.append(pipe, self.owner_of(ticket), "created", ticket)
+            pipe.execute()
+        ticket_feed.NOTIFIER.notify(self.owner_of(ticket))
+        return ticket
+
+    def update(self, ticket: Ticket) -> Ticket:
+        """Overwrite an existing ticket document"""
+        with self.state.pipeline(transaction=True) as pipe:
+            pipe.set(f"ticket:{ticket.ticket_id}", ticket.json(exclude_none=True, ensure_ascii=False))
+            pipe.rpush(CHANGES_KEY, ticket.ticket_id)
+            ticket_feed.append(pipe, self.owner_of(ticket), "updated", ticket)
+            pipe.execute()
+        ticket_feed.NOTIFIER.notify(self.owner_of(ticket))
+        return ticket
+
+    def set_status(self, ticket_id: str, status: str) -> Optional[Ticket]:
+        """
+        Change a ticket's status together with the dashboard counters
+
+        The read and the write run as one optimistic transaction on the
+        ticket key; if another worker changes the ticket in between, it is
+        retried on the new version, so counter deltas are never applied twice.
+        """
+        key = f"ticket:{ticket_id}"
+        while True:
+            with self.state.watch(key) as tx:
+                raw = tx.get(key)
+                if raw is None:
+                    return None
+                current = Ticket.parse_raw(raw)
+                if current.status == status:
+                    return current
+                # resolved_at gives the ticket's turnaround; reopening clears it
+                resolved_at = getattr(current, "resolved_at", None) or datetime.now().isoformat()
+                updated = current.copy(update={"status": status,
+                                               "resolved_at": resolved_at if status in _DONE_STATUSES else None})
+                tx.multi()
+                tx.set(key, updated.json(exclude_none=True, ensure_ascii=False))
+                tx.rpush(CHANGES_KEY, ticket_id)
+                ticket_stats.apply(tx, current, -1)
+                ticket_stats.apply(tx, updated, +1)
+                ticket_feed.append(tx, self.owner_of(updated), "status", updated)
+                try:
+                    tx.execute()
+                except WatchError:
+                    continue
+            ticket_feed.NOTIFIER.notify(self.owner_of(updated))
+            return updated
+
+    def get(self, ticket_id: str) -> Optional[Ticket]:
+        raw = self.state.get(f"ticket:{ticket_id}")
+        return Ticket.parse_raw(raw) if raw else None
+
+    def get_many(self, ticket_ids: List[str]) -> List[Ticket]:
+        raws = self.state.mget([f"ticket:{ticket_id}" for ticket_id in ticket_ids])
+        return [Ticket.parse_raw(raw) for raw in raws if raw]
+
+    def iter_all(self, batch_size: int = 500) -> Iterator[Ticket]:
+        """All tickets in creation order, fetched in batches (one LRANGE + MGET each)"""
+        start = 0
+        while True:
+            ticket_ids = self.state.lrange("tickets:all", start, start + batch_size - 1)
+            if not ticket_ids:
+                return
+            yield from self.get_many(ticket_ids)
+            start += batch_size
+
+    def changes(self, position: int, count: int) -> Optional[List[str]]:
+        """
+        Up to `count` changed ticket IDs from change-log position `position` on
+
+        None when entries at that position were already trimmed away.
+        """
+        # The base only moves in trim_changes(), run by the same exporter between reads
+        base = int(self.state.get(CHANGES_BASE_KEY) or 0)
+        if position < base:
+            return None
+        return self.state.lrange(CHANGES_KEY, position - base, position - base + count - 1)
+
+    def changes_end(self) -> int:
+        """Change-log position just past the newest entry"""
+        with self.state.pipeline(transaction=True) as pipe:
+            pipe.get(CHANGES_BASE_KEY)
+            pipe.llen(CHANGES_KEY)
+            base, length = pipe.execute()
+        return int(base or 0) + length
+
+    def trim_changes(self, position: int) -> int:
+        """
+        Drop change-log entries before `position` (an export watermark); returns how many
+
+        Only one exporter may trim: entries past its watermark are kept, entries
+        another consumer has not read yet are not.
+        """
+        drop = position - int(self.state.get(CHANGES_BASE_KEY) or 0)
+        if drop <= 0:
+            return 0
+        with self.state.pipeline(transaction=True) as pipe:
+            pipe.ltrim(CHANGES_KEY, drop, -1)
+            pipe.incr(CHANGES_BASE_KEY, drop)
+            pipe.execute()
+        return drop
+
+    def list_for_student(self, student_id: str) -> List[Ticket]:
+        tickets = self.get_many(list(self.state.smembers(f"tickets:owner:{student_id}")))
+        return sorted(tickets, key=lambda t: t.created_at, reverse=True)
+
+
+TICKETS = TicketStore()
@@ -0,0 +1,194 @@
+"""
+LLM token accounting and daily budgets
+Token usage (prompt, completion, cached) from every LLM response is added to
+an in-process accumulator keyed by day, student and category, and flushed
+periodically to the shared state backend with HINCRBY, so counts from all
+workers add up. Budgets are checked against flushed plus pending usage.
+"""
+import atexit
+import logging
+import os
+import threading
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+
+from src.services.metrics import METRICS
+from src.services.state import get_state
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = float(os.getenv("TOKEN_USAGE_FLUSH_SECONDS", "10"))
+RETENTION_DAYS = int(os.getenv("TOKEN_USAGE_RETENTION_DAYS", "35"))
+# Prompt + completion tokens per student per day; 0 disables the budget
+DAILY_TOKEN_BUDGET = int(os.getenv("STUDENT_DAILY_TOKEN_BUDGET", "0"))
+
+USAGE_FIELDS = ("prompt", "completion", "cached", "calls")
+
+
+def _today() -> str:
+    return date.today().isoformat()
+
+
+def _student_key(day: str, student_id: str) -> str:
+    return f"usage:{day}:student:{student_id}"
+
+
+def _category_key(day: str, category: str) -> str:
+    return f"usage:{day}:category:{category}"
+
+
+def extract_usage(llm_result: Any) -> Counter:
+    """
+    Token counts of one LangChain LLMResult
+
+    Chat models report usage_metadata on the generated message; older
+    integrations put it into llm_output instead.
+    """
+    usage = Counter()
+    for generations in getattr(llm_result, "generations", None) or []:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if not metadata:
+                continue
+            usage["prompt"] += metadata.get("input_tokens", 0)
+            usage["completion"] += metadata.get("output_tokens", 0)
+            usage["cached"] += (metadata.get("input_token_details") or {}).get("cache_read", 0)
+    if not usage:
+        llm_output = getattr(llm_result, "llm_output", None) or {}
+        metadata = llm_output.get("usage_metadata") or llm_output.get("token_usage") or {}
+        usage["prompt"] += metadata.get("prompt_token_count", metadata.get("prompt_tokens", 0))
+        usage["completion"] += metadata.get("candidates_token_count", metadata.get("completion_tokens", 0))
+        usage["cached"] += metadata.get("cached_content_token_count", 0)
+    usage["calls"] += 1
+    return +usage
+
+
+class TokenUsageAccumulator:
+    def __init__(self, state: Any = None, flush_interval: float = FLUSH_INTERVAL):
+        self._state = state
+        self._flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, str], Counter] = {}
+        self._flusher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def state(self) -> Any:
+        if self._state is None:
+            self._state = get_state()
+        return self._state
+
+    def record(self, student_id: str, category: str, usage: Counter, day: Optional[str] = None) -> None:
+        if not usage:
+            return
+        key = (day or _today(), student_id, category)
+        with self._lock:
+            self._pending.setdefault(key, Counter()).update(usage)
+        for field in ("prompt", "completion", "cached"):
+            if usage.get(field):
+                METRICS.increment("llm_tokens_total", usage[field], kind=field)
+        self._ensure_flusher()
+
+    def flush(self) -> int:
+        """Write pending deltas to the state backend; returns the number of keys flushed"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        ttl = RETENTION_DAYS * 86400
+        try:
+            with self.state.pipeline() as pipe:
+                for (day, student_id, category), usage in pending.items():
+                    for key in (_student_key(day, student_id), _category_key(day, category)):
+                        for field, value in usage.items():
+                            pipe.hincrby(key, field, value)
+                        pipe.expire(key, ttl)
+                    pipe.sadd(f"usage:{day}:students", student_id)
+                    pipe.sadd(f"usage:{day}:categories", category)
+                    pipe.expire(f"usage:{day}:students", ttl)
+                    pipe.expire(f"usage:{day}:categories", ttl)
+                pipe.execute()
+        except Exception as e:
+            # Keep the deltas for the next attempt instead of losing them
+            logger.error(f"Token usage flush failed: {e}")
+            with self._lock:
+                for key, usage in pending.items():
+                    self._pending.setdefault(key, Counter()).update(usage)
+            return 0
+        return len(pending)
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name="token-usage-flush", daemon=True)
+            self._flusher.start()
+            atexit.register(self.close)
+
+    def _flush_loop(self) -> None:
+        while not self._stopped.wait(self._flush_interval):
+            self.flush()
+
+    def close(self) -> None:
+        self._stopped.set()
+        self.flush()
+
+    def student_usage(self, student_id: str, day: Optional[str] = None) -> Dict[str, int]:
+        """Flushed plus this worker's pending usage of one student"""
+        day = day or _today()
+        usage = Counter({field: int(value) for field, value in self.state.hgetall(_student_key(day, student_id)).items()})
+        with self._lock:
+            for (pending_day, pending_student, _), pending in self._pending.items():
+                if pending_day == day and pending_student == student_id:
+                    usage.update(pending)
+        return {field: usage.get(field, 0) for field in USAGE_FIELDS}
+
+    def over_budget(self, student_id: str, budget: int = DAILY_TOKEN_BUDGET) -> bool:
+        if budget <= 0:
+            return False
+        usage = self.student_usage(student_id)
+        return usage["prompt"] + usage["completion"] >= budget
+
+    def report(self, day: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+        """Per-category totals and top students by tokens for one day"""
+        day = day or _today()
+        self.flush()
+        state = self.state
+        students = sorted(state.smembers(f"usage:{day}:students"))
+        categories = sorted(state.smembers(f"usage:{day}:categories"))
+        with state.pipeline() as pipe:
+            for student_id in students:
+                pipe.hgetall(_student_key(day, student_id))
+            for category in categories:
+                pipe.hgetall(_category_key(day, category))
+            rows = pipe.execute()
+
+        def as_usage(row: Dict[str, str]) -> Dict[str, int]:
+            return {field: int(row.get(field, 0)) for field in USAGE_FIELDS}
+
+        by_student = {s: as_usage(row) for s, row in zip(students, rows[:len(students)])}
+        by_category = {c: as_usage(row) for c, row in zip(categories, rows[len(students):])}
+        totals = Counter()
+        for usage in by_category.values():
+            totals.update(usage)
+        top = sorted(by_student.items(), key=lambda item: item[1]["prompt"] + item[1]["completion"], reverse=True)
+
+        return {
+            "day": day,
+            "totals": {field: totals.get(field, 0) for field in USAGE_FIELDS},
+            "by_category": by_category,
+            "top_students": [dict(usage, student_id=s) for s, usage in top[:limit]],
+            "students": len(students),
+            "daily_budget": DAILY_TOKEN_BUDGET,
+            "students_over_budget": len([
+                s for s, usage in by_student.items()
+                if DAILY_TOKEN_BUDGET and usage["prompt"] + usage["completion"] >= DAILY_TOKEN_BUDGET
+            ]),
+        }
+
+
+USAGE = TokenUsageAccumulator()
@@ -0,0 +1,489 @@
+"""
+Transcript archive
+Every chat turn (message, response, tool calls, ticket) is appended to a
+durable, append-only log so conversations can be audited after the fact.
+
+Records are framed as <length:u32><crc32:u32><JSON> in numbered segment
+files under TRANSCRIPT_DIR, rotated at TRANSCRIPT_SEGMENT_BYTES. The chat
+path only serializes the record and queues it; a writer thread drains the
+queue, writes the batch and fsyncs once per batch (group commit). A sparse
+index (index.log) keeps, for each student and session, the first offset of
+their records in each segment; reads mmap only the segments listed there and
+scan from that offset. Index entries of the most recently read keys are cached
+(TRANSCRIPT_INDEX_CACHE_KEYS) and kept current with the lines any worker
+appended to index.log since; other keys are looked up in index.log itself.
+
+Several worker processes may share TRANSCRIPT_DIR: each batch is written
+under an exclusive flock on writer.lock, which also records where the last
+committed batch ended. The next writer to take the lock checks the last
+segment against that mark, indexes intact records a crashed writer left
+past it and cuts off the torn tail.
+
+python -m src.services.transcript_log --bench
+    append latency on the caller thread and read-back through the index
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from itertools import count
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: a single writing process only
+    fcntl = None
+
+try:
+    import orjson
+
+    def _dumps(record: Dict[str, Any]) -> bytes:
+        return orjson.dumps(record)
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    def _dumps(record: Dict[str, Any]) -> bytes:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode()
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_ENABLED = os.getenv("TRANSCRIPT_ENABLED", "true").lower() == "true"
+TRANSCRIPT_DIR = os.getenv("TRANSCRIPT_DIR", "transcripts")
+SEGMENT_BYTES = int(os.getenv("TRANSCRIPT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+# Upper bound on how long a queued record waits for its batch to be written
+COMMIT_INTERVAL = float(os.getenv("TRANSCRIPT_COMMIT_MS", "10")) / 1000
+# Students and sessions whose index entries stay in memory; a miss reads index.log
+INDEX_CACHE_KEYS = int(os.getenv("TRANSCRIPT_INDEX_CACHE_KEYS", "10000"))
+
+_HEADER = struct.Struct("<II")
+_INDEX_FILE = "index.log"
+# flock'd by the process writing a batch; holds (segment, end) of the last committed batch
+_LOCK_FILE = "writer.lock"
+_TAIL = struct.Struct("<QQ")
+
+
+def _segment_name(number: int) -> str:
+    return f"{number:08d}.seg"
+
+
+def _index_keys(record: Dict[str, Any]) -> List[str]:
+    keys = []
+    if record.get("student_id"):
+        keys.append(f"student:{record['student_id']}")
+    if record.get("session_id"):
+        keys.append(f"session:{record['session_id']}")
+    return keys
+
+
+def _frames(buffer: Any, offset: int = 0) -> Iterator[Tuple[int, int, int]]:
+    """(offset, length, crc) of each complete frame in `buffer`, without touching payloads"""
+    end = len(buffer)
+    while offset + _HEADER.size <= end:
+        length, crc = _HEADER.unpack_from(buffer, offset)
+        if length == 0 or offset + _HEADER.size + length > end:
+            return
+        yield offset, length, crc
+        offset += _HEADER.size + length
+
+
+def iter_records(buffer: Any, offset: int = 0) -> Iterator[Tuple[int, bytes]]:
+    """(offset, payload) of each intact record in `buffer`; stops at the first torn or corrupt one"""
+    for offset, length, crc in _frames(buffer, offset):
+        start = offset + _HEADER.size
+        payload = bytes(buffer[start:start + length])
+        if zlib.crc32(payload) != crc:
+            return
+        yield offset, payload
+
+
+def list_segments(directory: str) -> List[int]:
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(name[:-4]) for name in os.listdir(directory) if name.endswith(".seg"))
+
+
+def scan(directory: str = TRANSCRIPT_DIR, segment: int = 0, offset: int = 0) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+    """
+    Read-only pass over the archive from (segment, offset), safe next to a live writer
+
+    Yields (segment, offset just past the record, record); that position is
+    where a later scan resumes.
+    """
+    for number in list_segments(directory):
+        if number < segment:
+            continue
+        start = offset if number == segment else 0
+        with open(os.path.join(directory, _segment_name(number)), "rb") as f:
+            if os.fstat(f.fileno()).st_size <= start:
+                continue
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for record_offset, payload in iter_records(view, start):
+                    yield number, record_offset + _HEADER.size + len(payload), json.loads(payload)
+
+
+class TranscriptLog:
+    def __init__(self, directory: str = TRANSCRIPT_DIR, segment_bytes: int = SEGMENT_BYTES,
+                 commit_interval: float = COMMIT_INTERVAL, index_cache_keys: int = INDEX_CACHE_KEYS):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.commit_interval = commit_interval
+        self.index_cache_keys = index_cache_keys
+        self._pending: Deque[Tuple[int, bytes, List[str]]] = deque()
+        self._wakeup = threading.Event()
+        self._durable = threading.Condition()
+        self._appended = count(1)
+        # Sequence numbers enter the queue in order, so a written seq implies every lower one
+        self._append_lock = threading.Lock()
+        self._last_seq = 0
+        self._durable_seq = 0
+        self._opened = False
+        self._open_lock = threading.Lock()
+        # LRU of key -> {segment number: offset of the key's first record in it}
+        self._index: "OrderedDict[str, Dict[int, int]]" = OrderedDict()
+        # Held while catching up with index.log or looking a missed key up in it
+        self._index_lock = threading.Lock()
+        # How far index.log has been applied to the cached keys
+        self._index_read = 0
+        # Keys this process recently indexed in the current segment; an evicted one only costs a repeated line
+        self._segment_keys: "OrderedDict[str, None]" = OrderedDict()
+        self._segment = 0
+        self._file: Any = None
+        self._index_file: Any = None
+        self._lock_fd = -1
+
+    # ---- index ----
+
+    def _index_path(self) -> str:
+        return os.path.join(self.directory, _INDEX_FILE)
+
+    def _refresh_index(self) -> None:
+        """Apply index.log lines appended since the last call, by any process, to the cached keys"""
+        path = self._index_path()
+        if os.path.getsize(path) <= self._index_read:
+            return
+        with open(path, "rb") as f:
+            f.seek(self._index_read)
+            chunk = f.read()
+        # A line still being written by another worker is left for the next call
+        complete = chunk.rfind(b"\n") + 1
+        for line in chunk[:complete].decode("utf-8").splitlines():
+            key, segment, offset = line.rsplit("\t", 2)
+            segments = self._index.get(key)
+            if segments is not None:
+                segments[int(segment)] = min(int(offset), segments.get(int(segment), int(offset)))
+        self._index_read += complete
+
+    def _scan_index(self, key: str) -> Dict[int, int]:
+        """Entries of `key` in index.log, up to where the cached keys are current"""
+        segments: Dict[int, int] = {}
+        end = self._index_read
+        if not end:
+            return segments
+        needle = key.encode() + b"\t"
+        with open(self._index_path(), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+            # The key's lines start at the file start or right after a newline
+            at_start = view[:len(needle)] == needle
+            start = 0 if at_start else view.find(b"\n" + needle, 0, end) + 1
+            while at_start or start:
+                at_start = False
+                line_end = view.find(b"\n", start, end)
+                if line_end < 0:
+                    break
+                _, segment, offset = view[start:line_end].decode("utf-8").rsplit("\t", 2)
+                segments[int(segment)] = min(int(offset), segments.get(int(segment), int(offset)))
+                start = view.find(b"\n" + needle, line_end, end) + 1
+        return segments
+
+    def _lookup(self, key: str) -> List[Tuple[int, int]]:
+        """(segment, first offset) of `key`'s records, from the cache or else from index.log"""
+        with self._index_lock:
+            self._refresh_index()
+            segments = self._index.get(key)
+            if segments is not None:
+                self._index.move_to_end(key)
+            else:
+                segments = self._index[key] = self._scan_index(key)
+                if len(self._index) > self.index_cache_keys:
+                    self._index.popitem(last=False)
+            return sorted(segments.items())
+
+    # ---- writer side ----
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_fd = os.open(os.path.join(self.directory, _LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o644)
+        self._index_file = open(self._index_path(), "a", encoding="utf-8")
+        # Nothing is cached yet; keys read later find the existing entries in the file
+        self._index_read = self._index_file.tell()
+        with self._locked():
+            self._recover_tail()
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Exclusive right to append to the archive, across worker processes"""
+        if fcntl is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+
+    def _recover_tail(self) -> None:
+        """
+        Under the lock: move to the last segment and make sure it ends where the last batch was committed
+
+        Bytes past the mark come from a writer that died mid-batch; its
+        intact records are indexed and kept, the torn rest is cut off. An
+        archive without a mark (new, or written before the lock existed) has
+        its whole last segment checked.
+        """
+        tail = os.pread(self._lock_fd, _TAIL.size, 0)
+        segment, end = _TAIL.unpack(tail) if len(tail) == _TAIL.size else (0, 0)
+        if not segment:
+            segments = self.segments()
+            segment = segments[-1] if segments else 1
+        # A writer may have rotated and died before recording the new segment
+        while os.path.exists(self._segment_path(segment + 1)):
+            segment, end = segment + 1, 0
+        if self._segment != segment:
+            if self._file is not None:
+                self._file.close()
+            self._segment = segment
+            self._segment_keys.clear()
+            self._file = open(self._segment_path(segment), "ab")
+        size = os.fstat(self._file.fileno()).st_size
+        if size > end:
+            end = self._recover(end)
+            if end < size:
+                logger.warning(f"Cut {size - end} bytes of torn records off {self._segment_path(segment)}")
+                self._file.truncate(end)
+        # Other workers may have appended since; offsets come from tell()
+        self._file.seek(0, os.SEEK_END)
+
+    def _recover(self, start: int) -> int:
+        """Index the records of the current segment from `start` on; returns where the intact ones end"""
+        end = start
+        missing = []
+        with open(self._segment_path(self._segment), "rb") as f:
+            f.seek(start)
+            data = f.read()
+        for offset, payload in iter_records(data):
+            end = start + offset + _HEADER.size + len(payload)
+            for key in _index_keys(json.loads(payload)):
+                if self._first_in_segment(key):
+                    missing.append((key, start + offset))
+        self._write_index(missing)
+        return end
+
+    def _first_in_segment(self, key: str) -> bool:
+        if key in self._segment_keys:
+            self._segment_keys.move_to_end(key)
+            return False
+        self._segment_keys[key] = None
+        if len(self._segment_keys) > self.index_cache_keys:
+            self._segment_keys.popitem(last=False)
+        return True
+
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, _segment_name(number))
+
+    def _write_index(self, entries: List[Tuple[str, int]]) -> None:
+        if entries:
+            self._index_file.write("".join(f"{key}\t{self._segment}\t{offset}\n" for key, offset in entries))
+            self._index_file.flush()
+
+    def _rotate(self) -> None:
+        self._file.close()
+        self._segment += 1
+        self._segment_keys.clear()
+        self._file = open(self._segment_path(self._segment), "ab")
+
+    def _write_batch(self) -> None:
+        if not self._pending:
+            return
+        with self._locked():
+            self._recover_tail()
+            last_seq = self._write_pending()
+            if last_seq:
+                os.pwrite(self._lock_fd, _TAIL.pack(self._segment, self._file.tell()), 0)
+        if last_seq:
+            with self._durable:
+                self._durable_seq = last_seq
+                self._durable.notify_all()
+
+    def _write_pending(self) -> int:
+        last_seq = 0
+        new_entries: List[Tuple[str, int]] = []
+        while self._pending:
+            seq, payload, keys = self._pending.popleft()
+            if self._file.tell() >= self.segment_bytes:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._write_index(new_entries)
+                new_entries = []
+                self._rotate()
+            offset = self._file.tell()
+            self._file.write(_HEADER.pack(len(payload), zlib.crc32(payload)))
+            self._file.write(payload)
+            for key in keys:
+                if self._first_in_segment(key):
+                    new_entries.append((key, offset))
+            last_seq = seq
+        if last_seq:
+            # One fsync for the whole batch; the index only ever points at synced data
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._write_index(new_entries)
+        return last_seq
+
+    def _writer_loop(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            # Let concurrent turns join the batch
+            time.sleep(self.commit_interval)
+            try:
+                self._write_batch()
+            except Exception as e:
+                logger.error(f"Transcript write to {self.directory} failed: {e}")
+
+    def _ensure_open(self) -> None:
+        with self._open_lock:
+            if not self._opened:
+                self._open()
+                threading.Thread(target=self._writer_loop, name="transcript-writer", daemon=True).start()
+                self._opened = True
+
+    # ---- public API ----
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """Queue a record for the next group commit; returns its sequence number for sync()"""
+        if not self._opened:
+            self._ensure_open()
+        payload, keys = _dumps(record), _index_keys(record)
+        with self._append_lock:
+            seq = self._last_seq = next(self._appended)
+            self._pending.append((seq, payload, keys))
+        if not self._wakeup.is_set():
+            self._wakeup.set()
+        return seq
+
+    def append_turn(self, student_id: str, session_id: Optional[str], message: str, result: Dict[str, Any],
+                    tool_calls: List[Dict[str, Any]]) -> Optional[int]:
+        """Archive one chat turn; never raises into the chat path"""
+        ticket = result.get("ticket") or {}
+        try:
+            return self.append({
+                "ts": time.time(),
+                "student_id": student_id,
+                "session_id": session_id,
+                "message": message,
+                "response": result.get("response", ""),
+                "tool_calls": tool_calls,
+                "ticket_id": ticket.get("ticket_id"),
+            })
+        except Exception as e:
+            logger.error(f"Could not archive a turn of student {student_id}: {e}")
+            return None
+
+    def sync(self, seq: Optional[int] = None, timeout: float = 5.0) -> bool:
+        """Wait until record `seq` (default: everything appended so far) is on disk"""
+        if seq is None:
+            seq = self._last_seq
+        self._wakeup.set()
+        with self._durable:
+            return self._durable.wait_for(lambda: self._durable_seq >= seq, timeout=timeout)
+
+    def segments(self) -> List[int]:
+        return list_segments(self.directory)
+
+    def read(self, student_id: Optional[str] = None, session_id: Optional[str] = None,
+             limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Archived turns of a student and/or session, oldest first (the newest `limit` if given)"""
+        if not self._opened:
+            self._ensure_open()
+        field, value = ("session_id", session_id) if session_id else ("student_id", student_id)
+        if not value:
+            raise ValueError("student_id or session_id is required")
+        needle = _dumps({field: value})[1:-1]
+        records = []
+        for segment, offset in self._lookup(f"{field.split('_')[0]}:{value}"):
+            path = self._segment_path(segment)
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size <= offset:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    for frame, length, crc in _frames(view, offset):
+                        start = frame + _HEADER.size
+                        # Other students' records are skipped without copying them out of the map
+                        if view.find(needle, start, start + length) < 0:
+                            continue
+                        payload = view[start:start + length]
+                        if zlib.crc32(payload) != crc:
+                            break
+                        record = json.loads(payload)
+                        if record.get(field) != value:
+                            continue
+                        if student_id and record.get("student_id") != student_id:
+                            continue
+                        records.append(record)
+        return records[-limit:] if limit else records
+
+
+class _Disabled:
+    def append_turn(self, *args: Any, **kwargs: Any) -> None:
+        return None
+
+
+TRANSCRIPTS = TranscriptLog() if TRANSCRIPT_ENABLED else _Disabled()
+
+
+if __name__ == "__main__":
+    # Benchmark: caller-side append cost with a live writer thread, then indexed reads
+    import statistics
+    import sys
+    import tempfile
+
+    if "--bench" not in sys.argv:
+        sys.exit("usage: python -m src.services.transcript_log --bench")
+
+    directory = tempfile.mkdtemp(prefix="transcripts-")
+    log = TranscriptLog(directory, segment_bytes=4 * 1024 * 1024)
+    response = "✅ Запрос на возврат средств зарегистрирован. Тикет #REFUND-0001 создан. " * 8
+    calls = [{"tool": "request_refund", "input": "{'reason': 'переезд', 'student_id': '42'}", "output": response}]
+    log.append({"warmup": True})
+
+    timings = []
+    started = time.perf_counter()
+    for i in range(20000):
+        t = time.perf_counter()
+        log.append_turn(str(i % 500), f"s-{i % 2000}", "Хочу вернуть деньги, я переезжаю в другой город",
+                        {"response": response, "ticket": {"ticket_id": f"REFUND-{i:04d}"}}, calls)
+        timings.append((time.perf_counter() - t) * 1e6)
+    assert log.sync(timeout=30)
+    total = time.perf_counter() - started
+
+    t = time.perf_counter()
+    turns = log.read(student_id="42")
+    read_ms = (time.perf_counter() - t) * 1000
+    assert len(turns) == 40 and all(r["student_id"] == "42" for r in turns)
+    assert len(log.read(session_id="s-42")) == 10
+
+    # Reopening finds the same records through index.log
+    reopened = TranscriptLog(directory)
+    assert len(reopened.read(student_id="42")) == 40
+
+    timings.sort()
+    print(json.dumps({
+        "records": 20000,
+        "segments": len(log.segments()),
+        "append_p50_us": round(statistics.median(timings), 1),
+        "append_p99_us": round(timings[int(len(timings) * 0.99)], 1),
+        "durable_records_per_s": round(20000 / total),
+        "read_student_ms": round(read_ms, 2),
+    }))
@@ -0,0 +1,76 @@
+"""
+Test configuration: the app is configured before any module is imported,
+with in-memory state, throwaway files and no real upstreams.
+
+Run from the backend directory:
+    python -m pytest tests
+"""
+import os
+import sys
+import tempfile
+
+_WORKDIR = tempfile.mkdtemp(prefix="tests-")
+os.environ.setdefault("STATE_BACKEND_URL", "memory://")
+os.environ.setdefault("TRANSCRIPT_ENABLED", "false")
+os.environ.setdefault("TRANSCRIPT_DIR", os.path.join(_WORKDIR, "transcripts"))
+os.environ.setdefault("TICKET_SEARCH_DB", os.path.join(_WORKDIR, "ticket_search.db"))
+os.environ.setdefault("EXTERNAL_API_BASE", "http://127.0.0.1:9")
+os.environ.setdefault("GEMINI_API_KEY", "unused-in-tests")
+# Sessions are HS256 tokens signed with this secret (see make_token)
+os.environ.setdefault("AUTH_JWT_SECRET", "test-secret")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time  # noqa: E402
+
+import jwt  # noqa: E402
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def make_token():
+    """Session token for a student; role="staff" makes a staff session"""
+    def make(student_id: str, role: str = None, ttl: float = 3600) -> str:
+        claims = {"studentId": student_id, "exp": int(time.time() + ttl)}
+        if role:
+            claims["role"] = role
+        return jwt.encode(claims, os.environ["AUTH_JWT_SECRET"], algorithm="HS256")
+    return make
+
+
+@pytest.fixture(scope="session")
+def app():
+    from src.app import app
+    return app
+
+
+@pytest.fixture
+def client(app):
+    from fastapi.testclient import TestClient
+    with TestClient(app) as client:
+        yield client
+
+
+class FakeClock:
+    """Stands in for the `time` module of the modules it is installed in"""
+
+    def __init__(self, monkeypatch):
+        self._monkeypatch = monkeypatch
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+    def install(self, *modules) -> "FakeClock":
+        for module in modules:
+            self._monkeypatch.setattr(module, "time", self)
+        return self
+
+
+@pytest.fixture
+def fake_clock(monkeypatch):
+    """Monotonic clock moved only by advance(); install(module) makes `module` read it"""
+    return FakeClock(monkeypatch)
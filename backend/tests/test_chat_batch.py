@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from src.eval.models import ScriptedChatModel
+from src.routes import chat
+
+
+@pytest.fixture
+def models(monkeypatch):
+    shared = (ScriptedChatModel(), ScriptedChatModel())
+    monkeypatch.setattr(chat, "_batch_models", shared)
+    return shared
+
+
+def batch(student_ids):
+    return {"items": [{"message": "Привет", "student_id": s} for s in student_ids]}
+
+
+def test_batch_requires_staff(client, make_token, models):
+    assert client.post("/api/chat/batch", json=batch(["b-1"])).status_code == 401
+    student = {"Authorization": f"Bearer {make_token('b-1')}"}
+    assert client.post("/api/chat/batch", json=batch(["b-1"]), headers=student).status_code == 403
+
+
+def test_staff_batch_runs_as_each_student_on_the_shared_tiers(client, make_token, models, monkeypatch):
+    built = []
+    agent_class = chat.StudentSupportAgent
+
+    def recording_agent(**kwargs):
+        built.append(kwargs)
+        return agent_class(**kwargs)
+
+    monkeypatch.setattr(chat, "StudentSupportAgent", recording_agent)
+    staff = {"Authorization": f"Bearer {make_token('op-1', role='staff')}"}
+    resp = client.post("/api/chat/batch", json=batch(["b-1", "b-2", "b-1"]), headers=staff)
+    assert resp.status_code == 200
+    lines = [json.loads(line) for line in resp.text.splitlines()]
+    assert sorted(line["student_id"] for line in lines) == ["b-1", "b-1", "b-2"]
+    assert all("error" not in line for line in lines)
+    assert {kwargs["student_id"] for kwargs in built} == {"b-1", "b-2"}
+    assert all(kwargs["llm"] is models[0] and kwargs["light_llm"] is models[1] for kwargs in built)
@@ -0,0 +1,85 @@
+import pytest
+
+from src.services import circuit_breaker
+from src.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock.install(circuit_breaker)
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", failure_rate=0.5, min_calls=4, window=30, open_seconds=10, half_open_probes=1)
+
+
+def trip(breaker):
+    for _ in range(4):
+        breaker.record_failure()
+    assert breaker.state == OPEN
+
+
+def test_stays_closed_below_min_calls_and_failure_rate(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+    for _ in range(4):
+        breaker.record_success()
+    breaker.record_failure()
+    # 4 failures out of 8 calls reach the 50% rate
+    assert breaker.state == OPEN
+
+
+def test_old_failures_age_out_of_the_window(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(31)
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["calls_in_window"] == 1
+
+
+def test_open_breaker_fails_fast_until_the_open_period_ends(breaker, clock):
+    trip(breaker)
+    assert not breaker.allow()
+    with pytest.raises(CircuitOpenError) as error:
+        breaker.check()
+    assert error.value.retry_after == 10
+    clock.advance(6)
+    assert breaker.retry_after() == 4
+    clock.advance(4)
+    assert breaker.state == HALF_OPEN
+
+
+def test_successful_probe_closes_the_breaker(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+    assert breaker.allow()
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["calls_in_window"] == 0
+
+
+def test_failed_probe_reopens_for_a_full_period(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.advance(9)
+    assert breaker.state == OPEN
+    clock.advance(1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_hung_probe_stops_blocking_after_the_open_period(breaker, clock):
+    trip(breaker)
+    clock.advance(10)
+    assert breaker.allow()
+    clock.advance(5)
+    assert not breaker.allow()
+    clock.advance(5)
+    assert breaker.allow()
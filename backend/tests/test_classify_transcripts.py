@@ -0,0 +1,83 @@
+import io
+import json
+
+from src import classify_transcripts
+from src.classify_transcripts import classify_stream
+
+
+class InlinePool:
+    """Runs chunks in-process; counts submitted chunks whose results were not collected yet"""
+
+    instances = []
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self.in_flight = 0
+        self.peak = 0
+        InlinePool.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        return Pending(self, fn(*args))
+
+
+class Pending:
+    def __init__(self, pool, value):
+        self.pool = pool
+        self.value = value
+
+    def result(self):
+        self.pool.in_flight -= 1
+        return self.value
+
+
+class CountingSource:
+    """Line iterator that records how far ahead of the output the reader got"""
+
+    def __init__(self, lines, sink):
+        self.lines = lines
+        self.sink = sink
+        self.max_lead = 0
+
+    def __iter__(self):
+        for read, line in enumerate(self.lines, 1):
+            written = self.sink.getvalue().count("\n")
+            self.max_lead = max(self.max_lead, read - written)
+            yield line
+
+
+def transcripts(n):
+    messages = ["Хочу вернуть деньги за курс", "Привет", "Не могу войти в личный кабинет"]
+    return [json.dumps({"id": i, "student_id": f"s{i}", "message": messages[i % 3]}, ensure_ascii=False) + "\n"
+            for i in range(n)]
+
+
+def test_results_keep_input_order_and_in_flight_chunks_stay_bounded(monkeypatch):
+    monkeypatch.setattr(classify_transcripts, "ProcessPoolExecutor", InlinePool)
+    InlinePool.instances.clear()
+    sink = io.StringIO()
+    source = CountingSource(transcripts(1000), sink)
+
+    assert classify_stream(source, sink, workers=2, chunk_size=10) == 1000
+
+    rows = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert [row["id"] for row in rows] == list(range(1000))
+    assert rows[0]["type"] is not None and rows[1]["type"] is None
+    # At most workers * 2 chunks in flight, so the reader never runs far ahead of the output
+    assert InlinePool.instances[0].peak == 4
+    assert source.max_lead <= 5 * 10
+
+
+def test_malformed_lines_are_reported_in_place():
+    source = io.StringIO('{"id": 1, "message": "Привет"}\nnot json\n\n{"id": 2, "message": "Привет"}\n')
+    sink = io.StringIO()
+    assert classify_stream(source, sink, workers=1, chunk_size=2) == 3
+    rows = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert rows[0]["id"] == 1 and "error" in rows[1] and rows[2]["id"] == 2
@@ -0,0 +1,40 @@
+import pytest
+
+from src.agents.deadline import DEFAULT_BUDGET, MAX_BUDGET, Deadline, deadline_from_header
+from src.agents.support_agent import StudentSupportAgent
+from src.eval.models import ObservedModel, Observation, ScriptedChatModel
+
+REFUND_HISTORY = [
+    {"role": "user", "content": "Хочу вернуть деньги за курс"},
+    {"role": "assistant", "content": "Уточните, пожалуйста, причину возврата."},
+]
+
+
+@pytest.mark.parametrize("value", [None, "", "soon", "nan", "NaN", "inf", "-inf"])
+def test_unusable_header_gets_default_budget(value):
+    assert deadline_from_header(value).budget == DEFAULT_BUDGET
+
+
+@pytest.mark.parametrize("value, budget", [("5", 5.0), ("0", 0.1), ("-3", 0.1), ("1e9", MAX_BUDGET)])
+def test_header_is_clamped(value, budget):
+    assert deadline_from_header(value).budget == budget
+
+
+def test_executor_stops_between_steps_once_budget_is_spent():
+    # An injected model bypasses ModelRouter's deadline checks; the executor
+    # bound alone must keep the agent from going back to the model
+    observation = Observation()
+    model = ObservedModel(ScriptedChatModel(delay_seconds=0.2), observation)
+    agent = StudentSupportAgent(student_id="deadline-test", llm=model)
+    reply = agent.chat("Переезжаю в другой город", chat_history=REFUND_HISTORY, deadline=Deadline(0.1))
+    assert observation.llm_calls == 1
+    # The ticket created in the first step is still reported
+    assert reply["ticket"] is not None
+
+
+def test_turn_within_budget_creates_ticket():
+    observation = Observation()
+    agent = StudentSupportAgent(student_id="deadline-ok", llm=ObservedModel(ScriptedChatModel(), observation))
+    reply = agent.chat("Переезжаю в другой город", chat_history=REFUND_HISTORY, deadline=Deadline(10))
+    assert reply["ticket"] is not None
+    assert observation.llm_calls == 2
@@ -0,0 +1,108 @@
+import uuid
+
+import pytest
+
+from src.agents import degradation, support_agent
+from src.agents.degradation import DegradationMonitor
+from src.agents.fallback_engine import DIALOG_TTL, MENU, FallbackEngine
+from src.agents.support_agent import StudentSupportAgent
+from src.eval.models import ObservedModel, Observation, ScriptedChatModel
+from src.services import state as state_module
+from src.services.state import InMemoryState
+
+
+@pytest.fixture
+def clock(fake_clock):
+    return fake_clock.install(degradation)
+
+
+@pytest.fixture
+def monitor(clock):
+    return DegradationMonitor(window=60, min_samples=10, max_in_flight=2, max_error_rate=0.5, max_latency=15)
+
+
+def test_healthy_until_enough_samples(monitor):
+    for _ in range(9):
+        monitor.record(False, 1.0)
+    assert monitor.degrade_reason() is None
+    monitor.record(False, 1.0)
+    assert monitor.degrade_reason() == "errors"
+
+
+def test_errors_age_out_of_the_window(monitor, clock):
+    for _ in range(10):
+        monitor.record(False, 1.0)
+    assert monitor.degrade_reason() == "errors"
+    clock.advance(30)
+    assert monitor.degrade_reason() == "errors"
+    clock.advance(31)
+    assert monitor.degrade_reason() is None
+
+
+def test_slow_turns_degrade_on_latency(monitor, clock):
+    for _ in range(9):
+        monitor.record(True, 1.0)
+    monitor.record(True, 20.0)
+    assert monitor.degrade_reason() == "latency"
+    clock.advance(61)
+    for _ in range(10):
+        monitor.record(True, 1.0)
+    assert monitor.degrade_reason() is None
+
+
+def test_full_admission_queue_degrades_until_a_turn_finishes(monitor):
+    with monitor.admit():
+        assert monitor.degrade_reason() is None
+        with monitor.admit():
+            assert monitor.degrade_reason() == "queue"
+        assert monitor.degrade_reason() is None
+
+
+def test_agent_returns_to_the_llm_once_the_window_passes(monitor, clock, monkeypatch):
+    monkeypatch.setattr(support_agent, "DEGRADATION", monitor)
+    observation = Observation()
+    agent = StudentSupportAgent(student_id=f"deg-{uuid.uuid4().hex[:8]}",
+                                llm=ObservedModel(ScriptedChatModel(), observation))
+    for _ in range(10):
+        monitor.record(False, 1.0)
+
+    degraded = agent.chat("Привет, как дела?")
+    assert degraded["degraded"] == "errors" and degraded["response"] == MENU
+    assert observation.llm_calls == 0
+
+    clock.advance(61)
+    assert "degraded" not in agent.chat("Привет, как дела?")
+    assert observation.llm_calls == 1
+
+
+@pytest.fixture
+def engine(fake_clock):
+    return FallbackEngine(InMemoryState()), fake_clock.install(state_module)
+
+
+def test_fallback_dialog_collects_the_slot_then_issues_the_ticket(engine):
+    engine, _ = engine
+    student_id = f"fb-{uuid.uuid4().hex[:8]}"
+    question = engine.handle(student_id, "Хочу вернуть деньги")
+    assert question["ticket"] is None and "причину" in question["response"]
+    assert engine.in_progress(student_id)
+
+    unclear = engine.handle(student_id, "а")
+    assert unclear["response"].startswith("Не совсем понял ответ")
+
+    done = engine.handle(student_id, "Переезжаю в другой город")
+    assert done["ticket"]["type"] == "refund" and done["ticket"]["student_id"] == student_id
+    assert not engine.in_progress(student_id)
+
+
+def test_fallback_dialog_can_be_cancelled_and_expires(engine):
+    engine, clock = engine
+    student_id = f"fb-{uuid.uuid4().hex[:8]}"
+    engine.handle(student_id, "Хочу вернуть деньги")
+    assert engine.handle(student_id, "отмена")["ticket"] is None
+    assert not engine.in_progress(student_id)
+
+    engine.handle(student_id, "Хочу вернуть деньги")
+    clock.advance(DIALOG_TTL + 1)
+    assert not engine.in_progress(student_id)
+    assert engine.handle(student_id, "Переезжаю в другой город")["response"] == MENU
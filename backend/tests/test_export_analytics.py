@@ -0,0 +1,61 @@
+from datetime import datetime
+
+import pytest
+
+from src import export_analytics
+from src.schemas.tickets import Ticket
+from src.services.state import InMemoryState
+from src.services.ticket_store import CHANGES_KEY, TicketStore
+
+pa = pytest.importorskip("pyarrow")
+
+
+def ticket(ticket_id: str) -> Ticket:
+    return Ticket(ticket_id=ticket_id, type="technical_platform", status="open", priority="medium",
+                  description="Не работает видео", student_id="export-student",
+                  created_at=datetime.now().isoformat(), estimated_response="24 часа")
+
+
+@pytest.fixture
+def store(monkeypatch):
+    state = InMemoryState()
+    monkeypatch.setattr(export_analytics, "get_state", lambda: state)
+    return TicketStore(state)
+
+
+def exported_ids(output) -> list:
+    ids = []
+    for part in sorted((output / "tickets").glob("*.arrow")):
+        with pa.ipc.open_file(str(part)) as reader:
+            ids += reader.read_all().column("ticket_id").to_pylist()
+    return ids
+
+
+def export(output) -> None:
+    assert export_analytics.main(["tickets", "-o", str(output), "--format", "arrow"]) == 0
+
+
+def test_change_log_is_trimmed_up_to_the_watermark(store, tmp_path):
+    store.save(ticket("T-1"))
+    store.save(ticket("T-2"))
+    export(tmp_path)
+    assert store.state.llen(CHANGES_KEY) == 0
+
+    store.set_status("T-1", "resolved")
+    store.save(ticket("T-3"))
+    export(tmp_path)
+    assert store.state.llen(CHANGES_KEY) == 0
+    assert export_analytics.load_watermarks(str(tmp_path))["tickets"] == 4
+
+    store.save(ticket("T-4"))
+    export(tmp_path)
+    assert exported_ids(tmp_path) == ["T-1", "T-2", "T-1", "T-3", "T-4"]
+
+
+def test_watermark_behind_the_trimmed_log_exports_everything(store, tmp_path):
+    store.save(ticket("T-1"))
+    store.save(ticket("T-2"))
+    store.trim_changes(2)
+    source = export_analytics.TicketSource(store, since=1, batch_size=10)
+    assert [row["ticket_id"] for row in source.rows()] == ["T-1", "T-2"]
+    assert source.watermark == 2
@@ -0,0 +1,114 @@
+import json
+import os
+import uuid
+
+import pytest
+
+from src.agents import business_tools
+from src.agents.business_tools import change_group_or_teacher, request_unfreeze
+from src.agents.ticketing import bind_owner, collect_tickets
+from src.services.group_schedule import ANY_TIME, ScheduleFeed, ScheduleIndex, group_from_feed, parse_preferences
+from src.services.profile_cache import ProfileCache
+
+
+def group(group_id, level="B1", enrolled=4, capacity=8, sessions=(("пн", "19:00", "20:30"),)):
+    return {"id": group_id, "name": group_id, "level": level, "teacher": "T", "capacity": capacity,
+            "enrolled": enrolled, "sessions": [{"day": d, "start": s, "end": e} for d, s, e in sessions]}
+
+
+def index(*rows):
+    return ScheduleIndex(group_from_feed(row) for row in rows)
+
+
+def ids(groups):
+    return [g.group_id for g in groups]
+
+
+def test_lessons_overlap_as_half_open_intervals():
+    groups = index(
+        group("ends-at-start", sessions=[("пн", "17:00", "18:00")]),
+        group("ends-mid-slot", sessions=[("пн", "17:00", "18:10")]),
+        group("inside", sessions=[("пн", "18:30", "19:30")]),
+        group("starts-at-end", sessions=[("пн", "20:00", "21:00")]),
+        group("other-day", sessions=[("вт", "18:30", "19:30")]),
+    )
+    found = groups.find("B1", parse_preferences("пн с 18:00 до 20:00"))
+    assert sorted(ids(found)) == ["ends-mid-slot", "inside"]
+
+
+def test_groups_inside_the_preferences_come_first():
+    groups = index(
+        group("partly", enrolled=1, sessions=[("пн", "19:00", "20:00"), ("сб", "10:00", "11:00")]),
+        group("fits", enrolled=7, sessions=[("пн", "19:00", "20:00"), ("ср", "19:00", "20:00")]),
+    )
+    assert ids(groups.find("B1", parse_preferences("будни вечером"))) == ["fits", "partly"]
+
+
+def test_only_groups_with_free_seats_at_the_level_are_offered():
+    groups = index(
+        group("full", enrolled=8),
+        group("overfull", enrolled=9),
+        group("other-level", level="A2"),
+        group("most-seats", level="b1", enrolled=2),
+        group("some-seats", enrolled=6),
+    )
+    assert ids(groups.find("B1", ANY_TIME)) == ["most-seats", "some-seats"]
+    assert ids(groups.find("B1", ANY_TIME, limit=1)) == ["most-seats"]
+    assert groups.find("C2", ANY_TIME) == []
+
+
+@pytest.fixture
+def feed(tmp_path, monkeypatch):
+    path = tmp_path / "groups.json"
+    path.write_text(json.dumps({"groups": [
+        group("B1-evening", sessions=[("пн", "19:00", "20:30"), ("ср", "19:00", "20:30")]),
+        group("B1-morning", enrolled=2, sessions=[("сб", "10:00", "11:30")]),
+        group("B1-full", enrolled=8),
+        group("A2-evening", level="A2"),
+    ]}, ensure_ascii=False), encoding="utf-8")
+    feed = ScheduleFeed(str(path), reload_seconds=0)
+    monkeypatch.setattr(business_tools, "SCHEDULE", feed)
+    profiles = ProfileCache(fetcher=lambda student_id, token: {"level": "B1"})
+    monkeypatch.setattr(business_tools, "PROFILES", profiles)
+    return feed, path, profiles
+
+
+def test_feed_reloads_on_change_and_keeps_the_last_good_index(feed):
+    feed, path, _ = feed
+    assert [g["group_id"] for g in feed.candidates("B1")] == ["B1-morning", "B1-evening"]
+    path.write_text(json.dumps([group("B1-new")]), encoding="utf-8")
+    os.utime(path, (1, 1))
+    assert [g["group_id"] for g in feed.candidates("B1")] == ["B1-new"]
+    path.write_text("{broken", encoding="utf-8")
+    os.utime(path, (2, 2))
+    assert [g["group_id"] for g in feed.candidates("B1")] == ["B1-new"]
+
+
+def issue(tool, args, profiles):
+    student_id = f"sched-{uuid.uuid4().hex[:8]}"
+    profiles.get_or_fetch(student_id)
+    with bind_owner(student_id), collect_tickets() as tickets:
+        message = tool.invoke(dict(args, student_id=student_id))
+    return tickets[-1], message
+
+
+def test_unfreeze_ticket_lists_free_groups_at_the_students_level(feed):
+    _, _, profiles = feed
+    ticket, message = issue(request_unfreeze, {"preferred_date": "2026-03-15"}, profiles)
+    assert [g["group_id"] for g in ticket.candidate_groups] == ["B1-morning", "B1-evening"]
+    assert "B1-morning" in message
+
+
+def test_group_change_ticket_follows_the_preferences(feed):
+    _, _, profiles = feed
+    ticket, message = issue(change_group_or_teacher,
+                            {"reason": "Неудобное время", "preferences": "будни после 18:00"}, profiles)
+    assert [g["group_id"] for g in ticket.candidate_groups] == ["B1-evening"]
+    assert "B1-evening" in message and "B1-morning" not in message
+
+
+def test_no_candidates_without_a_known_level(feed, monkeypatch):
+    _, _, profiles = feed
+    monkeypatch.setattr(profiles, "fetcher", lambda student_id, token: {})
+    ticket, _ = issue(request_unfreeze, {"preferred_date": "2026-03-15"}, profiles)
+    assert ticket.candidate_groups is None
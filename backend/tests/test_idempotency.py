@@ -0,0 +1,185 @@
+import asyncio
+import threading
+
+import pytest
+
+from src.agents.degradation import DEGRADATION
+from src.routes import chat as chat_routes
+from src.services import state as state_module
+from src.services.idempotency import IdempotencyConflict, IdempotencyPending, IdempotencyStore
+from src.services.state import InMemoryState, RedisState
+
+
+@pytest.fixture(params=["memory", "fakeredis"])
+def state(request):
+    if request.param == "memory":
+        return InMemoryState()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisState(fakeredis.FakeRedis(decode_responses=True))
+
+
+class Turns:
+    def __init__(self):
+        self.calls = []
+
+    async def ok(self, value: bytes, seconds: float = 0.1):
+        self.calls.append(value)
+        await asyncio.sleep(seconds)
+        return value, True
+
+    async def degraded(self, value: bytes):
+        self.calls.append(value)
+        await asyncio.sleep(0.05)
+        return value, False
+
+    async def failing(self):
+        self.calls.append(b"fail")
+        await asyncio.sleep(0.05)
+        raise RuntimeError("agent failed")
+
+
+def test_concurrent_duplicates_run_once_and_replay(state):
+    store, turns = IdempotencyStore(state, poll=0.01), Turns()
+
+    async def scenario():
+        results = await asyncio.gather(*[store.run("s1:k", "a", lambda: turns.ok(b"first")) for _ in range(20)])
+        assert turns.calls == [b"first"]
+        assert all(body == b"first" for body, _ in results)
+        assert sum(not replayed for _, replayed in results) == 1
+        assert await store.run("s1:k", "a", lambda: turns.ok(b"again")) == (b"first", True)
+        with pytest.raises(IdempotencyConflict):
+            await store.run("s1:k", "b", lambda: turns.ok(b"other"))
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_on_another_worker_waits_for_the_stored_body(state):
+    first, second, turns = IdempotencyStore(state, poll=0.01), IdempotencyStore(state, poll=0.01), Turns()
+
+    async def scenario():
+        owner = asyncio.ensure_future(first.run("s1:k", "a", lambda: turns.ok(b"first", 0.2)))
+        await asyncio.sleep(0.05)
+        assert await second.run("s1:k", "a", lambda: turns.ok(b"second")) == (b"first", True)
+        assert await owner == (b"first", False)
+        with pytest.raises(IdempotencyConflict):
+            await second.run("s1:k", "b", lambda: turns.ok(b"other"))
+
+    asyncio.run(scenario())
+    assert turns.calls == [b"first"]
+
+
+def test_failed_and_degraded_turns_are_not_stored(state):
+    store, turns = IdempotencyStore(state, poll=0.01), Turns()
+
+    async def scenario():
+        outcomes = await asyncio.gather(*[store.run("s1:f", "a", turns.failing) for _ in range(5)],
+                                        return_exceptions=True)
+        assert all(isinstance(o, RuntimeError) for o in outcomes) and turns.calls == [b"fail"]
+        assert await store.run("s1:f", "a", lambda: turns.ok(b"retried")) == (b"retried", False)
+
+        assert await store.run("s1:d", "a", lambda: turns.degraded(b"fallback")) == (b"fallback", False)
+        assert await store.run("s1:d", "a", lambda: turns.ok(b"normal")) == (b"normal", False)
+        assert await store.run("s1:d", "a", lambda: turns.ok(b"third")) == (b"normal", True)
+
+    asyncio.run(scenario())
+
+
+def test_stored_body_expires(state):
+    store, turns = IdempotencyStore(state, ttl=0.2, poll=0.01), Turns()
+
+    async def scenario():
+        await store.run("s1:k", "a", lambda: turns.ok(b"first", 0))
+        await asyncio.sleep(0.3)
+        assert await store.run("s1:k", "a", lambda: turns.ok(b"second", 0)) == (b"second", False)
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_still_leaves_the_result(state):
+    store, turns = IdempotencyStore(state, poll=0.01), Turns()
+
+    async def scenario():
+        owner = asyncio.ensure_future(store.run("s1:k", "a", lambda: turns.ok(b"kept", 0.2)))
+        await asyncio.sleep(0.05)
+        owner.cancel()
+        assert await store.run("s1:k", "a", lambda: turns.ok(b"rerun")) == (b"kept", True)
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_gives_up_when_the_other_worker_takes_too_long(state):
+    first, turns = IdempotencyStore(state, poll=0.01), Turns()
+    second = IdempotencyStore(state, poll=0.01, max_wait=0.1)
+
+    async def scenario():
+        owner = asyncio.ensure_future(first.run("s1:k", "a", lambda: turns.ok(b"slow", 0.5)))
+        await asyncio.sleep(0.05)
+        started = asyncio.get_running_loop().time()
+        with pytest.raises(IdempotencyPending):
+            await second.run("s1:k", "a", lambda: turns.ok(b"second"))
+        assert asyncio.get_running_loop().time() - started < 0.3
+        assert await owner == (b"slow", False)
+
+    asyncio.run(scenario())
+    assert turns.calls == [b"slow"]
+
+
+class ThreadRecordingState(InMemoryState):
+    def __init__(self):
+        super().__init__()
+        self.threads = set()
+
+    def get(self, key):
+        self.threads.add(threading.current_thread())
+        return super().get(key)
+
+    def set(self, key, value, ttl=None, nx=False):
+        self.threads.add(threading.current_thread())
+        return super().set(key, value, ttl=ttl, nx=nx)
+
+
+def test_state_calls_stay_off_the_event_loop():
+    state, turns = ThreadRecordingState(), Turns()
+    store = IdempotencyStore(state, poll=0.01)
+
+    async def scenario():
+        await store.run("s1:k", "a", lambda: turns.ok(b"first", 0))
+        assert await store.run("s1:k", "a", lambda: turns.ok(b"again", 0)) == (b"first", True)
+
+    asyncio.run(scenario())
+    assert state.threads and threading.main_thread() not in state.threads
+
+
+def test_expired_keys_are_purged_on_write(fake_clock):
+    fake_clock.install(state_module)
+    state = InMemoryState()
+    for i in range(100):
+        state.set(f"idempotency:s1:{i}", "{}", ttl=60)
+    state.set("kept", "1")
+    for _ in range(5000):
+        state.expire("kept", 60)
+    fake_clock.advance(61)
+    state.set("idempotency:s1:new", "{}", ttl=60)
+    assert set(state._data) == {"idempotency:s1:new"}
+    assert len(state._expiry_heap) == 1
+
+
+def test_fallback_answer_is_not_replayed(client, make_token, monkeypatch):
+    monkeypatch.setattr(DEGRADATION, "degrade_reason", lambda: "overload")
+    headers = {"Authorization": f"Bearer {make_token('idem-1')}", "Idempotency-Key": "retry-1"}
+    body = {"message": "Привет", "student_id": "idem-1"}
+    first = client.post("/api/chat", json=body, headers=headers)
+    second = client.post("/api/chat", json=body, headers=headers)
+    assert first.status_code == second.status_code == 200
+    assert "Idempotent-Replayed" not in second.headers
+
+
+def test_pending_duplicate_gets_409(client, make_token, monkeypatch):
+    async def pending(key, *args):
+        raise IdempotencyPending(key)
+
+    monkeypatch.setattr(chat_routes.IDEMPOTENCY, "run", pending)
+    headers = {"Authorization": f"Bearer {make_token('idem-2')}", "Idempotency-Key": "retry-2"}
+    resp = client.post("/api/chat", json={"message": "Привет", "student_id": "idem-2"}, headers=headers)
+    assert resp.status_code == 409
+    assert resp.headers["Retry-After"] == "1"
@@ -0,0 +1,24 @@
+import json
+import os
+
+import pytest
+
+from src.agents.knowledge_base import answer_from_kb
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "..", "fixtures", "replay_messages.jsonl")
+
+with open(FIXTURE, encoding="utf-8") as f:
+    CASES = [json.loads(line) for line in f if line.strip()]
+
+
+@pytest.mark.parametrize("case", CASES, ids=[case["message"][:40] for case in CASES])
+def test_replay_fixture(case):
+    match = answer_from_kb(case["message"], case.get("history"))
+    assert (match.entry_id if match else None) == case.get("expected_kb")
+
+
+def test_answer_already_given_goes_to_the_agent():
+    first = answer_from_kb("хб не работает")
+    assert first is not None
+    history = [{"role": "user", "content": "хб не работает"}, {"role": "assistant", "content": first.answer}]
+    assert answer_from_kb("хб опять не работает", history) is None
@@ -0,0 +1,141 @@
+import threading
+import time
+import uuid
+
+import pytest
+
+from src.agents.deadline import Deadline, DeadlineExceeded, deadline_scope
+from src.agents.model_router import ModelRouter, is_retryable_error
+from src.services.circuit_breaker import CircuitOpenError, get_breaker
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"upstream answered {status_code}")
+        self.status_code = status_code
+
+
+class FakeModel:
+    """Answers `reply` after `delay` seconds, or raises `error`; counts calls"""
+
+    def __init__(self, reply=None, delay: float = 0.0, error: BaseException = None):
+        self.reply = reply
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, input, config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        return self.reply
+
+
+def names(*labels):
+    # Breakers and latency stats are process-wide; fresh names keep tests apart
+    suffix = uuid.uuid4().hex[:8]
+    return [f"{label}-{suffix}" for label in labels]
+
+
+def router(models, **kwargs):
+    kwargs.setdefault("hedge", False)
+    return ModelRouter(models, **kwargs)
+
+
+@pytest.mark.parametrize("error", [
+    StatusError(429), StatusError(503), TimeoutError("read timed out"), Exception("HTTP 500 from upstream"),
+])
+def test_retryable_errors(error):
+    assert is_retryable_error(error)
+
+
+@pytest.mark.parametrize("error", [StatusError(400), ValueError("bad request"), DeadlineExceeded("turn over")])
+def test_non_retryable_errors(error):
+    assert not is_retryable_error(error)
+
+
+@pytest.mark.parametrize("error", [StatusError(429), StatusError(500), TimeoutError("read timed out")])
+def test_fails_over_to_next_model(error):
+    primary, fallback = FakeModel(error=error), FakeModel("fallback")
+    a, b = names("a", "b")
+    assert router([(a, primary), (b, fallback)]).invoke("hi") == "fallback"
+    assert primary.calls == 1 and fallback.calls == 1
+
+
+def test_client_error_is_not_failed_over():
+    primary, fallback = FakeModel(error=StatusError(400)), FakeModel("fallback")
+    a, b = names("a", "b")
+    with pytest.raises(StatusError):
+        router([(a, primary), (b, fallback)]).invoke("hi")
+    assert fallback.calls == 0
+
+
+def test_last_retryable_error_is_raised_when_every_model_fails():
+    a, b = names("a", "b")
+    models = [(a, FakeModel(error=StatusError(503))), (b, FakeModel(error=TimeoutError("slow")))]
+    with pytest.raises(TimeoutError):
+        router(models).invoke("hi")
+
+
+def test_hedged_request_wins_over_slow_primary():
+    primary, fallback = FakeModel("primary", delay=0.5), FakeModel("fallback")
+    a, b = names("a", "b")
+    started = time.perf_counter()
+    result = router([(a, primary), (b, fallback)], hedge=True, initial_hedge_delay=0.05,
+                    min_hedge_delay=0.01).invoke("hi")
+    assert result == "fallback"
+    assert time.perf_counter() - started < 0.4
+    assert primary.calls == 1 and fallback.calls == 1
+
+
+def test_no_hedge_when_primary_answers_in_time():
+    primary, fallback = FakeModel("primary", delay=0.01), FakeModel("fallback")
+    a, b = names("a", "b")
+    assert router([(a, primary), (b, fallback)], hedge=True, initial_hedge_delay=0.5).invoke("hi") == "primary"
+    assert fallback.calls == 0
+
+
+def test_open_breaker_skips_model():
+    a, b = names("a", "b")
+    get_breaker(f"gemini:{a}", min_calls=2, failure_rate=0.5, open_seconds=60)
+    primary, fallback = FakeModel(error=StatusError(503)), FakeModel("fallback")
+    model = router([(a, primary), (b, fallback)])
+    for _ in range(2):
+        assert model.invoke("hi") == "fallback"
+    assert get_breaker(f"gemini:{a}").state == "open"
+
+    assert model.invoke("hi") == "fallback"
+    assert primary.calls == 2 and fallback.calls == 3
+
+
+def test_timeouts_open_the_breaker():
+    (a,) = names("a")
+    get_breaker(f"gemini:{a}", min_calls=2, failure_rate=0.5, open_seconds=60)
+    model = router([(a, FakeModel(error=TimeoutError("slow")))])
+    for _ in range(2):
+        with pytest.raises(TimeoutError):
+            model.invoke("hi")
+    assert get_breaker(f"gemini:{a}").state == "open"
+
+
+def test_all_breakers_open_fails_fast():
+    a, b = names("a", "b")
+    for name in (a, b):
+        breaker = get_breaker(f"gemini:{name}", min_calls=1, failure_rate=0.5, open_seconds=60)
+        breaker.record_failure()
+    primary, fallback = FakeModel("primary"), FakeModel("fallback")
+    with pytest.raises(CircuitOpenError) as raised:
+        router([(a, primary), (b, fallback)]).invoke("hi")
+    assert raised.value.retry_after > 0
+    assert primary.calls == 0 and fallback.calls == 0
+
+
+def test_deadline_stops_waiting_for_slow_model():
+    (a,) = names("a")
+    with deadline_scope(Deadline(0.1)):
+        with pytest.raises(DeadlineExceeded):
+            router([(a, FakeModel("late", delay=0.5))]).invoke("hi")
@@ -0,0 +1,67 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.agents.model_tiering import ModelTiering, TurnFeatures, pending_request
+from src.agents.support_agent import ESCALATE, StudentSupportAgent
+from src.eval.models import ObservedModel, Observation, ScriptedChatModel
+
+REFUND = "Хочу вернуть деньги за курс"
+
+
+@pytest.fixture
+def tiering():
+    return ModelTiering(enabled=True, threshold=1.0)
+
+
+def test_score_is_low_for_small_talk_and_at_least_one_for_ticket_flows():
+    assert ModelTiering.score(TurnFeatures(6, None, None, 0)) < 0.05
+    assert ModelTiering.score(TurnFeatures(400, None, None, 10)) == 1.0
+    assert ModelTiering.score(TurnFeatures(10, "refund", None, 0)) >= 1.0
+    assert ModelTiering.score(TurnFeatures(10, None, "refund", 0)) >= 1.0
+
+
+def test_route_sends_only_easy_turns_to_the_light_tier(tiering):
+    assert tiering.route("Привет").tier == "light"
+    assert tiering.route(REFUND).tier == "agent"
+    # The follow-up of a request still being discussed carries no intent of its own
+    history = [{"role": "user", "content": REFUND}, {"role": "assistant", "content": "Уточните причину."}]
+    decision = tiering.route("Переезжаю", history)
+    assert decision.tier == "agent" and decision.features.pending is not None
+    assert ModelTiering(enabled=False).route("Привет").tier == "agent"
+
+
+def test_confirmed_ticket_closes_the_pending_request():
+    history = [{"role": "user", "content": REFUND},
+               {"role": "assistant", "content": "Тикет #REF-12 создан."}]
+    assert pending_request(history) is None
+
+
+def agent_with(light_replies, tiering):
+    observation = Observation()
+    agent = StudentSupportAgent(
+        student_id="tier-1",
+        llm=ObservedModel(ScriptedChatModel(), observation),
+        light_llm=FakeListChatModel(responses=light_replies),
+        tiering=tiering,
+    )
+    return agent, observation
+
+
+def test_light_answer_skips_the_agent(tiering):
+    agent, observation = agent_with(["Добрый день!"], tiering)
+    assert agent.chat("Привет")["response"] == "Добрый день!"
+    assert observation.llm_calls == 0
+
+
+@pytest.mark.parametrize("reply", [ESCALATE, "  ", f"Не уверен. {ESCALATE}"])
+def test_escalate_falls_through_to_the_agent(tiering, reply):
+    agent, observation = agent_with([reply], tiering)
+    result = agent.chat("Привет")
+    assert result["response"] == "Здравствуйте! Чем могу помочь?"
+    assert observation.llm_calls == 1
+
+
+def test_ticket_flow_never_reaches_the_light_model(tiering):
+    agent, observation = agent_with(["Добрый день!"], tiering)
+    agent.chat(REFUND)
+    assert agent.light_llm.i == 0 and observation.llm_calls == 1
@@ -0,0 +1,92 @@
+import threading
+import uuid
+
+import pytest
+
+from src.agents.business_tools import request_unfreeze
+from src.agents.support_agent import StudentSupportAgent
+from src.agents.ticketing import bind_owner, collect_tickets
+from src.eval.models import ScriptedChatModel
+from src.services import profile_cache
+from src.services.profile_cache import ProfileCache, profile_fetches
+
+REFUND_HISTORY = [
+    {"role": "user", "content": "Хочу вернуть деньги за курс"},
+    {"role": "assistant", "content": "Уточните, пожалуйста, причину возврата."},
+]
+
+
+class CountingFetcher:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, student_id, token):
+        with self._lock:
+            self.calls.append((student_id, token))
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return {"level": "B1", "group": f"G-{student_id}"}
+
+
+@pytest.fixture
+def fetcher(monkeypatch):
+    fetcher = CountingFetcher()
+    cache = ProfileCache(fetcher=fetcher)
+    monkeypatch.setattr(profile_cache, "PROFILES", cache)
+    monkeypatch.setattr("src.agents.support_agent.PROFILES", cache)
+    monkeypatch.setattr("src.agents.business_tools.PROFILES", cache)
+    return fetcher
+
+
+def test_get_does_not_fetch_when_fetches_are_forbidden():
+    fetcher = CountingFetcher()
+    cache = ProfileCache(fetcher=fetcher)
+    with profile_fetches(False):
+        assert cache.get("1") is None
+        assert cache.get_or_fetch("1") is None
+        assert cache.ticket_fields("1") == {}
+    assert fetcher.calls == []
+    assert cache.get_or_fetch("1") == {"level": "B1", "group": "G-1"}
+
+
+def test_tokens_are_bounded_when_fetches_fail():
+    cache = ProfileCache(fetcher=CountingFetcher(fail=True), max_entries=10)
+    for i in range(100):
+        future = cache.refresh(str(i), token=f"t{i}")
+        with pytest.raises(RuntimeError):
+            future.result()
+    assert len(cache._tokens) == 10
+    assert list(cache._tokens) == [str(i) for i in range(90, 100)]
+
+
+def test_unverified_turn_starts_no_profile_fetch(fetcher):
+    agent = StudentSupportAgent(student_id="claimed-1", llm=ScriptedChatModel())
+    reply = agent.chat("Переезжаю в другой город", chat_history=REFUND_HISTORY)
+    assert reply["ticket"] is not None
+    assert fetcher.calls == []
+
+
+def test_verified_turn_warms_the_profile(fetcher):
+    agent = StudentSupportAgent(student_id="verified-1", llm=ScriptedChatModel(), verified=True)
+    agent.chat("Переезжаю в другой город", chat_history=REFUND_HISTORY)
+    profile_cache.PROFILES._executor.shutdown(wait=True)
+    assert ("verified-1", None) in fetcher.calls
+
+
+@pytest.mark.parametrize("bound", [None, "session", "named"])
+def test_tools_read_only_the_verified_students_profile(fetcher, bound):
+    cache = profile_cache.PROFILES
+    session, named = f"owner-{uuid.uuid4().hex[:8]}", f"other-{uuid.uuid4().hex[:8]}"
+    for student_id in (session, named):
+        cache.get_or_fetch(student_id)
+    owner = {None: None, "session": session, "named": named}[bound]
+    with bind_owner(owner), collect_tickets() as tickets:
+        # The LLM names `named`, whoever the session belongs to
+        request_unfreeze.invoke({"preferred_date": "2026-03-15", "student_id": named})
+    ticket = tickets[-1]
+    if owner is None:
+        assert ticket.student_id == named and getattr(ticket, "student_group", None) is None
+    else:
+        assert ticket.student_id == owner and ticket.student_group == f"G-{owner}"
@@ -0,0 +1,100 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import HTTPException
+
+from src.services import session_auth
+from src.services.session_auth import JWKSCache, SessionVerifier, current_session, resolve_student_id
+
+PRIVATE_KEY = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture
+def key_server():
+    """JWKS endpoint that answers after `server.delay` seconds"""
+    jwk = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(PRIVATE_KEY.public_key()))
+    jwk.update(kid="test", alg="RS256", use="sig")
+    body = json.dumps({"keys": [jwk]}).encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(server.delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.delay = 0.0
+    server.url = f"http://127.0.0.1:{server.server_port}/jwks"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def rs256_token(student_id: str) -> str:
+    claims = {"studentId": student_id, "exp": int(time.time()) + 3600}
+    return jwt.encode(claims, PRIVATE_KEY, algorithm="RS256", headers={"kid": "test"})
+
+
+def test_anonymous_caller_cannot_claim_a_student():
+    assert session_auth.VERIFIER.enabled
+    with pytest.raises(HTTPException) as raised:
+        resolve_student_id(None, "12345")
+    assert raised.value.status_code == 401
+    assert resolve_student_id(None, None) == "unknown"
+
+
+def test_claims_are_trusted_only_without_signing_keys(monkeypatch):
+    monkeypatch.setattr(session_auth, "VERIFIER", SessionVerifier(secret=""))
+    assert resolve_student_id(None, "12345") == "12345"
+
+
+def test_anonymous_chat_with_student_id_is_rejected(client):
+    response = client.post("/api/chat", json={"message": "Привет", "student_id": "12345"})
+    assert response.status_code == 401
+
+
+def test_cold_key_fetch_does_not_block_the_event_loop(key_server, monkeypatch):
+    key_server.delay = 0.3
+    monkeypatch.setattr(session_auth, "VERIFIER", SessionVerifier(JWKSCache(key_server.url)))
+    request = SimpleNamespace(cookies={"token": rs256_token("s-1")}, headers={})
+
+    async def scenario():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.ensure_future(ticker())
+        session = await current_session(request)
+        task.cancel()
+        return session, ticks
+
+    session, ticks = asyncio.run(scenario())
+    assert session.student_id == "s-1"
+    assert ticks >= 10
+
+
+def test_background_refresh_does_not_hold_the_lock(key_server):
+    cache = JWKSCache(key_server.url, refresh_interval=0.01)
+    key_server.delay = 0.5
+    threading.Thread(target=cache._refresh_loop, daemon=True).start()
+    time.sleep(0.15)
+    # The refresh is in the middle of its HTTP request now
+    assert cache.fetches >= 1
+    assert cache._lock.acquire(timeout=0.05)
+    cache._lock.release()
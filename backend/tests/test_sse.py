@@ -0,0 +1,83 @@
+import asyncio
+import json
+
+from src.agents.support_agent import StudentSupportAgent
+from src.services.sse import SSEWriter
+
+
+async def scripted(*steps):
+    """(event, payload) pairs; a bare number sleeps that many seconds"""
+    for step in steps:
+        if isinstance(step, (int, float)):
+            await asyncio.sleep(step)
+        else:
+            yield step
+
+
+def frames(writer, *steps):
+    async def collect():
+        return [frame async for frame in writer.stream(scripted(*steps))]
+
+    return asyncio.run(collect())
+
+
+def payloads(output):
+    return [json.loads(f[len("data: "):]) for f in output if f.startswith("data: {")]
+
+
+def test_chunks_flush_by_size():
+    writer = SSEWriter(flush_bytes=10, flush_interval=10, heartbeat_interval=10)
+    output = frames(writer, *[("chunk", "abcd")] * 5)
+    assert payloads(output) == [{"chunk": "abcdabcdabcd"}, {"chunk": "abcdabcd"}]
+    assert output[-1] == "data: [DONE]\n\n"
+    assert writer.frames == 2
+
+
+def test_chunks_flush_by_time():
+    writer = SSEWriter(flush_bytes=10_000, flush_interval=0.05, heartbeat_interval=10)
+    output = frames(writer, ("chunk", "a"), ("chunk", "b"), 0.2, ("chunk", "c"))
+    assert payloads(output) == [{"chunk": "ab"}, {"chunk": "c"}]
+
+
+def test_tool_and_ticket_events_flush_immediately():
+    writer = SSEWriter(flush_bytes=10_000, flush_interval=10, heartbeat_interval=10)
+    ticket = {"id": "REF-1"}
+    output = frames(writer, ("chunk", "a"), ("tool", {"name": "refund", "status": "started"}),
+                    ("chunk", "b"), ("ticket", ticket))
+    assert payloads(output) == [
+        {"chunk": "a"}, {"tool": {"name": "refund", "status": "started"}}, {"chunk": "b"}, {"ticket": ticket},
+    ]
+
+
+def test_idle_stream_gets_heartbeats():
+    writer = SSEWriter(flush_bytes=10_000, flush_interval=0.01, heartbeat_interval=0.05)
+    output = frames(writer, 0.23, ("chunk", "late"))
+    assert output.count(": ping\n\n") >= 3
+    assert payloads(output) == [{"chunk": "late"}]
+    # Heartbeats are comments, not frames
+    assert writer.frames == 1
+
+
+def test_error_becomes_a_frame_before_done():
+    async def failing():
+        yield "chunk", "a"
+        raise RuntimeError("agent failed")
+
+    async def collect():
+        return [frame async for frame in SSEWriter(flush_interval=10).stream(failing())]
+
+    output = asyncio.run(collect())
+    assert payloads(output) == [{"chunk": "a"}, {"error": "agent failed"}]
+    assert output[-1] == "data: [DONE]\n\n"
+
+
+def test_long_answer_takes_a_handful_of_frames(client, monkeypatch):
+    answer = " ".join(["слово"] * 300)
+    monkeypatch.setattr(StudentSupportAgent, "chat", lambda self, *a, **k: {"response": answer, "ticket": None})
+    with client.stream("POST", "/api/chat/stream", json={"message": "Привет"}) as resp:
+        lines = [line for line in resp.iter_lines() if line.startswith("data: ")]
+    assert lines[-1] == "data: [DONE]"
+    chunks = [json.loads(line[len("data: "):])["chunk"] for line in lines[:-1]]
+    assert "".join(chunks) == answer
+    # One frame per word would be 300 frames plus [DONE]
+    assert len(lines) <= 9
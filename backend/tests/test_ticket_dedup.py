@@ -0,0 +1,95 @@
+import time
+import uuid
+
+import pytest
+
+from src.agents.deadline import Deadline, DeadlineExceeded, deadline_scope
+from src.agents.ticketing import collect_tickets, draft_ticket_id, issue_ticket
+from src.schemas.tickets import Ticket
+from src.services import ticket_dedup
+from src.services.state import InMemoryState, RedisState, WatchError
+from src.services.ticket_dedup import DUPLICATES, DuplicateIndex, LockTimeout
+
+
+@pytest.fixture(params=["memory", "fakeredis"])
+def state(request):
+    if request.param == "memory":
+        return InMemoryState()
+    fakeredis = pytest.importorskip("fakeredis")
+    return RedisState(fakeredis.FakeRedis(decode_responses=True))
+
+
+def refund(student_id, reason="Переезжаю в другой город, не смогу посещать занятия"):
+    return Ticket(ticket_id=draft_ticket_id("REFUND"), type="refund", status="open", priority="medium",
+                  description=reason, student_id=student_id, created_at="2026-01-01T00:00:00",
+                  estimated_response="24 часа")
+
+
+def test_watched_key_changed_aborts_the_transaction(state):
+    state.set("k", "a")
+    with state.watch("k") as tx:
+        assert tx.get("k") == "a"
+        state.set("k", "b")
+        tx.multi()
+        tx.set("k", "c")
+        with pytest.raises(WatchError):
+            tx.execute()
+    assert state.get("k") == "b"
+
+    with state.watch("k") as tx:
+        tx.multi()
+        tx.set("k", "c")
+        tx.execute()
+    assert state.get("k") == "c"
+
+
+def test_lock_wait_is_bounded(state):
+    index = DuplicateIndex(state)
+    with index.locked("s1", "refund"):
+        started = time.monotonic()
+        with pytest.raises(LockTimeout):
+            with index.locked("s1", "refund", wait=0.1):
+                pass
+        assert time.monotonic() - started < 1.0
+    with index.locked("s1", "refund", wait=0.1):
+        pass
+
+
+def test_expired_holder_does_not_release_the_next_holders_lock(state, monkeypatch):
+    monkeypatch.setattr(ticket_dedup, "LOCK_SECONDS", 0.5)
+    index = DuplicateIndex(state)
+    key = "tickets:open_sketches:s1:refund:lock"
+    with index.locked("s1", "refund"):
+        time.sleep(0.6)
+        # The first lease ran out; a second worker takes the lock
+        second = index.locked("s1", "refund", wait=0.1)
+        second.__enter__()
+        held_by_second = state.get(key)
+    assert state.get(key) == held_by_second
+    second.__exit__(None, None, None)
+    assert state.get(key) is None
+
+
+def test_repeated_request_is_merged_into_the_open_ticket():
+    student_id = f"dup-{uuid.uuid4().hex[:8]}"
+    with collect_tickets() as tickets:
+        issue_ticket(refund(student_id), "ok")
+        message = issue_ticket(refund(student_id), "ok")
+    assert tickets[0].ticket_id == tickets[1].ticket_id
+    assert tickets[0].ticket_id in message
+
+
+def test_requests_without_a_student_are_never_merged():
+    with collect_tickets() as tickets:
+        issue_ticket(refund("unknown"), "ok")
+        issue_ticket(refund("unknown"), "ok")
+    assert tickets[0].ticket_id != tickets[1].ticket_id
+
+
+def test_busy_lock_ends_with_the_turn_deadline():
+    student_id = f"dup-{uuid.uuid4().hex[:8]}"
+    with DUPLICATES.locked(student_id, "refund"):
+        started = time.monotonic()
+        with deadline_scope(Deadline(0.2)), pytest.raises(DeadlineExceeded):
+            issue_ticket(refund(student_id), "ok")
+        assert time.monotonic() - started < 1.0
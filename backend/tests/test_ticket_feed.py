@@ -0,0 +1,80 @@
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+
+from src.schemas.tickets import Ticket
+from src.services import ticket_feed
+from src.services.state import InMemoryState, RedisState
+from src.services.ticket_store import TicketStore
+
+
+@pytest.fixture(params=["memory", "fakeredis"])
+def store(request):
+    if request.param == "memory":
+        return TicketStore(InMemoryState())
+    fakeredis = pytest.importorskip("fakeredis")
+    return TicketStore(RedisState(fakeredis.FakeRedis(decode_responses=True)))
+
+
+def ticket(ticket_id: str, student_id: str = "feed-student") -> Ticket:
+    return Ticket(ticket_id=ticket_id, type="refund", priority="high", description="Возврат",
+                  student_id=student_id, created_at=datetime.now().isoformat(), estimated_response="24 часа")
+
+
+def test_concurrent_writers_are_read_in_commit_order_without_gaps(store):
+    written = [f"T-{n}" for n in range(200)]
+    seen, cursor = [], 0
+
+    def writer(ids):
+        for ticket_id in ids:
+            store.save(ticket(ticket_id))
+
+    threads = [threading.Thread(target=writer, args=(written[n::4],)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    finished = False
+    while not finished:
+        finished = not any(thread.is_alive() for thread in threads)
+        page = ticket_feed.read(store.state, "feed-student", cursor)
+        assert not page["reset"]
+        assert [e["seq"] for e in page["events"]] == list(range(cursor + 1, page["cursor"] + 1))
+        seen += [e["ticket_id"] for e in page["events"]]
+        cursor = page["cursor"]
+    assert sorted(seen) == sorted(written)
+    assert ticket_feed.latest_seq(store.state, "feed-student") == len(written)
+
+
+def test_reset_only_when_events_past_the_cursor_were_trimmed(store, monkeypatch):
+    monkeypatch.setattr(ticket_feed, "MAX_EVENTS", 5)
+    for n in range(8):
+        store.save(ticket(f"T-{n}"))
+
+    page = ticket_feed.read(store.state, "feed-student", 2)
+    assert page["reset"] and page["cursor"] == 8
+    page = ticket_feed.read(store.state, "feed-student", 3)
+    assert not page["reset"] and [e["seq"] for e in page["events"]] == [4, 5, 6, 7, 8]
+    page = ticket_feed.read(store.state, "feed-student", 6)
+    assert not page["reset"] and [e["ticket_id"] for e in page["events"]] == ["T-6", "T-7"]
+
+
+def test_cursor_ahead_of_the_feed_resets(store):
+    store.save(ticket("T-1"))
+    page = ticket_feed.read(store.state, "feed-student", 50)
+    assert page == {"events": [], "cursor": 1, "reset": True}
+
+
+@pytest.mark.parametrize("path", ["/api/tickets", "/api/tickets/changes?timeout=0"])
+def test_ticket_lists_need_a_session(client, make_token, path):
+    student = f"s-{uuid.uuid4().hex}"
+    assert client.get(path, params={"student_id": student}).status_code == 401
+    assert client.get(path, params={"student_id": student},
+                      cookies={"token": make_token("someone-else")}).status_code == 403
+    assert client.get(path, cookies={"token": make_token(student)}).status_code == 200
+    assert client.get(path, params={"student_id": student},
+                      cookies={"token": make_token("staff-1", role="staff")}).status_code == 200
+
+
+def test_feed_stream_needs_a_session(client):
+    assert client.get("/api/tickets/feed", params={"student_id": "12345"}).status_code == 401
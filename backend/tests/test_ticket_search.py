@@ -0,0 +1,69 @@
+import base64
+import json
+
+import pytest
+
+from src.schemas.tickets import Ticket
+from src.services.ticket_search import TicketSearchIndex
+
+
+def ticket(ticket_id: str, created_at: str, description: str = "Прошу оформить возврат за курс") -> Ticket:
+    return Ticket(ticket_id=ticket_id, type="refund", priority="high", description=description,
+                  created_at=created_at, estimated_response="24 часа")
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = TicketSearchIndex(str(tmp_path / "search.db"))
+    index.index_many([
+        ticket("R-1", "2024-03-01T09:00:00"),
+        ticket("R-2", "2024-03-02T23:59:00"),
+        ticket("R-3", "2024-03-03T00:00:00"),
+    ])
+    return index
+
+
+def test_date_only_date_to_includes_the_whole_day(index):
+    assert sorted(index.search("возврат", date_to="2024-03-02")["ticket_ids"]) == ["R-1", "R-2"]
+    assert index.search("возврат", date_to="2024-03-02T12:00:00")["ticket_ids"] == ["R-1"]
+
+
+def test_invalid_date_to_is_rejected(index):
+    with pytest.raises(ValueError):
+        index.search("возврат", date_to="2024-13-45")
+
+
+@pytest.mark.parametrize("sort", ["recent", "relevance"])
+def test_cursor_pages_through_everything(index, sort):
+    seen, cursor = [], None
+    while True:
+        page = index.search("возврат", sort=sort, cursor=cursor, limit=1)
+        seen += page["ticket_ids"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == ["R-1", "R-2", "R-3"]
+
+
+def encoded(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize("sort", ["recent", "relevance"])
+@pytest.mark.parametrize("cursor", [
+    "!!!", "bm90IGpzb24", encoded(5), encoded(None), encoded([1]), encoded([1, 2, 3]),
+    encoded(["a", "b"]), encoded([{"a": 1}, 1]), encoded([1.5, True]),
+])
+def test_malformed_cursor_is_a_value_error(index, sort, cursor):
+    with pytest.raises(ValueError):
+        index.search("возврат", sort=sort, cursor=cursor)
+
+
+def test_search_endpoint_is_staff_only(client, make_token):
+    assert client.get("/api/tickets/search", params={"q": "возврат"}).status_code == 401
+    student = {"token": make_token("student-1")}
+    assert client.get("/api/tickets/search", params={"q": "возврат"}, cookies=student).status_code == 403
+    staff = {"token": make_token("support-1", role="support")}
+    assert client.get("/api/tickets/search", params={"q": "возврат"}, cookies=staff).status_code == 200
+    bad = client.get("/api/tickets/search", params={"q": "возврат", "cursor": encoded(5)}, cookies=staff)
+    assert bad.status_code == 400
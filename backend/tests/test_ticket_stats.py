@@ -0,0 +1,95 @@
+import threading
+from datetime import datetime
+
+import pytest
+
+from src.agents.ticketing import draft_ticket_id, issue_ticket
+from src.schemas.tickets import Ticket
+from src.services import ticket_stats
+from src.services.state import InMemoryState, RedisState
+from src.services.ticket_store import TICKETS, TicketStore
+
+
+@pytest.fixture(params=["memory", "fakeredis"])
+def store(request):
+    if request.param == "memory":
+        return TicketStore(InMemoryState())
+    fakeredis = pytest.importorskip("fakeredis")
+    return TicketStore(RedisState(fakeredis.FakeRedis(decode_responses=True)))
+
+
+def ticket(ticket_id: str, category: str = "Технические вопросы", status: str = "open") -> Ticket:
+    return Ticket(ticket_id=ticket_id, type="technical_platform", status=status, priority="medium",
+                  description="Не работает видео", student_id="stats-student", category=category,
+                  assigned_to="Поддержка: 2 линия", created_at=datetime.now().isoformat(),
+                  estimated_response="24 часа")
+
+
+def test_names_with_colons_are_counted(store):
+    store.save(ticket("T-1", category="Оплата: Kaspi"))
+    store.save(ticket("T-2", category="Оплата: Kaspi"))
+    stats = ticket_stats.read(store.state)
+    assert stats["open_by_category"] == {"Оплата: Kaspi": 2}
+    assert stats["open_by_assignee"] == {"Поддержка: 2 линия": 2}
+    assert stats["by_status"] == {"open": 2}
+
+
+def test_counters_match_after_status_changes(store):
+    store.save(ticket("T-1"))
+    store.save(ticket("T-2"))
+    store.set_status("T-1", "resolved")
+    assert ticket_stats.check_drift(store.state, store.iter_all()) == {}
+    stats = ticket_stats.read(store.state)
+    assert stats["open"] == 1 and stats["by_status"] == {"open": 1, "resolved": 1}
+
+
+def test_drift_check_covers_sla_deadlines(store):
+    store.save(ticket("T-1"))
+    store.save(ticket("T-2"))
+    store.set_status("T-2", "closed")
+    state = store.state
+
+    state.zrem(ticket_stats.SLA_KEY, "T-1")
+    state.zadd(ticket_stats.SLA_KEY, {"T-2": 0.0})
+    drift = ticket_stats.check_drift(state, store.iter_all())
+    assert drift["sla:T-1"]["stored"] is None and drift["sla:T-1"]["expected"] is not None
+    assert drift["sla:T-2"] == {"stored": 0.0, "expected": None}
+
+    ticket_stats.rebuild(state, store.iter_all())
+    assert ticket_stats.check_drift(state, store.iter_all()) == {}
+
+
+def test_stats_and_status_changes_are_staff_only(client, make_token):
+    draft = ticket(draft_ticket_id("STATS"))
+    issue_ticket(draft, draft.ticket_id)
+    ticket_id = TICKETS.list_for_student("stats-student")[0].ticket_id
+    student = {"token": make_token("stats-student")}
+    staff = {"token": make_token("admin-1", role="admin")}
+
+    assert client.get("/api/tickets/stats").status_code == 401
+    assert client.get("/api/tickets/stats", cookies=student).status_code == 403
+    assert client.get("/api/tickets/stats", cookies=staff).status_code == 200
+
+    path = f"/api/tickets/{ticket_id}/status"
+    assert client.patch(path, json={"status": "resolved"}).status_code == 401
+    assert client.patch(path, json={"status": "resolved"}, cookies=student).status_code == 403
+    assert client.patch(path, json={"status": "resolved"}, cookies=staff).json()["status"] == "resolved"
+
+
+def test_concurrent_status_changes_keep_counters_exact(store):
+    store.save(ticket("T-1"))
+    barrier = threading.Barrier(8)
+
+    def toggle(worker: int):
+        barrier.wait()
+        for n in range(100):
+            store.set_status("T-1", ("open", "resolved", "closed")[(worker + n) % 3])
+
+    threads = [threading.Thread(target=toggle, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert ticket_stats.check_drift(store.state, store.iter_all()) == {}
+    assert sum(ticket_stats.read(store.state)["by_status"].values()) == 1
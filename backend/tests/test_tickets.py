@@ -0,0 +1,151 @@
+import os
+import socket
+import subprocess
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+
+from langchain_core.messages import AIMessage
+
+from src.agents.support_agent import StudentSupportAgent
+from src.agents.ticketing import draft_ticket_id, issue_ticket
+from src.eval.models import ScriptedChatModel
+from src.schemas.tickets import Ticket
+from src.services.ticket_store import TICKETS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def draft(prefix: str, student_id: str, description: str) -> Ticket:
+    return Ticket(
+        ticket_id=draft_ticket_id(prefix), type="technical_platform", status="open", priority="medium",
+        description=description, student_id=student_id, created_at=datetime.now().isoformat(),
+        estimated_response="24 часа",
+    )
+
+
+def issue(prefix: str, student_id: str, description: str) -> str:
+    ticket = draft(prefix, student_id, description)
+    return issue_ticket(ticket, f"Тикет #{ticket.ticket_id} создан.")
+
+
+class ForgingModel(ScriptedChatModel):
+    """Scripted agent whose tool calls name another student"""
+
+    victim: str = "victim"
+
+    def bind_tools(self, tools, **kwargs):
+        return ForgingModel(tool_args={t.name: list(t.args) for t in tools}, victim=self.victim)
+
+    def _reply(self, messages):
+        reply = super()._reply(messages)
+        calls = [dict(call, args=dict(call["args"], student_id=self.victim)) for call in reply.tool_calls]
+        return AIMessage(content=reply.content, tool_calls=calls) if calls else reply
+
+
+REFUND_HISTORY = [
+    {"role": "user", "content": "Хочу вернуть деньги за курс"},
+    {"role": "assistant", "content": "Уточните, пожалуйста, причину возврата."},
+]
+
+
+@pytest.mark.parametrize("verified", [True, False])
+def test_verified_turn_ignores_the_student_id_from_the_llm(verified):
+    student, victim = f"s-{uuid.uuid4().hex}", f"v-{uuid.uuid4().hex}"
+    agent = StudentSupportAgent(student_id=student, llm=ForgingModel(victim=victim), verified=verified)
+    ticket = agent.chat("Переезжаю в другой город", chat_history=REFUND_HISTORY)["ticket"]
+    # Anonymous turns have no better source than the LLM's argument
+    owner = student if verified else victim
+    assert ticket["student_id"] == owner
+    assert [t.ticket_id for t in TICKETS.list_for_student(owner)] == [ticket["ticket_id"]]
+
+
+def test_merged_duplicate_does_not_use_up_an_id():
+    prefix, student = f"T{uuid.uuid4().hex[:6].upper()}", f"s-{uuid.uuid4().hex}"
+    assert issue(prefix, student, "Не открывается урок по физике") == f"Тикет #{prefix}-0001 создан."
+    assert "уже есть открытая заявка" in issue(prefix, student, "Не открывается урок по физике")
+    assert issue(prefix, student, "Сертификат пришёл с ошибкой в фамилии") == f"Тикет #{prefix}-0002 создан."
+
+
+def test_concurrent_duplicates_create_one_ticket():
+    prefix, student = f"T{uuid.uuid4().hex[:6].upper()}", f"s-{uuid.uuid4().hex}"
+    with ThreadPoolExecutor(8) as pool:
+        replies = list(pool.map(lambda _: issue(prefix, student, "Не работает видео в уроке 5"), range(8)))
+    assert len([r for r in replies if "создан" in r]) == 1
+    assert len(TICKETS.list_for_student(student)) == 1
+
+
+def test_ticket_is_visible_to_owner_and_staff_only(client, make_token):
+    student = f"s-{uuid.uuid4().hex}"
+    issue("OWN", student, "Не приходит код подтверждения")
+    ticket_id = TICKETS.list_for_student(student)[0].ticket_id
+    path = f"/api/tickets/{ticket_id}"
+
+    assert client.get(path).status_code == 401
+    assert client.get(path, cookies={"token": make_token("someone-else")}).status_code == 404
+    assert client.get(path, cookies={"token": make_token(student)}).json()["ticket_id"] == ticket_id
+    assert client.get(path, cookies={"token": make_token("admin-1", role="admin")}).status_code == 200
+
+
+_WORKER = """
+import sys
+from src.agents.ticketing import issue_ticket
+from tests.test_tickets import draft
+from src.services.ticket_store import TICKETS
+
+worker = sys.argv[1]
+for n in range(20):
+    ticket = draft("MP", f"mp-{worker}-{n}", f"Request {n} from worker {worker}")
+    print(issue_ticket(ticket, ticket.ticket_id))
+# Both workers send the same request for one student at once
+ticket = draft("MP", "mp-shared", "Не открывается личный кабинет на телефоне")
+issue_ticket(ticket, ticket.ticket_id)
+print("seen", len(TICKETS.state.lrange("tickets:all", 0, -1)))
+"""
+
+
+def test_two_processes_share_one_backend(tmp_path):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("redis")
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    workdir = str(tmp_path)
+    server = fakeredis.TcpFakeServer(("127.0.0.1", port))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # Workers share the state backend and one search index file
+        search_db = os.path.join(workdir, "search.db")
+        workers = [
+            subprocess.Popen([sys.executable, "-c", _WORKER, str(n)], cwd=BACKEND_DIR,
+                             env=dict(os.environ, STATE_BACKEND_URL=f"redis://127.0.0.1:{port}/0",
+                                      TICKET_SEARCH_DB=search_db),
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            for n in range(2)
+        ]
+        outputs = [worker.communicate(timeout=60) for worker in workers]
+        for worker, (_, err) in zip(workers, outputs):
+            assert worker.returncode == 0, err
+        ids = [line for out, _ in outputs for line in out.splitlines() if line.startswith("MP-")]
+
+        from src.services.state import create_state
+        from src.services.ticket_store import TicketStore
+
+        shared = TicketStore(create_state(f"redis://127.0.0.1:{port}/0"))
+        assert len(ids) == len(set(ids)) == 40
+        assert {t.ticket_id for t in shared.iter_all()} >= set(ids)
+        assert len(shared.list_for_student("mp-shared")) == 1
+        # The second worker saw every ticket of the first one
+        assert max(int(out.split("seen ")[1]) for out, _ in outputs) == 41
+        # Either worker's search index is the shared one: all tickets are found
+        from src.services.ticket_search import TicketSearchIndex
+
+        found = TicketSearchIndex(search_db).search(query="Request", limit=100)["ticket_ids"]
+        assert set(found) == set(ids)
+    finally:
+        server.shutdown()
+        server.server_close()
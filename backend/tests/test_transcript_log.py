@@ -0,0 +1,126 @@
+import multiprocessing
+import threading
+
+import pytest
+
+from src.routes import transcripts as transcripts_route
+from src.services.transcript_log import TranscriptLog, scan
+
+
+def test_reopen_after_torn_tail_indexes_new_records_at_their_offset(tmp_path):
+    log = TranscriptLog(str(tmp_path), commit_interval=0)
+    log.append({"student_id": "a", "message": "first"})
+    assert log.sync()
+    segment = tmp_path / "00000001.seg"
+    with open(segment, "ab") as f:
+        f.write(b"\x20\x00\x00\x00torn")
+        f.write(b"\x00" * 3)
+
+    reopened = TranscriptLog(str(tmp_path), commit_interval=0)
+    reopened.append({"student_id": "b", "message": "second"})
+    assert reopened.sync()
+    assert [r["message"] for r in reopened.read(student_id="b")] == ["second"]
+    assert [r["message"] for r in TranscriptLog(str(tmp_path)).read(student_id="b")] == ["second"]
+
+
+def test_sync_waits_for_every_lower_sequence_number(tmp_path):
+    log = TranscriptLog(str(tmp_path), commit_interval=0)
+    seqs = []
+    seqs_lock = threading.Lock()
+
+    def writer(student_id):
+        for i in range(200):
+            seq = log.append({"student_id": student_id, "message": str(i)})
+            with seqs_lock:
+                seqs.append(seq)
+
+    threads = [threading.Thread(target=writer, args=(str(n),)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(seqs) == list(range(1, 801))
+    assert log.sync(max(seqs))
+    for n in range(4):
+        assert len(log.read(student_id=str(n))) == 200
+
+
+def _worker_appends(directory, worker):
+    log = TranscriptLog(directory, segment_bytes=4096, commit_interval=0)
+    for i in range(300):
+        log.append({"student_id": f"s{i % 5}", "session_id": f"w{worker}", "message": f"{worker}-{i}"})
+        if i % 50 == 0:
+            log.sync()
+    assert log.sync(timeout=30)
+
+
+def test_workers_share_the_archive(tmp_path):
+    reader = TranscriptLog(str(tmp_path), segment_bytes=4096)
+    assert reader.read(student_id="s0") == []
+    context = multiprocessing.get_context("fork")
+    workers = [context.Process(target=_worker_appends, args=(str(tmp_path), n)) for n in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    # No record was lost or torn by interleaved writes, and every worker's records are found
+    messages = [record["message"] for _, _, record in scan(str(tmp_path))]
+    assert sorted(messages) == sorted(f"{w}-{i}" for w in range(4) for i in range(300))
+    assert len(reader.segments()) > 1
+    for n in range(4):
+        assert len(reader.read(session_id=f"w{n}")) == 300
+    assert len(reader.read(student_id="s3")) == 4 * 60
+
+
+def test_index_cache_is_bounded_and_misses_read_index_log(tmp_path):
+    log = TranscriptLog(str(tmp_path), segment_bytes=512, commit_interval=0, index_cache_keys=3)
+    for i in range(40):
+        log.append({"student_id": f"s{i % 10}", "session_id": f"c{i}", "message": str(i)})
+    assert log.sync()
+    assert len(log.segments()) > 2
+    for n in range(10):
+        assert [r["message"] for r in log.read(student_id=f"s{n}")] == [str(n + 10 * k) for k in range(4)]
+    assert len(log._index) == 3
+
+    # Cached keys follow later appends, evicted ones are found again on disk
+    log.append({"student_id": "s9", "message": "late"})
+    log.append({"student_id": "s0", "message": "late"})
+    assert log.sync()
+    assert log.read(student_id="s9")[-1]["message"] == "late"
+    assert log.read(student_id="s0")[-1]["message"] == "late"
+    assert log.read(session_id="c7")[0]["message"] == "7"
+    assert log.read(student_id="nobody") == []
+    assert len(log._index) == 3
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    log = TranscriptLog(str(tmp_path), commit_interval=0)
+    for student_id, session_id in [("a", "a-1"), ("a", "a-2"), ("b", "b-1")]:
+        log.append({"student_id": student_id, "session_id": session_id, "message": "Привет"})
+    assert log.sync()
+    monkeypatch.setattr(transcripts_route, "TRANSCRIPTS", log)
+    return log
+
+
+def get(client, token=None, **params):
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    return client.get("/api/transcripts", params=params, headers=headers)
+
+
+def test_students_read_only_their_own_transcripts(client, archive, make_token):
+    assert get(client, student_id="a").status_code == 401
+    token = make_token("a")
+    resp = get(client, token)
+    assert resp.status_code == 200
+    assert [t["session_id"] for t in resp.json()["turns"]] == ["a-1", "a-2"]
+    assert get(client, token, student_id="b").status_code == 403
+
+
+def test_staff_read_any_student(client, archive, make_token):
+    token = make_token("teacher-1", role="staff")
+    assert [t["session_id"] for t in get(client, token, student_id="b").json()["turns"]] == ["b-1"]
+    assert [t["student_id"] for t in get(client, token, session_id="a-2").json()["turns"]] == ["a"]
+    assert get(client, token).status_code == 400
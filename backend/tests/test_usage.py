@@ -0,0 +1,8 @@
+import pytest
+
+
+@pytest.mark.parametrize("path", ["/api/usage", "/api/usage/students/u-1"])
+def test_usage_is_staff_only(client, make_token, path):
+    assert client.get(path).status_code == 401
+    assert client.get(path, cookies={"token": make_token("u-1")}).status_code == 403
+    assert client.get(path, cookies={"token": make_token("admin-1", role="admin")}).status_code == 200
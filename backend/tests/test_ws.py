@@ -0,0 +1,93 @@
+import time
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from src.agents import support_agent
+from src.eval.models import ScriptedChatModel
+from src.routes import ws
+
+
+@pytest.fixture
+def scripted_model(monkeypatch):
+    def use(delay: float = 0.0):
+        model = ScriptedChatModel(delay_seconds=delay)
+        monkeypatch.setattr(support_agent, "build_model_router", lambda *args, **kwargs: model)
+    return use
+
+
+def frames_until_done(socket, message_id):
+    frames = []
+    while True:
+        frame = socket.receive_json()
+        if frame.get("type") == "ping":
+            continue
+        frames.append(frame)
+        if frame.get("id") == message_id and frame["type"] in ("done", "error"):
+            return frames
+
+
+def test_malformed_frames_get_an_error_and_keep_the_connection(client, make_token, scripted_model):
+    scripted_model()
+    with client.websocket_connect("/ws/chat", cookies={"token": make_token("ws-student")}) as socket:
+        socket.send_text("{not json")
+        assert socket.receive_json() == {"id": None, "type": "error", "detail": "Frame must be a JSON object"}
+        socket.send_text("[1, 2]")
+        assert socket.receive_json()["type"] == "error"
+        socket.send_bytes(b"\xff\xfe")
+        assert socket.receive_json()["type"] == "error"
+
+        socket.send_json({"id": "m1", "message": "Привет"})
+        assert frames_until_done(socket, "m1")[-1]["type"] == "done"
+
+
+def test_unfinished_turns_are_capped(client, make_token, scripted_model, monkeypatch):
+    scripted_model(delay=0.3)
+    monkeypatch.setattr(ws, "MAX_PENDING_TURNS", 1)
+    with client.websocket_connect("/ws/chat", cookies={"token": make_token("ws-busy")}) as socket:
+        socket.send_json({"id": "m1", "message": "Привет"})
+        socket.send_json({"id": "m2", "message": "Ещё вопрос"})
+        assert socket.receive_json() == {"id": "m2", "type": "error", "detail": "Too many unfinished turns"}
+        assert frames_until_done(socket, "m1")[-1]["type"] == "done"
+
+
+def test_turn_streams_tool_events_before_the_answer(client, make_token, scripted_model):
+    scripted_model()
+    with client.websocket_connect("/ws/chat", cookies={"token": make_token("ws-tools")}) as socket:
+        socket.send_json({"id": "m1", "message": "Хочу вернуть деньги за курс"})
+        frames_until_done(socket, "m1")
+        socket.send_json({"id": "m2", "message": "Переезжаю в другой город"})
+        types = [frame["type"] for frame in frames_until_done(socket, "m2")]
+    assert types[:2] == ["tool", "tool"]
+    assert types[-1] == "done" and "ticket" in types
+    # Word chunks are coalesced like SSE frames
+    assert types.count("chunk") == 1
+
+
+def test_silent_client_is_disconnected(client, make_token, scripted_model, monkeypatch):
+    scripted_model()
+    monkeypatch.setattr(ws, "HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(ws, "PONG_TIMEOUT", 0.05)
+    with client.websocket_connect("/ws/chat", cookies={"token": make_token("ws-silent")}) as socket:
+        with pytest.raises(WebSocketDisconnect) as closed:
+            while True:
+                assert socket.receive_json()["type"] == "ping"
+    assert closed.value.code == 4408
+
+
+def test_answered_pings_keep_the_connection(client, make_token, scripted_model, monkeypatch):
+    scripted_model()
+    monkeypatch.setattr(ws, "HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(ws, "PONG_TIMEOUT", 0.05)
+    with client.websocket_connect("/ws/chat", cookies={"token": make_token("ws-alive")}) as socket:
+        started = time.monotonic()
+        while time.monotonic() - started < 0.5:
+            assert socket.receive_json()["type"] == "ping"
+            socket.send_json({"type": "pong"})
+        socket.send_json({"id": "m1", "message": "Привет"})
+        while True:
+            frame = socket.receive_json()
+            if frame["type"] == "ping":
+                socket.send_json({"type": "pong"})
+            elif frame["type"] == "done":
+                break
@@ -91,10 +91,13 @@ function ChatContent() {
         content: msg.content
       }))
 
+      const idempotencyKey = crypto.randomUUID()
+
       const response = await fetch(`${apiUrl}/api/chat`, {
         method: "POST",
         credentials: "include",
-        headers: { "Content-Type": "application/json" },
+        // One key per sent message: a retried request returns the first answer instead of a second ticket
+        headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
         body: JSON.stringify({
           message: input,
           history: history,